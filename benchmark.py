@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import print_function
+from jsonbuf import *
+import os.path as p
+import random, time, glob, json, platform, tracemalloc
+
+class JsonbufSampler(object):
+    """
+    Random documents of a schema. Outermost array/dict gets exactly records elements when given, nested ones
+    up to size. Elements with filters match one of them by accept ratio, fields are left out by missing ratio
+    so that defaults are exercised.
+    """
+    def __init__(self, bridges, size=8, seed=0, records=None, accept=0.8, missing=0.0):
+        self.bridges = bridges # type: JsonbufBridges
+        self.size = size
+        self.records = records # type: Optional[int]
+        self.accept = accept
+        self.missing = missing
+        self.random = random.Random(seed)
+        self.__depth = 0
+
+    def __sample_v(self, type, enum=None): # type: (str, str)->any
+        r = self.random
+        if enum: return r.choice(list(self.bridges.enums[enum].cases.keys()))
+        if type == JSONTYPE_bool: return r.random() < 0.5
+        if type == JSONTYPE_int8: return r.randint(-0x80, 0x7F)
+        if type in (JSONTYPE_uint8, JSONTYPE_byte): return r.randint(0, 0xFF)
+        if type in (JSONTYPE_int16, JSONTYPE_short): return r.randint(-0x8000, 0x7FFF)
+        if type in (JSONTYPE_uint16, JSONTYPE_ushort): return r.randint(0, 0xFFFF)
+        if type in (JSONTYPE_int32, JSONTYPE_int): return r.randint(-1, 10000)
+        if type in (JSONTYPE_uint32, JSONTYPE_uint): return r.randint(0, 100000)
+        if type in (JSONTYPE_int64, JSONTYPE_long): return r.randint(-1, 1 << 40)
+        if type in (JSONTYPE_uint64, JSONTYPE_ulong): return r.randint(0, 1 << 40)
+        if type in (JSONTYPE_float32, JSONTYPE_float): return r.randint(-1000, 1000) / 4.0
+        if type in (JSONTYPE_float64, JSONTYPE_double): return r.random() * 1000
+        if type == JSONTYPE_string: return 'assets/{}/{}.prefab'.format(r.randint(0, 20), r.randint(0, 10000))
+        raise NotImplementedError('Type[={}] not supported'.format(type))
+
+    def __sample_filter(self, filters, element): # type: (List[FilterDescriptor], dict)->dict
+        f = self.random.choice(filters)
+        if self.random.random() < self.accept:
+            value = f.value
+        elif f.type == JSONTYPE_bool:
+            value = not f.value
+        elif f.type == JSONTYPE_string:
+            value = '{}_'.format(f.value)
+        else:
+            value = f.value + 1
+        if element is None: element = {}
+        element[f.name] = value
+        return element
+
+    def __sample_element(self, descriptor): # type: (Union[ArrayDescriptor, DictionaryDescriptor])->any
+        if not descriptor.descriptor: return self.__sample_v(descriptor.type)
+        element = self.sample(descriptor.descriptor)
+        if descriptor.filters: element = self.__sample_filter(descriptor.filters, element)
+        return element
+
+    def __count(self): # type: ()->int
+        if self.__depth == 1 and self.records is not None: return self.records
+        return self.random.randint(0, self.size)
+
+    def sample(self, descriptor): # type: (Descriptor)->any
+        if isinstance(descriptor, ArrayDescriptor):
+            self.__depth += 1
+            elements = []
+            for _ in range(self.__count()):
+                elements.append(self.__sample_element(descriptor))
+            self.__depth -= 1
+            return elements
+        elif isinstance(descriptor, DictionaryDescriptor):
+            self.__depth += 1
+            data = {}
+            for n in range(self.__count()):
+                key = str(n) if descriptor.key != JSONTYPE_string else 'key_{}'.format(n)
+                data[key] = self.__sample_element(descriptor)
+            self.__depth -= 1
+            return data
+        elif isinstance(descriptor, ClassDescriptor):
+            obj = {}
+            for field in descriptor.fields:
+                # enum fields have no default to fall back on
+                if self.missing and not field.enum and self.random.random() < self.missing: continue
+                obj[field.name] = self.sample(field)
+            return obj
+        elif isinstance(descriptor, FieldDescriptor):
+            if descriptor.descriptor: return self.sample(descriptor.descriptor)
+            return self.__sample_v(descriptor.type, enum=descriptor.enum)
+        raise NotImplementedError('<{}/>'.format(descriptor.tag))
+
+def measure(method, repeat): # type: (Callable[[], any], int)->float
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        method()
+        elapse = time.perf_counter() - start
+        if best is None or elapse < best: best = elapse
+    return best
+
+def count_records(descriptor, value): # type: (Descriptor, any)->int
+    """number of class objects in decoded value"""
+    if value is None: return 0
+    if isinstance(descriptor, FieldDescriptor):
+        return count_records(descriptor.descriptor, value) if descriptor.descriptor else 0
+    if isinstance(descriptor, ClassDescriptor):
+        return 1 + sum(count_records(f, value.get(f.name)) for f in descriptor.fields)
+    if isinstance(descriptor, (ArrayDescriptor, DictionaryDescriptor)) and descriptor.descriptor:
+        elements = value.values() if isinstance(descriptor, DictionaryDescriptor) else value
+        return sum(count_records(descriptor.descriptor, v) for v in elements)
+    return 0
+
+def peak_memory(method): # type: (Callable[[], any])->int
+    """peak bytes allocated by python while running method once"""
+    tracemalloc.start()
+    try:
+        method()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def profile(schema, sample, repeat): # type: (JsonbufSchema, any, int)->dict
+    """throughput and peak memory of interpreted and compiled serializers on sample"""
+    size, timings = benchmark(schema, sample, repeat)
+    serializer = JsonbufSerializer(schema.descriptor, verbose=False)
+    serializer.context = sample
+    buffer = io.BytesIO()
+    serializer.serialize(buffer)
+    data = buffer.getvalue()
+    records = count_records(schema.descriptor, serializer.deserilize(io.BytesIO(data)))
+    result = {'schema': schema.name, 'bytes': size, 'records': records}
+    for compiled, (encode, decode) in zip((False, True), timings):
+        serializer = JsonbufSerializer(schema.descriptor, verbose=False, compiled=compiled)
+        serializer.context = sample
+        entry = result['compiled' if compiled else 'interpreted'] = {}
+        for name, elapse, method in (('encode', encode, lambda: serializer.serialize(io.BytesIO())),
+                                     ('decode', decode, lambda: serializer.deserilize(io.BytesIO(data)))):
+            entry[name] = {
+                'seconds': elapse,
+                'mbps': size / elapse / 1e6 if elapse else 0,
+                'records_per_second': records / elapse if elapse else 0,
+                'peak_memory': peak_memory(method),
+            }
+    return result
+
+def benchmark(schema, sample, repeat): # type: (JsonbufSchema, any, int)->Tuple[int, list]
+    serializers = []
+    for compiled in (False, True):
+        serializer = JsonbufSerializer(schema.descriptor, verbose=False, compiled=compiled)
+        serializer.context = sample
+        serializers.append(serializer)
+    buffers = []
+    for serializer in serializers:
+        buffer = io.BytesIO()
+        serializer.serialize(buffer)
+        buffers.append(buffer.getvalue())
+    assert buffers[0] == buffers[1], 'compiled output differs from {}'.format(schema.name)
+    data = buffers[0]
+    result = []
+    for serializer in serializers:
+        encode = measure(lambda: serializer.serialize(io.BytesIO()), repeat)
+        decode = measure(lambda: serializer.deserilize(io.BytesIO(data)), repeat)
+        result.append((encode, decode))
+    return len(data), result
+
+def main():
+    import argparse, sys
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument('--schema', '-s', nargs='+', help='data structure definition, all bundled schemas by default')
+    arguments.add_argument('--size', '-n', type=int, default=64, help='max elements of sampled arrays/dicts')
+    arguments.add_argument('--records', type=int, help='elements of outermost array/dict, random up to --size by default')
+    arguments.add_argument('--missing', type=float, default=0.0, help='ratio of fields left out to be filled by defaults')
+    arguments.add_argument('--seed', type=int, default=0, help='random seed of sampled documents')
+    arguments.add_argument('--repeat', '-r', type=int, default=3, help='number of timing rounds')
+    arguments.add_argument('--output', '-o', help='json file for saving results, e.g. to compare across versions')
+    options = arguments.parse_args(sys.argv[1:])
+
+    script_path = p.dirname(p.realpath(p.abspath(__file__)))
+    filenames = options.schema
+    if not filenames: filenames = sorted(glob.glob(p.join(script_path, 'schemas/**/*.xml'), recursive=True))
+
+    sampler = JsonbufSampler(JsonbufBridges.shared(), size=options.size, seed=options.seed, records=options.records, missing=options.missing)
+    print('{:40s} {:>12s} {:>10s} {:>10s} {:>8s} {:>10s} {:>10s} {:>8s} {:>10s} {:>10s}'.format(
+        'schema', 'bytes', 'encode', 'compiled', 'x', 'decode', 'compiled', 'x', 'MB/s', 'records/s'))
+    results = []
+    for filename in filenames:
+        schema = JsonbufSchema()
+        try:
+            schema.load(filename)
+        except (AssertionError, NotImplementedError) as error:
+            print('{:40s} skipped {!r}'.format(p.basename(filename), error))
+            continue
+        result = profile(schema, sampler.sample(schema.descriptor), options.repeat)
+        results.append(result)
+        interpreted, compiled = result['interpreted'], result['compiled']
+        encode, decode = interpreted['encode']['seconds'], interpreted['decode']['seconds']
+        compiled_encode, compiled_decode = compiled['encode']['seconds'], compiled['decode']['seconds']
+        print('{:40s} {:>12,} {:>9.1f}ms {:>9.1f}ms {:>7.1f}x {:>9.1f}ms {:>9.1f}ms {:>7.1f}x {:>10.1f} {:>10,.0f}'.format(
+            schema.name, result['bytes'], encode * 1000, compiled_encode * 1000, encode / compiled_encode,
+            decode * 1000, compiled_decode * 1000, decode / compiled_decode,
+            interpreted['decode']['mbps'], interpreted['decode']['records_per_second']))
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'options': vars(options),
+                'results': results,
+            }, fp, indent=4)
+        print('>>> {}'.format(p.abspath(options.output)))
+
+if __name__ == '__main__':
+    main()
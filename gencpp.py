@@ -4,6 +4,7 @@
 from __future__ import print_function
 from jsonbuf import *
 import os.path as p
+import struct
 import typing
 
 class IndexAttr(object):
@@ -20,17 +21,41 @@ class IndexAttr(object):
         return self.__next
 
 class CppGenerator(object):
-    def __init__(self, schema, output):
+    """
+    Classes with deserialize() from both JsonbufStream and the buffer-based JsonbufBuffer. With string_view
+    string values are std::string_view members viewing the decoder's data, which must outlive the objects,
+    dict keys stay std::string. Elements of aligned arrays also get a packed {name}Record struct laid out
+    byte for byte as encoded, so that arrays of them are JsonbufRecords viewing a mmap'd document in place.
+    Elements of columnar arrays get a {name}Columns struct holding one std::vector per field instead, which
+    is what arrays of them decode into.
+    """
+    DECODERS = ('JsonbufStream', 'JsonbufBuffer')
+
+    def __init__(self, schema, output, string_view=False):
         self.schema = schema  # type: JsonbufSchema
-        self.bridges = JsonbufBridges()
+        self.bridges = JsonbufBridges.shared()
         self.indent = '    '
+        self.string_view = string_view
+        self.__aligned = set() # type: Set[ClassDescriptor]
+        self.__columnar = set() # type: Set[ClassDescriptor]
         self.__hpp = CodeWriter(filename=p.join(output, '{}.h'.format(self.schema.name)))
         self.__cpp = CodeWriter(filename=p.join(output, '{}.cpp'.format(self.schema.name)))
 
     @property
     def filenames(self): return self.__hpp.filename, self.__cpp.filename
 
+    def __collect_aligned(self, descriptor, visited): # type: (Descriptor, set)->None
+        if descriptor is None or id(descriptor) in visited: return
+        visited.add(id(descriptor))
+        if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_ALIGNED: self.__aligned.add(descriptor.descriptor)
+        if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_COLUMNAR: self.__columnar.add(descriptor.descriptor)
+        if isinstance(descriptor, ClassDescriptor):
+            for field in descriptor.fields: self.__collect_aligned(field, visited)
+        else:
+            self.__collect_aligned(descriptor.descriptor, visited)
+
     def generate(self):
+        self.__collect_aligned(self.schema.descriptor, set())
         self.__hpp.write('#ifndef {}_h'.format(self.schema.name))
         self.__hpp.write('#define {}_h'.format(self.schema.name))
         self.__hpp.write('')
@@ -75,20 +100,60 @@ class CppGenerator(object):
         if type in (JSONTYPE_double, JSONTYPE_string): return 'std::string'
         return type
 
+    def __vtype(self, type): # type: (str)->str
+        if self.string_view and type == JSONTYPE_string: return 'std::string_view'
+        return self.__ctype(type)
+
     def __rtype(self, type):
         if isinstance(type, ClassDescriptor): return type.name
         if isinstance(type, ArrayDescriptor):
-            return 'std::vector<{}>'.format(self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
+            if type.layout == LAYOUT_ALIGNED: return 'JsonbufRecords<{}Record>'.format(type.descriptor.name)
+            if type.layout == LAYOUT_COLUMNAR: return '{}Columns'.format(type.descriptor.name)
+            return 'std::vector<{}>'.format(self.__rtype(type=type.descriptor) if type.descriptor else self.__vtype(type.type))
         if isinstance(type, DictionaryDescriptor):
             return 'std::map<{},{}>'\
-                .format(self.__ctype(type.key), self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
+                .format(self.__ctype(type.key), self.__rtype(type=type.descriptor) if type.descriptor else self.__vtype(type.type))
         if isinstance(type, FieldDescriptor):
             if type.descriptor: return self.__rtype(type=type.descriptor)
-            return self.__ctype(type.type)
+            return self.__vtype(type.type)
         assert isinstance(type, str)
-        return self.__ctype(type)
+        return self.__vtype(type)
+
+    def __generate_record(self, cls, indent=''): # type: (ClassDescriptor, str)->None
+        """struct of one padded record of aligned arrays, pad bytes are explicit so that records are written zeroed"""
+        offsets, size, align = aligned_layout(cls)
+        name = '{}Record'.format(cls.name)
+        self.__hpp.write('#pragma pack(push, 1)')
+        self.__hpp.write('{}struct alignas({}) {}'.format(indent, align, name))
+        self.__hpp.write('{}{{'.format(indent))
+        position, pads = 0, 0
+        for offset, field in zip(offsets, cls.fields):
+            if offset > position:
+                self.__hpp.write('{}    uint8_t __pad{}[{}] = {{}};'.format(indent, pads, offset - position))
+                pads += 1
+            self.__hpp.write('{}    {} {};'.format(indent, 'bool' if field.type == JSONTYPE_bool else self.__ctype(field.type), field.name))
+            position = offset + struct.calcsize('<' + STRUCT_FORMATS[field.type])
+        if size > position: self.__hpp.write('{}    uint8_t __pad{}[{}] = {{}};'.format(indent, pads, size - position))
+        self.__hpp.write('{}}};'.format(indent))
+        self.__hpp.write('#pragma pack(pop)')
+        self.__hpp.write('{}static_assert(sizeof({}) == {} && alignof({}) == {}, "{} must match aligned layout of {}");'.format(
+            indent, name, size, name, align, name, cls.name))
+        self.__hpp.write('')
+
+    def __generate_columns(self, cls, indent=''): # type: (ClassDescriptor, str)->None
+        """struct of the columns of columnar arrays, all of which hold size() elements"""
+        self.__hpp.write('{}struct {}Columns'.format(indent, cls.name))
+        self.__hpp.write('{}{{'.format(indent))
+        for field in cls.fields:
+            self.__hpp.write('{}    std::vector<{}> {};'.format(indent, self.__vtype(field.type), field.name))
+        self.__hpp.write('')
+        self.__hpp.write('{}    size_t size() const {{ return {}.size(); }}'.format(indent, cls.fields[0].name))
+        self.__hpp.write('{}}};'.format(indent))
+        self.__hpp.write('')
 
     def __generate_class(self, cls, indent=''):
+        if cls in self.__aligned: self.__generate_record(cls, indent)
+        if cls in self.__columnar: self.__generate_columns(cls, indent)
         self.__hpp.write('{}class {}: public IJsonbuf'.format(indent, cls.name))
         self.__hpp.write('{}{{'.format(indent))
         self.__hpp.write('{}  public:'.format(indent))
@@ -96,17 +161,31 @@ class CppGenerator(object):
             self.__hpp.write('{}    {} {};'.format(indent, self.__rtype(filed), filed.name))
         self.__hpp.write('')
         self.__hpp.write('{}  public:'.format(indent))
-        self.__hpp.write('{}    void deserialize(JsonbufStream& decoder);'.format(indent))
-        self.__generate_decode_method(cls, indent='')
-        self.__cpp.write('')
+        for decoder in self.DECODERS:
+            self.__hpp.write('{}    void deserialize({}& decoder);'.format(indent, decoder))
+            self.__generate_decode_method(cls, decoder, indent='')
+            self.__cpp.write('')
         self.__hpp.write('{}    void serialize(JsonbufStream& encoder);'.format(indent))
         self.__generate_encode_method(cls, indent='')
         self.__cpp.write('')
+        for field in cls.fields:
+            if isinstance(field.descriptor, DictionaryDescriptor) and field.descriptor.sorted:
+                for decoder in self.DECODERS:
+                    self.__hpp.write('{}    static bool {};'.format(indent, self.__lookup_signature(field, decoder)))
+                    self.__generate_lookup_method(cls, field, decoder, indent='')
+                    self.__cpp.write('')
+            if isinstance(field.descriptor, ArrayDescriptor) and field.descriptor.indexed:
+                for decoder in self.DECODERS:
+                    self.__hpp.write('{}    static bool {};'.format(indent, self.__element_signature(field, decoder)))
+                    self.__generate_element_method(cls, field, decoder, indent='')
+                    self.__cpp.write('')
         self.__hpp.write('{}}};'.format(indent))
 
-    def __generate_decode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
-        self.__cpp.write('{}void {}::deserialize(JsonbufStream& decoder)'.format(indent, cls.name))
+    def __generate_decode_method(self, cls, decoder, indent): # type: (ClassDescriptor, str, str)->None
+        self.__cpp.write('{}void {}::deserialize({}& decoder)'.format(indent, cls.name, decoder))
         self.__cpp.write('{}{{'.format(indent))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__cpp.write('{}{}decoder.read_pool();'.format(indent, self.indent))
         index = IndexAttr(0)
         for field in cls.fields:
             self.__generate_decode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
@@ -115,13 +194,85 @@ class CppGenerator(object):
     def __generate_encode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
         self.__cpp.write('{}void {}::serialize(JsonbufStream& encoder)'.format(indent, cls.name))
         self.__cpp.write('{}{{'.format(indent))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__cpp.write('{}{}encoder.begin_pool();'.format(indent, self.indent))
         index = IndexAttr(0)
         for field in cls.fields:
             self.__generate_encode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
+        if pooled: self.__cpp.write('{}{}encoder.end_pool();'.format(indent, self.indent))
         self.__cpp.write('{}}}'.format(indent))
 
+    def __lookup_signature(self, field, decoder, cls=None): # type: (FieldDescriptor, str, ClassDescriptor)->str
+        descriptor = field.descriptor # type: DictionaryDescriptor
+        return '{}lookup_{}({}& decoder, const {}& key, {}& value)'.format(
+            '{}::'.format(cls.name) if cls else '', field.name, decoder, self.__ctype(descriptor.key),
+            self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type))
+
+    def __generate_lookup_method(self, cls, field, decoder, indent): # type: (ClassDescriptor, FieldDescriptor, str, str)->None
+        descriptor = field.descriptor # type: DictionaryDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count, key, val = 'c{}'.format(name), 'k{}'.format(name), 'v{}'.format(name)
+        self.__cpp.write('{}bool {}'.format(indent, self.__lookup_signature(field, decoder, cls)))
+        self.__cpp.write('{}{{'.format(indent))
+        outer, indent = indent, indent + self.indent
+        self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_count_m(descriptor.varint)))
+        self.__cpp.write('{}if ({} == 0xFFFFFFFF) {{ return false; }}'.format(indent, count))
+        if descriptor.varint and descriptor.key in VARINT_RANGES:
+            self.__cpp.write('{}auto n{} = decoder.find_block({}, key, [&decoder]() {{ return decoder.{}(); }});'.format(
+                indent, name, count, self.__get_decode_m(descriptor.key, True)))
+        else:
+            self.__cpp.write('{}auto n{} = decoder.find_block({}, key);'.format(indent, name, count))
+        if descriptor.key == JSONTYPE_string:
+            self.__cpp.write('{}std::string {};'.format(indent, key))
+        self.__cpp.write('{}for (uint32_t {} = 0; {} < n{}; {}++)'.format(indent, name, name, name, name))
+        self.__cpp.write('%s{' % indent)
+        if descriptor.key == JSONTYPE_string:
+            self.__cpp.write('{}    decoder.read_prefixed_string({}, {} == 0);'.format(indent, key, name))
+        else:
+            self.__cpp.write('{}    auto {} = decoder.{}();'.format(indent, key, self.__get_decode_m(descriptor.key, descriptor.varint)))
+        self.__cpp.write('{}    {} {};'.format(indent, self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type), val))
+        if descriptor.descriptor:
+            self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=2, attr=index)
+        else:
+            self.__cpp.write('{}    {} = decoder.{}();'.format(indent, val, self.__read_m(descriptor.type, descriptor.varint)))
+        self.__cpp.write('{}    if ({} == key) {{ value = std::move({}); return true; }}'.format(indent, key, val))
+        self.__cpp.write('%s}' % indent)
+        self.__cpp.write('{}return false;'.format(indent))
+        self.__cpp.write('{}}}'.format(outer))
+
+    def __element_signature(self, field, decoder, cls=None): # type: (FieldDescriptor, str, ClassDescriptor)->str
+        return '{}read_{}_at({}& decoder, uint32_t n, {}& value)'.format(
+            '{}::'.format(cls.name) if cls else '', field.name, decoder, self.__rtype(field.descriptor.descriptor))
+
+    def __generate_element_method(self, cls, field, decoder, indent): # type: (ClassDescriptor, FieldDescriptor, str, str)->None
+        descriptor = field.descriptor # type: ArrayDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count = 'c{}'.format(name)
+        self.__cpp.write('{}bool {}'.format(indent, self.__element_signature(field, decoder, cls)))
+        self.__cpp.write('{}{{'.format(indent))
+        outer, indent = indent, indent + self.indent
+        self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_count_m(descriptor.varint)))
+        self.__cpp.write('{}if ({} == 0xFFFFFFFF || n >= {}) {{ return false; }}'.format(indent, count, count))
+        self.__cpp.write('{}decoder.seek_element({}, n);'.format(indent, count))
+        self.__generate_decode_field('value', descriptor=descriptor.descriptor, indent=indent, level=2, attr=index)
+        self.__cpp.write('{}return true;'.format(indent))
+        self.__cpp.write('{}}}'.format(outer))
+
+    def __min_size(self, descriptor, scalar=None): # type: (Optional[Descriptor], Union[ArrayDescriptor, FieldDescriptor])->int
+        """fewest bytes an element may take, descriptor is None for scalar elements typed by scalar"""
+        if isinstance(descriptor, ClassDescriptor): return sum(self.__min_size(f.descriptor, f) for f in descriptor.fields)
+        if isinstance(descriptor, (ArrayDescriptor, DictionaryDescriptor)): return 1 if descriptor.varint else 4
+        if scalar.varint and scalar.type in VARINT_RANGES: return 1
+        # strings are a size or a pool offset
+        if scalar.type == JSONTYPE_string: return 2
+        return struct.calcsize('<' + STRUCT_FORMATS[scalar.type])
+
     @staticmethod
-    def __get_decode_m(type):
+    def __get_decode_m(type, varint=False):
+        if varint and type in VARINT_RANGES:
+            return '{}<{}>'.format('read_zigzag' if VARINT_RANGES[type][0] < 0 else 'read_varint', CppGenerator.__ctype(type))
         if type == JSONTYPE_bool: return 'read<bool>'
         elif type == JSONTYPE_int8: return 'read<int8_t>'
         elif type in (JSONTYPE_uint8, JSONTYPE_byte): return 'read<uint8_t>'
@@ -133,11 +284,12 @@ class CppGenerator(object):
         elif type in (JSONTYPE_uint64, JSONTYPE_ulong): return 'read<uint64_t>'
         elif type in (JSONTYPE_float32, JSONTYPE_float): return 'read<float>'
         elif type in (JSONTYPE_float64, JSONTYPE_double): return 'read<double>'
-        elif type == JSONTYPE_string: return 'read<std::string>'
+        elif type == JSONTYPE_string: return 'read_string'
         raise NotImplementedError('Type[={}] not supported'.format(type))
 
     @staticmethod
-    def __get_encode_m(type):
+    def __get_encode_m(type, varint=False):
+        if varint and type in VARINT_RANGES: return 'write_zigzag' if VARINT_RANGES[type][0] < 0 else 'write_varint'
         if type == JSONTYPE_bool: return 'write<bool>'
         elif type == JSONTYPE_int8: return 'write<int8_t>'
         elif type in (JSONTYPE_uint8, JSONTYPE_byte): return 'write<uint8_t>'
@@ -149,16 +301,31 @@ class CppGenerator(object):
         elif type in (JSONTYPE_uint64, JSONTYPE_ulong): return 'write<uint64_t>'
         elif type in (JSONTYPE_float32, JSONTYPE_float): return 'write<float>'
         elif type in (JSONTYPE_float64, JSONTYPE_double): return 'write<double>'
-        elif type == JSONTYPE_string: return 'write<std::string>'
+        elif type == JSONTYPE_string: return 'write_string'
         raise NotImplementedError('Type[={}] not supported'.format(type))
 
+    def __read_m(self, type, varint=False): # type: (str, bool)->str
+        """decode method of values, strings are read as views with string_view"""
+        if self.string_view and type == JSONTYPE_string: return 'read_string_view'
+        return self.__get_decode_m(type, varint)
+
+    def __get_count_m(self, varint): # type: (bool)->str
+        return 'read_varint_count' if varint else self.__get_decode_m(JSONTYPE_uint)
+
+    def __write_count(self, count, varint, indent): # type: (str, bool, str)->None
+        # varint counts are written as count + 1, 0 is reserved for null
+        if varint:
+            self.__cpp.write('{}encoder.write_varint({} + 1);'.format(indent, count))
+        else:
+            self.__cpp.write('{}encoder.{}(static_cast<{}>({}));'.format(indent, self.__get_encode_m(JSONTYPE_uint), self.__ctype(JSONTYPE_uint32), count))
+
     @staticmethod
     def __local_name(index): # type: (int)->str
         shift = ord('l') - 97
         value = ''
         while index > 0:
             c = index % 26
-            index /= 26
+            index //= 26
             value += chr(((c + shift) % 26) + 97)
         return value
 
@@ -170,35 +337,59 @@ class CppGenerator(object):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             element = 't{}'.format(index)
-            self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
-            # self.__cpp.write('{}{}.reserve({});'.format(indent, name, count))
+            self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_count_m(descriptor.varint)))
+            if descriptor.layout == LAYOUT_ALIGNED:
+                self.__cpp.write('{}if ({} == 0xFFFFFFFF) {{ {} = {}(); }} else {{ decoder.read_records({}, {}); }}'.format(
+                    indent, count, name, self.__rtype(descriptor), name, count))
+                return
+            if descriptor.layout == LAYOUT_COLUMNAR:
+                self.__cpp.write('{}if ({} == 0xFFFFFFFF) {{ {} = {}(); }} else {{'.format(indent, count, name, self.__rtype(descriptor)))
+                for field in descriptor.descriptor.fields:
+                    self.__cpp.write('{}    decoder.read_column({}.{}, {});'.format(indent, name, field.name, count))
+                self.__cpp.write('%s}' % indent)
+                return
             self.__cpp.write('{}if ({} == 0xFFFFFFFF) {{ {} = {}(); }} else {{'.format(indent, count, name, self.__rtype(descriptor)))
+            self.__cpp.write('{}{}.reserve(decoder.reserve_count({}, {}));'.format(indent, name, count, self.__min_size(descriptor.descriptor, descriptor)))
+            if descriptor.indexed:
+                self.__cpp.write('{}auto o{} = decoder.read_offsets({});'.format(indent, index, count))
+                self.__cpp.write('{}auto b{} = decoder.tellg();'.format(indent, index))
             self.__cpp.write('{}for (auto {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
             self.__cpp.write('%s{' % indent)
             self.__cpp.write('{}    {} {};'.format(indent, self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type), element))
             if descriptor.descriptor:
                 self.__generate_decode_field(element, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__cpp.write('{}    {} = decoder.{}();'.format(indent, element, self.__get_decode_m(descriptor.type)))
-            self.__cpp.write('{}    {}.emplace_back({});'.format(indent, name, element))
-            self.__cpp.write('%s}}' % indent)
+                self.__cpp.write('{}    {} = decoder.{}();'.format(indent, element, self.__read_m(descriptor.type, descriptor.varint)))
+            self.__cpp.write('{}    {}.emplace_back(std::move({}));'.format(indent, name, element))
+            self.__cpp.write('%s}' % indent)
+            # end of an indexed array is where its table says, whatever the elements read
+            if descriptor.indexed: self.__cpp.write('{}decoder.seekg(b{} + std::streamoff(o{}[{}]));'.format(indent, index, index, count))
+            self.__cpp.write('%s}' % indent)
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             key = 'k{}'.format(index)
             val = 'v{}'.format(index)
-            self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
-            # self.__cpp.write('{}{}.reserve({});'.format(indent, name, count))
+            self.__cpp.write('{}auto {} = decoder.{}();'.format(indent, count, self.__get_count_m(descriptor.varint)))
             self.__cpp.write('{}if ({} == 0xFFFFFFFF) {{ {} = {}(); }} else {{'.format(indent, count, name, self.__rtype(descriptor)))
+            if descriptor.sorted:
+                self.__cpp.write('{}auto o{} = decoder.read_offsets(({} + 15) / 16);'.format(indent, index, count))
+            if descriptor.sorted and descriptor.key == JSONTYPE_string:
+                self.__cpp.write('{}std::string {};'.format(indent, key))
             self.__cpp.write('{}for (auto {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
             self.__cpp.write('%s{' % indent)
             self.__cpp.write('{}    {} {};'.format(indent, self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type), val))
-            self.__cpp.write('{}    auto {} = decoder.{}();'.format(indent, key, self.__get_decode_m(descriptor.key)))
+            if descriptor.sorted and descriptor.key == JSONTYPE_string:
+                self.__cpp.write('{}    decoder.read_prefixed_string({}, {} % 16 == 0);'.format(indent, key, index))
+            else:
+                self.__cpp.write('{}    auto {} = decoder.{}();'.format(indent, key, self.__get_decode_m(descriptor.key, descriptor.varint)))
             if descriptor.descriptor:
                 self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__cpp.write('{}    {} = decoder.{}();'.format(indent, val, self.__get_decode_m(descriptor.type)))
-            self.__cpp.write('{}    {}.insert(std::make_pair({}, {}));'.format(indent, name, key, val))
+                self.__cpp.write('{}    {} = decoder.{}();'.format(indent, val, self.__read_m(descriptor.type, descriptor.varint)))
+            # std::map has no reserve(), hinting at the end makes the key-ordered input of sorted dicts O(1) per entry,
+            # keys of sorted dicts are front-coded from the previous one and can't be moved
+            self.__cpp.write('{}    {}.emplace_hint({}.end(), {}, std::move({}));'.format(indent, name, name, key, val))
             self.__cpp.write('%s}}' % indent)
         else:
             assert isinstance(descriptor, FieldDescriptor)
@@ -206,7 +397,7 @@ class CppGenerator(object):
             if field.descriptor:
                 self.__generate_decode_field(name=field.name, descriptor=field.descriptor, indent=indent, level=level, attr=attr)
             else:
-                self.__cpp.write('{}{} = decoder.{}();'.format(indent, name, self.__get_decode_m(field.type)))
+                self.__cpp.write('{}{} = decoder.{}();'.format(indent, name, self.__read_m(field.type, field.varint)))
 
     def __generate_encode_field(self, name, descriptor, indent, level=0, attr=None): # type: (str, Descriptor, str, int, IndexAttr)->None
         if isinstance(descriptor, ClassDescriptor):
@@ -214,37 +405,77 @@ class CppGenerator(object):
         elif isinstance(descriptor, ArrayDescriptor):
             index = self.__local_name(attr.next)
             count = '{}.size()'.format(name)
-            static_cast_count = 'static_cast<{}>({})'.format(self.__ctype(JSONTYPE_uint32), count)
             element = '*{}'.format(index)
-            self.__cpp.write('{}encoder.{}({});'.format(indent, self.__get_encode_m(JSONTYPE_uint), static_cast_count))
+            self.__write_count(count, descriptor.varint, indent)
+            if descriptor.layout == LAYOUT_ALIGNED:
+                self.__cpp.write('{}encoder.write_records({});'.format(indent, name))
+                return
+            if descriptor.layout == LAYOUT_COLUMNAR:
+                for field in descriptor.descriptor.fields:
+                    self.__cpp.write('{}encoder.write_column({}.{});'.format(indent, name, field.name))
+                return
+            if descriptor.indexed:
+                table, base, offsets = 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index)
+                self.__cpp.write('{}auto {} = encoder.tellp();'.format(indent, table))
+                self.__cpp.write('{}std::vector<uint32_t> {}({} + 1);'.format(indent, offsets, count))
+                self.__cpp.write('{}encoder.write_offsets({});'.format(indent, offsets))
+                self.__cpp.write('{}auto {} = encoder.tellp();'.format(indent, base))
             self.__cpp.write('{}for (auto {} = {}.begin(); {} != {}.end(); {}++)'.format(indent, index, name, index, name, index))
             self.__cpp.write('%s{' % indent)
+            if descriptor.indexed:
+                self.__cpp.write('{}    {}[{} - {}.begin()] = static_cast<uint32_t>(encoder.tellp() - {});'.format(indent, offsets, index, name, base))
             if descriptor.descriptor:
                 self.__generate_encode_field('({})'.format(element), descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__cpp.write('{}    encoder.{}({});'.format(indent, self.__get_encode_m(descriptor.type), element))
+                self.__cpp.write('{}    encoder.{}({});'.format(indent, self.__get_encode_m(descriptor.type, descriptor.varint), element))
             self.__cpp.write('%s}' % indent)
+            if descriptor.indexed:
+                self.__cpp.write('{}{}.back() = static_cast<uint32_t>(encoder.tellp() - {});'.format(indent, offsets, base))
+                self.__cpp.write('{}encoder.seekp({});'.format(indent, table))
+                self.__cpp.write('{}encoder.write_offsets({});'.format(indent, offsets))
+                self.__cpp.write('{}encoder.seekp({} + std::streamoff({}.back()));'.format(indent, base, offsets))
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = '{}.size()'.format(name)
-            static_cast_count = 'static_cast<{}>({})'.format(self.__ctype(JSONTYPE_uint32), count)
             pair = 'p{}'.format(index)
-            self.__cpp.write('{}encoder.{}({});'.format(indent, self.__get_encode_m(JSONTYPE_uint), static_cast_count))
-            self.__cpp.write('{}for (auto {} = {}.begin(); {} != {}.end(); {}++)'.format(indent, pair, name, pair, name, pair))
-            self.__cpp.write('%s{' % indent)
-            self.__cpp.write('{}    encoder.{}({}->first);'.format(indent, self.__get_encode_m(descriptor.key), pair))
+            self.__write_count(count, descriptor.varint, indent)
+            if descriptor.sorted:
+                # std::map iterates in key order, std::string compares as unsigned bytes
+                table, base, offsets, previous = 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index), 'r{}'.format(index)
+                self.__cpp.write('{}auto {} = encoder.tellp();'.format(indent, table))
+                self.__cpp.write('{}std::vector<uint32_t> {}(({} + 15) / 16 + 1);'.format(indent, offsets, count))
+                self.__cpp.write('{}encoder.write_offsets({});'.format(indent, offsets))
+                self.__cpp.write('{}auto {} = encoder.tellp();'.format(indent, base))
+                self.__cpp.write('{}uint32_t {} = 0;'.format(indent, index))
+                self.__cpp.write('{}for (auto {} = {}.begin(), {} = {}.begin(); {} != {}.end(); {} = {}++, {}++)'.format(
+                    indent, pair, name, previous, name, pair, name, previous, pair, index))
+                self.__cpp.write('%s{' % indent)
+                self.__cpp.write('{}    if ({} % 16 == 0) {{ {}[{} / 16] = static_cast<uint32_t>(encoder.tellp() - {}); }}'.format(indent, index, offsets, index, base))
+                if descriptor.key == JSONTYPE_string:
+                    self.__cpp.write('{}    encoder.write_prefixed_string({}->first, {}->first, {} % 16 == 0);'.format(indent, pair, previous, index))
+                else:
+                    self.__cpp.write('{}    encoder.{}({}->first);'.format(indent, self.__get_encode_m(descriptor.key, descriptor.varint), pair))
+            else:
+                self.__cpp.write('{}for (auto {} = {}.begin(); {} != {}.end(); {}++)'.format(indent, pair, name, pair, name, pair))
+                self.__cpp.write('%s{' % indent)
+                self.__cpp.write('{}    encoder.{}({}->first);'.format(indent, self.__get_encode_m(descriptor.key, descriptor.varint), pair))
             if descriptor.descriptor:
                 self.__generate_encode_field('{}->second'.format(pair), descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__cpp.write('{}    encoder.{}({}->second);'.format(indent, self.__get_encode_m(descriptor.type), pair))
+                self.__cpp.write('{}    encoder.{}({}->second);'.format(indent, self.__get_encode_m(descriptor.type, descriptor.varint), pair))
             self.__cpp.write('%s}' % indent)
+            if descriptor.sorted:
+                self.__cpp.write('{}{}.back() = static_cast<uint32_t>(encoder.tellp() - {});'.format(indent, offsets, base))
+                self.__cpp.write('{}encoder.seekp({});'.format(indent, table))
+                self.__cpp.write('{}encoder.write_offsets({});'.format(indent, offsets))
+                self.__cpp.write('{}encoder.seekp({} + std::streamoff({}.back()));'.format(indent, base, offsets))
         else:
             assert isinstance(descriptor, FieldDescriptor)
             field = descriptor
             if field.descriptor:
                 self.__generate_encode_field(name=field.name, descriptor=field.descriptor, indent=indent, level=level, attr=attr)
             else:
-                self.__cpp.write('{}encoder.{}({});'.format(indent, self.__get_encode_m(field.type), field.name))
+                self.__cpp.write('{}encoder.{}({});'.format(indent, self.__get_encode_m(field.type, field.varint), field.name))
 
 
 
@@ -254,6 +485,7 @@ def main():
     arguments.add_argument('--schema', '-s', nargs='+', required=True, help='data structure definition')
     arguments.add_argument('--output', '-o', default='.', help='path for saving generated files')
     arguments.add_argument('--verbose', '-v', action='store_true', help='enable verbose printing')
+    arguments.add_argument('--string-view', action='store_true', help='decode string values as std::string_view into the decoder\'s data')
     options = arguments.parse_args(sys.argv[1:])
 
     output = p.abspath(options.output)
@@ -262,7 +494,7 @@ def main():
         print('[S] {}'.format(p.abspath(filename)))
         schema = JsonbufSchema()
         schema.load(filename)
-        generator = CppGenerator(schema, output)
+        generator = CppGenerator(schema, output, string_view=options.string_view)
         generator.generate()
         print('>>> {}\n'.format(generator.filenames))
 
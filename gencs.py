@@ -19,10 +19,19 @@ class IndexAttr(object):
         return self.__next
 
 class CSharpGenerator(object):
+    """
+    Classes deserialize from both the stream-based JsonbufReader and JsonbufSpanReader over a document in
+    memory, lists and dicts are presized from their decoded counts. Elements of aligned arrays also get an
+    explicit layout {name}Record struct matching the encoded record byte for byte, arrays of them are read
+    and written as one block. Columnar arrays are held as a {name}Columns class with one array per field,
+    numeric columns are read and written as one block, bool columns as bitmaps.
+    """
     def __init__(self, schema, output):
         self.schema = schema  # type: JsonbufSchema
-        self.bridges = JsonbufBridges()
+        self.bridges = JsonbufBridges.shared()
         self.indent = '    '
+        self.__aligned = set() # type: Set[ClassDescriptor]
+        self.__columnar = set() # type: Set[ClassDescriptor]
         self.__code = CodeWriter(filename=p.join(output, '{}.cs'.format(self.schema.name)))
 
     @property
@@ -44,10 +53,22 @@ class CSharpGenerator(object):
                 namespaces.append(enum.namespace)
         return namespaces
 
+    def __collect_layouts(self, descriptor, visited): # type: (Descriptor, set)->None
+        if descriptor is None or id(descriptor) in visited: return
+        visited.add(id(descriptor))
+        if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_ALIGNED: self.__aligned.add(descriptor.descriptor)
+        if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_COLUMNAR: self.__columnar.add(descriptor.descriptor)
+        if isinstance(descriptor, ClassDescriptor):
+            for field in descriptor.fields: self.__collect_layouts(field, visited)
+        else:
+            self.__collect_layouts(descriptor.descriptor, visited)
+
     def generate(self):
         uniques = []
         namespaces = self.__get_namespaces(self.schema.descriptor)
+        self.__collect_layouts(self.schema.descriptor, set())
         self.__code.write('using System.Collections.Generic;')
+        if self.__aligned: self.__code.write('using System.Runtime.InteropServices;')
         for ns in namespaces:
             if ns in uniques: continue
             uniques.append(ns)
@@ -79,6 +100,8 @@ class CSharpGenerator(object):
     def __rtype(self, type):
         if isinstance(type, ClassDescriptor): return type.name
         if isinstance(type, ArrayDescriptor):
+            if type.layout == LAYOUT_ALIGNED: return '{}Record[]'.format(type.descriptor.name)
+            if type.layout == LAYOUT_COLUMNAR: return '{}Columns'.format(type.descriptor.name)
             if not type.mutable:
                 return (self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type)) + '[]'
             return 'List<{}>'.format(self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
@@ -91,7 +114,31 @@ class CSharpGenerator(object):
         assert isinstance(type, str)
         return self.__ctype(type)
 
+    def __generate_record(self, cls, indent=''): # type: (ClassDescriptor, str)->None
+        """struct of one padded record of aligned arrays, pad bytes are left zeroed by the explicit size"""
+        offsets, size, _ = aligned_layout(cls)
+        self.__code.write('{}[StructLayout(LayoutKind.Explicit, Size = {})]'.format(indent, size))
+        self.__code.write('{}public struct {}Record'.format(indent, cls.name))
+        self.__code.write('{}{{'.format(indent))
+        for offset, field in zip(offsets, cls.fields):
+            self.__code.write('{}    [FieldOffset({})] public {} {};'.format(indent, offset, self.__ctype(field.type), field.name))
+        self.__code.write('{}}}'.format(indent))
+        self.__code.write('')
+
+    def __generate_columns(self, cls, indent=''): # type: (ClassDescriptor, str)->None
+        """columns of columnar arrays, enums are kept as their numbers like in records"""
+        self.__code.write('{}public class {}Columns'.format(indent, cls.name))
+        self.__code.write('{}{{'.format(indent))
+        for field in cls.fields:
+            self.__code.write('{}    public {}[] {};'.format(indent, self.__ctype(field.type), field.name))
+        self.__code.write('')
+        self.__code.write('{}    public int Count {{ get {{ return {} == null ? 0 : {}.Length; }} }}'.format(indent, cls.fields[0].name, cls.fields[0].name))
+        self.__code.write('{}}}'.format(indent))
+        self.__code.write('')
+
     def __generate_class(self, cls, indent=''):
+        if cls in self.__aligned: self.__generate_record(cls, indent)
+        if cls in self.__columnar: self.__generate_columns(cls, indent)
         self.__code.write('{}public partial class {}:IJsonbuf'.format(indent, cls.name))
         self.__code.write('{}{{'.format(indent))
         for filed in cls.fields:
@@ -100,25 +147,93 @@ class CSharpGenerator(object):
         self.__generate_encode_method(cls, indent=indent + self.indent)
         self.__code.write('')
         self.__generate_decode_method(cls, indent=indent + self.indent)
+        self.__code.write('')
+        self.__generate_decode_method(cls, indent=indent + self.indent, span=True)
+        for field in cls.fields:
+            if isinstance(field.descriptor, DictionaryDescriptor) and field.descriptor.sorted:
+                self.__code.write('')
+                self.__generate_lookup_method(field, indent=indent + self.indent)
+            if isinstance(field.descriptor, ArrayDescriptor) and field.descriptor.indexed:
+                self.__code.write('')
+                self.__generate_element_method(field, indent=indent + self.indent)
         self.__code.write('{}}}'.format(indent))
         self.__code.write('')
 
-    def __generate_decode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
-        self.__code.write('{}public void Deserialize(JsonbufReader decoder)'.format(indent))
+    def __generate_decode_method(self, cls, indent, span=False): # type: (ClassDescriptor, str, bool)->None
+        self.__code.write('{}public void Deserialize({})'.format(indent, 'ref JsonbufSpanReader decoder' if span else 'JsonbufReader decoder'))
         self.__code.write('{}{{'.format(indent))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__code.write('{}{}decoder.ReadPool();'.format(indent, self.indent))
         index = IndexAttr(0)
         for field in cls.fields:
-            self.__generate_decode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
+            self.__generate_decode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index, span=span)
         self.__code.write('{}}}'.format(indent))
 
     def __generate_encode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
         self.__code.write('{}public void Serialize(JsonbufWriter encoder)'.format(indent))
         self.__code.write('{}{{'.format(indent))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__code.write('{}{}encoder.BeginPool();'.format(indent, self.indent))
         index = IndexAttr(0)
         for field in cls.fields:
             self.__generate_encode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
+        if pooled: self.__code.write('{}{}encoder.EndPool();'.format(indent, self.indent))
         self.__code.write('{}}}'.format(indent))
 
+    def __generate_lookup_method(self, field, indent): # type: (FieldDescriptor, str)->None
+        descriptor = field.descriptor # type: DictionaryDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count, key, val = 'c{}'.format(name), 'k{}'.format(name), 'v{}'.format(name)
+        rtype = self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type)
+        self.__code.write('{}public static bool Lookup{}(JsonbufReader decoder, {} key, out {} value)'.format(
+            indent, field.name[:1].upper() + field.name[1:], self.__ctype(descriptor.key), rtype))
+        self.__code.write('{}{{'.format(indent))
+        outer, indent = indent, indent + self.indent
+        self.__code.write('{}value = default({});'.format(indent, rtype))
+        self.__code.write('{}var {} = {};'.format(indent, count, self.__read_count(descriptor.varint)))
+        self.__code.write('{}if ({} == 0xFFFFFFFF) return false;'.format(indent, count))
+        if descriptor.key == JSONTYPE_string:
+            self.__code.write('{}var n{} = decoder.FindBlock({}, key);'.format(indent, name, count))
+            self.__code.write('{}byte[] r{} = null;'.format(indent, name))
+        elif descriptor.varint and descriptor.key in VARINT_RANGES:
+            self.__code.write('{}var n{} = decoder.FindBlock({}, key, () => {});'.format(indent, name, count, self.__read(descriptor.key, True)))
+        else:
+            self.__code.write('{}var n{} = decoder.FindBlock({}, key, decoder.{});'.format(indent, name, count, self.__get_decode_m(descriptor.key)))
+        self.__code.write('{}for (var {} = 0; {} < n{}; {}++)'.format(indent, name, name, name, name))
+        self.__code.write('%s{' % indent)
+        self.__code.write('{}    {} {};'.format(indent, rtype, val))
+        if descriptor.key == JSONTYPE_string:
+            self.__code.write('{}    var {} = decoder.ReadPrefixedString(ref r{}, {} == 0);'.format(indent, key, name, name))
+        else:
+            self.__code.write('{}    var {} = {};'.format(indent, key, self.__read(descriptor.key, descriptor.varint)))
+        if descriptor.descriptor:
+            self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=2, attr=index)
+        else:
+            self.__code.write('{}    {} = {};'.format(indent, val, self.__read(descriptor.type, descriptor.varint)))
+        self.__code.write('{}    if ({} == key) {{ value = {}; return true; }}'.format(indent, key, val))
+        self.__code.write('%s}' % indent)
+        self.__code.write('{}return false;'.format(indent))
+        self.__code.write('{}}}'.format(outer))
+
+    def __generate_element_method(self, field, indent): # type: (FieldDescriptor, str)->None
+        descriptor = field.descriptor # type: ArrayDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count = 'c{}'.format(name)
+        rtype = self.__rtype(descriptor.descriptor)
+        self.__code.write('{}public static bool Read{}At(JsonbufReader decoder, uint n, out {} value)'.format(
+            indent, field.name[:1].upper() + field.name[1:], rtype))
+        self.__code.write('{}{{'.format(indent))
+        outer, indent = indent, indent + self.indent
+        self.__code.write('{}value = default({});'.format(indent, rtype))
+        self.__code.write('{}var {} = {};'.format(indent, count, self.__read_count(descriptor.varint)))
+        self.__code.write('{}if ({} == 0xFFFFFFFF || n >= {}) return false;'.format(indent, count, count))
+        self.__code.write('{}decoder.SeekElement({}, n);'.format(indent, count))
+        self.__generate_decode_field('value', descriptor=descriptor.descriptor, indent=indent, level=2, attr=index)
+        self.__code.write('{}return true;'.format(indent))
+        self.__code.write('{}}}'.format(outer))
+
     @staticmethod
     def __get_decode_m(type):
         if type == JSONTYPE_bool: return 'ReadBoolean'
@@ -135,103 +250,211 @@ class CSharpGenerator(object):
         elif type == JSONTYPE_string: return 'ReadString'
         raise NotImplementedError('Type[={}] not supported'.format(type))
 
+    def __read(self, type, varint): # type: (str, bool)->str
+        if varint and type in VARINT_RANGES:
+            return '({})decoder.{}()'.format(self.__ctype(type), 'ReadZigzag' if VARINT_RANGES[type][0] < 0 else 'ReadVarint')
+        return 'decoder.{}()'.format(self.__get_decode_m(type))
+
+    @staticmethod
+    def __write(type, varint, value): # type: (str, bool, str)->str
+        if varint and type in VARINT_RANGES:
+            return 'encoder.{}({});'.format('WriteZigzag' if VARINT_RANGES[type][0] < 0 else 'WriteVarint', value)
+        return 'encoder.Write({});'.format(value)
+
+    def __read_column(self, type): # type: (str)->str
+        if type == JSONTYPE_bool: return 'ReadBitmap'
+        if type == JSONTYPE_string: return 'ReadStrings'
+        return 'ReadColumn<{}>'.format(self.__ctype(type))
+
+    @staticmethod
+    def __write_column(type): # type: (str)->str
+        if type == JSONTYPE_bool: return 'WriteBitmap'
+        if type == JSONTYPE_string: return 'WriteStrings'
+        return 'WriteColumn'
+
+    def __read_count(self, varint): # type: (bool)->str
+        return 'decoder.ReadVarintCount()' if varint else 'decoder.{}()'.format(self.__get_decode_m(JSONTYPE_uint))
+
+    @staticmethod
+    def __write_count(name, count, varint): # type: (str, str, bool)->str
+        # varint counts are written as count + 1, 0 is reserved for null
+        if varint: return 'if ({} == null) {{ encoder.WriteVarint(0); }} else {{'.format(name), 'encoder.WriteVarint((ulong){} + 1);'.format(count)
+        return 'if ({} == null) {{ encoder.Write((int)-1); }} else {{'.format(name), 'encoder.Write((uint){});'.format(count)
+
     @staticmethod
     def __local_name(index): # type: (int)->str
         shift = ord('l') - 97
         value = ''
         while index > 0:
             c = index % 26
-            index /= 26
+            index //= 26
             value += chr(((c + shift) % 26) + 97)
         return value
 
 
-    def __generate_decode_field(self, name, descriptor, indent, level=0, attr=None): # type: (str, Descriptor, str, int, IndexAttr)->None
+    def __generate_decode_field(self, name, descriptor, indent, level=0, attr=None, span=False): # type: (str, Descriptor, str, int, IndexAttr, bool)->None
         if isinstance(descriptor, ClassDescriptor):
             self.__code.write('{}{} = new {}();'.format(indent, name, self.__rtype(descriptor)))
-            self.__code.write('{}{}.Deserialize(decoder);'.format(indent, name))
+            self.__code.write('{}{}.Deserialize({});'.format(indent, name, 'ref decoder' if span else 'decoder'))
         elif isinstance(descriptor, ArrayDescriptor):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             element = 't{}'.format(index)
-            self.__code.write('{}var {} = decoder.{}();'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
+            self.__code.write('{}var {} = {};'.format(indent, count, self.__read_count(descriptor.varint)))
+            if descriptor.layout == LAYOUT_ALIGNED:
+                self.__code.write('{}if ({} == 0xFFFFFFFF) {{ {} = null; }} else {{ {} = decoder.ReadRecords<{}Record>({}, {}); }}'.format(
+                    indent, count, name, name, descriptor.descriptor.name, count, aligned_layout(descriptor.descriptor)[2]))
+                return
+            if descriptor.layout == LAYOUT_COLUMNAR:
+                self.__code.write('{}if ({} == 0xFFFFFFFF) {{ {} = null; }} else {{'.format(indent, count, name))
+                self.__code.write('{}{} = new {}();'.format(indent, name, self.__rtype(descriptor)))
+                for field in descriptor.descriptor.fields:
+                    self.__code.write('{}{}.{} = decoder.{}({});'.format(indent, name, field.name, self.__read_column(field.type), count))
+                self.__code.write('%s}' % indent)
+                return
             self.__code.write('{}if ({} == 0xFFFFFFFF) {{ {} = null; }} else {{'.format(indent, count, name))
+            if descriptor.indexed:
+                self.__code.write('{}var o{} = decoder.ReadOffsets({});'.format(indent, index, count))
+                self.__code.write('{}var b{} = decoder.Position;'.format(indent, index))
             rtype = self.__rtype(descriptor)
             sep = rtype.find('[') + 1
-            constructor = '{}()'.format(rtype) if descriptor.mutable else (rtype[:sep] + count + rtype[sep:])
+            constructor = '{}((int){})'.format(rtype, count) if descriptor.mutable else (rtype[:sep] + count + rtype[sep:])
             self.__code.write('{}{} = new {};'.format(indent, name, constructor))
             self.__code.write('{}for (var {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
             self.__code.write('%s{' % indent)
             self.__code.write('{}    {} {};'.format(indent, self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type), element))
             if descriptor.descriptor:
-                self.__generate_decode_field(element, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
+                self.__generate_decode_field(element, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr, span=span)
             else:
-                self.__code.write('{}    {} = decoder.{}();'.format(indent, element, self.__get_decode_m(descriptor.type)))
+                self.__code.write('{}    {} = {};'.format(indent, element, self.__read(descriptor.type, descriptor.varint)))
             if descriptor.mutable:
                 self.__code.write('{}    {}.Add({});'.format(indent, name, element))
             else:
                 self.__code.write('{}    {}[{}] = {};'.format(indent, name, index, element))
-            self.__code.write('%s}}' % indent)
+            self.__code.write('%s}' % indent)
+            # end of an indexed array is where its table says, whatever the elements read
+            if descriptor.indexed:
+                end = 'b{} + o{}[{}]'.format(index, index, count)
+                self.__code.write('{}decoder.Position = {};'.format(indent, '(int)({})'.format(end) if span else end))
+            self.__code.write('%s}' % indent)
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             key = 'k{}'.format(index)
             val = 'v{}'.format(index)
-            self.__code.write('{}var {} = decoder.{}();'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
+            self.__code.write('{}var {} = {};'.format(indent, count, self.__read_count(descriptor.varint)))
             self.__code.write('{}if ({} == 0xFFFFFFFF) {{ {} = null; }} else {{'.format(indent, count, name))
-            self.__code.write('{}{} = new {}();'.format(indent, name, self.__rtype(descriptor)))
+            self.__code.write('{}{} = new {}((int){});'.format(indent, name, self.__rtype(descriptor), count))
+            if descriptor.sorted:
+                self.__code.write('{}var o{} = decoder.ReadOffsets(({} + 15) / 16);'.format(indent, index, count))
+            if descriptor.sorted and descriptor.key == JSONTYPE_string:
+                self.__code.write('{}byte[] r{} = null;'.format(indent, index))
             self.__code.write('{}for (var {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
             self.__code.write('%s{' % indent)
             self.__code.write('{}    {} {};'.format(indent, self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type), val))
-            self.__code.write('{}    var {} = decoder.{}();'.format(indent, key, self.__get_decode_m(descriptor.key)))
+            if descriptor.sorted and descriptor.key == JSONTYPE_string:
+                self.__code.write('{}    var {} = decoder.ReadPrefixedString(ref r{}, {} % 16 == 0);'.format(indent, key, index, index))
+            else:
+                self.__code.write('{}    var {} = {};'.format(indent, key, self.__read(descriptor.key, descriptor.varint)))
             if descriptor.descriptor:
-                self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
+                self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr, span=span)
             else:
-                self.__code.write('{}    {} = decoder.{}();'.format(indent, val, self.__get_decode_m(descriptor.type)))
+                self.__code.write('{}    {} = {};'.format(indent, val, self.__read(descriptor.type, descriptor.varint)))
             self.__code.write('{}    {}[{}] = {};'.format(indent, name, key, val))
             self.__code.write('%s}}' % indent)
         else:
             assert isinstance(descriptor, FieldDescriptor)
             field = descriptor
             if field.descriptor:
-                self.__generate_decode_field(name=field.name, descriptor=field.descriptor, indent=indent, level=level, attr=attr)
+                self.__generate_decode_field(name=field.name, descriptor=field.descriptor, indent=indent, level=level, attr=attr, span=span)
             else:
                 if field.enum:
-                    self.__code.write('{}{} = ({})decoder.{}();'.format(indent, name, field.enum, self.__get_decode_m(field.type)))
+                    self.__code.write('{}{} = ({}){};'.format(indent, name, field.enum, self.__read(field.type, field.varint)))
                 else:
-                    self.__code.write('{}{} = decoder.{}();'.format(indent, name, self.__get_decode_m(field.type)))
+                    self.__code.write('{}{} = {};'.format(indent, name, self.__read(field.type, field.varint)))
 
     def __generate_encode_field(self, name, descriptor, indent, level=0, attr=None): # type: (str, Descriptor, str, int, IndexAttr)->None
         if isinstance(descriptor, ClassDescriptor):
             self.__code.write('{}{}.Serialize(encoder);'.format(indent, name))
         elif isinstance(descriptor, ArrayDescriptor):
             index = self.__local_name(attr.next)
-            count = ('{}.Count' if descriptor.mutable else '{}.Length').format(name)
+            aligned, columnar = descriptor.layout == LAYOUT_ALIGNED, descriptor.layout == LAYOUT_COLUMNAR
+            count = ('{}.Count' if columnar or (descriptor.mutable and not aligned) else '{}.Length').format(name)
             element = 't{}'.format(index)
-            self.__code.write('{}if ({} == null) {{ encoder.Write((int)-1); }} else {{'.format(indent, name))
-            self.__code.write('{}encoder.Write((uint){});'.format(indent, count))
+            for line in self.__write_count(name, count, descriptor.varint):
+                self.__code.write('{}{}'.format(indent, line))
+            if aligned:
+                self.__code.write('{}encoder.WriteRecords({}, {});'.format(indent, name, aligned_layout(descriptor.descriptor)[2]))
+                self.__code.write('%s}' % indent)
+                return
+            if columnar:
+                for field in descriptor.descriptor.fields:
+                    self.__code.write('{}encoder.{}({}.{});'.format(indent, self.__write_column(field.type), name, field.name))
+                self.__code.write('%s}' % indent)
+                return
+            if descriptor.indexed:
+                table, base, offsets = 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index)
+                self.__code.write('{}var {} = encoder.Position;'.format(indent, table))
+                self.__code.write('{}var {} = new uint[{} + 1];'.format(indent, offsets, count))
+                self.__code.write('{}encoder.WriteOffsets({});'.format(indent, offsets))
+                self.__code.write('{}var {} = encoder.Position;'.format(indent, base))
             self.__code.write('{}for (var {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
             self.__code.write('%s{' % indent)
+            if descriptor.indexed:
+                self.__code.write('{}    {}[{}] = (uint)(encoder.Position - {});'.format(indent, offsets, index, base))
             self.__code.write('{}    var {} = {}[{}];'.format(indent, element, name, index))
             if descriptor.descriptor:
                 self.__generate_encode_field(element, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}    encoder.Write({});'.format(indent, element))
-            self.__code.write('%s}}' % indent)
+                self.__code.write('{}    {}'.format(indent, self.__write(descriptor.type, descriptor.varint, element)))
+            self.__code.write('%s}' % indent)
+            if descriptor.indexed:
+                self.__code.write('{}{}[{}] = (uint)(encoder.Position - {});'.format(indent, offsets, count, base))
+                self.__code.write('{}encoder.Position = {};'.format(indent, table))
+                self.__code.write('{}encoder.WriteOffsets({});'.format(indent, offsets))
+                self.__code.write('{}encoder.Position = {} + {}[{}];'.format(indent, base, offsets, count))
+            self.__code.write('%s}' % indent)
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = '{}.Count'.format(name)
             pair = 'p{}'.format(index)
-            self.__code.write('{}if ({} == null) {{ encoder.Write((int)-1); }} else {{'.format(indent, name))
-            self.__code.write('{}encoder.Write((uint){});'.format(indent, count))
-            self.__code.write('{}foreach (var {} in {})'.format(indent, pair, name))
-            self.__code.write('%s{' % indent)
-            self.__code.write('{}    encoder.Write({}.Key);'.format(indent, pair))
+            for line in self.__write_count(name, count, descriptor.varint):
+                self.__code.write('{}{}'.format(indent, line))
+            if descriptor.sorted:
+                keys, table, base, offsets, previous = 's{}'.format(index), 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index), 'r{}'.format(index)
+                self.__code.write('{}var {} = new List<{}>({}.Keys);'.format(indent, keys, self.__ctype(descriptor.key), name))
+                self.__code.write('{}{}.Sort({});'.format(indent, keys, 'JsonbufWriter.KeyOrder' if descriptor.key == JSONTYPE_string else ''))
+                self.__code.write('{}var {} = encoder.Position;'.format(indent, table))
+                self.__code.write('{}var {} = new uint[({} + 15) / 16 + 1];'.format(indent, offsets, count))
+                self.__code.write('{}encoder.WriteOffsets({});'.format(indent, offsets))
+                self.__code.write('{}var {} = encoder.Position;'.format(indent, base))
+                if descriptor.key == JSONTYPE_string:
+                    self.__code.write('{}byte[] {} = null;'.format(indent, previous))
+                self.__code.write('{}for (var {} = 0; {} < {}; {}++)'.format(indent, index, index, count, index))
+                self.__code.write('%s{' % indent)
+                self.__code.write('{}    var {} = new KeyValuePair<{}, {}>({}[{}], {}[{}[{}]]);'.format(
+                    indent, pair, self.__ctype(descriptor.key), self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type),
+                    keys, index, name, keys, index))
+                self.__code.write('{}    if ({} % 16 == 0) {}[{} / 16] = (uint)(encoder.Position - {});'.format(indent, index, offsets, index, base))
+                if descriptor.key == JSONTYPE_string:
+                    self.__code.write('{}    encoder.WritePrefixedString({}.Key, ref {}, {} % 16 == 0);'.format(indent, pair, previous, index))
+                else:
+                    self.__code.write('{}    {}'.format(indent, self.__write(descriptor.key, descriptor.varint, '{}.Key'.format(pair))))
+            else:
+                self.__code.write('{}foreach (var {} in {})'.format(indent, pair, name))
+                self.__code.write('%s{' % indent)
+                self.__code.write('{}    {}'.format(indent, self.__write(descriptor.key, descriptor.varint, '{}.Key'.format(pair))))
             if descriptor.descriptor:
                 self.__generate_encode_field('{}.Value'.format(pair), descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}    encoder.Write({}.Value);'.format(indent, pair))
-            self.__code.write('%s}}' % indent)
+                self.__code.write('{}    {}'.format(indent, self.__write(descriptor.type, descriptor.varint, '{}.Value'.format(pair))))
+            self.__code.write('%s}' % indent)
+            if descriptor.sorted:
+                self.__code.write('{}{}[{}.Length - 1] = (uint)(encoder.Position - {});'.format(indent, offsets, offsets, base))
+                self.__code.write('{}encoder.Position = {};'.format(indent, table))
+                self.__code.write('{}encoder.WriteOffsets({});'.format(indent, offsets))
+                self.__code.write('{}encoder.Position = {} + {}[{}.Length - 1];'.format(indent, base, offsets, offsets))
+            self.__code.write('%s}' % indent)
         else:
             assert isinstance(descriptor, FieldDescriptor)
             field = descriptor
@@ -239,9 +462,9 @@ class CSharpGenerator(object):
                 self.__generate_encode_field(name=field.name, descriptor=field.descriptor, indent=indent, level=level, attr=attr)
             else:
                 if field.enum:
-                    self.__code.write('{}encoder.Write(({}){});'.format(indent, self.__rtype(field.type), field.name))
+                    self.__code.write('{}{}'.format(indent, self.__write(field.type, field.varint, '({}){}'.format(self.__rtype(field.type), field.name))))
                 else:
-                    self.__code.write('{}encoder.Write({});'.format(indent, field.name))
+                    self.__code.write('{}{}'.format(indent, self.__write(field.type, field.varint, field.name)))
 
 
 def main():
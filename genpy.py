@@ -19,17 +19,54 @@ class IndexAttr(object):
         return self.__next
 
 class PyGenerator(object):
-    def __init__(self, schema, output):
+    """
+    Python classes of a schema for include/python/jsonbuf.py. With slots the classes declare __slots__ and
+    start with shared immutable empty containers, with records every class also gets a {name}Record
+    variant, a read-only tuple with arrays decoded as tuples, for tables that are loaded once and only read.
+    With numpy classes of fixed-width scalars only get deserialize_array() reading a whole array of them
+    into a numpy structured array or column arrays. Elements of aligned arrays are read and written as padded
+    records by one module-level {name}_A struct each. Elements of columnar arrays are read and written column
+    by column as spelled by one module-level {name}_C spec each, and their classes get deserialize_columns()
+    reading a whole such array into a dict of columns, numbers and bools as numpy arrays with numpy.
+    """
+    def __init__(self, schema, output, slots=False, records=False, numpy=False):
         self.schema = schema  # type: JsonbufSchema
-        self.bridges = JsonbufBridges()
+        self.bridges = JsonbufBridges.shared()
         self.indent = '    '
+        self.slots = slots
+        self.records = records
+        self.numpy = numpy
+        self.__arrays = {} # type: Dict[ClassDescriptor, ArrayDescriptor]
+        self.__aligned = set() # type: Set[ClassDescriptor]
+        self.__columnar = {} # type: Dict[ClassDescriptor, ArrayDescriptor]
+        self.__record = False # generating a record variant
+        self.__runs = {} # type: Dict[ClassDescriptor, List[Tuple[Optional[str], List[FieldDescriptor]]]]
         self.__code = CodeWriter(filename=p.join(output, '{}.py'.format(self.schema.name)))
 
     @property
     def filename(self): return self.__code.filename
 
+    def __collect_arrays(self, descriptor, visited): # type: (Descriptor, set)->None
+        """
+        first array holding each class, whose count layout deserialize_array() reads, elements of aligned arrays
+        and first columnar array holding each class, whose count layout deserialize_columns() reads
+        """
+        if descriptor is None or id(descriptor) in visited: return
+        visited.add(id(descriptor))
+        if isinstance(descriptor, ArrayDescriptor) and isinstance(descriptor.descriptor, ClassDescriptor):
+            self.__arrays.setdefault(descriptor.descriptor, descriptor)
+            if descriptor.layout == LAYOUT_ALIGNED: self.__aligned.add(descriptor.descriptor)
+            if descriptor.layout == LAYOUT_COLUMNAR: self.__columnar.setdefault(descriptor.descriptor, descriptor)
+        if isinstance(descriptor, ClassDescriptor):
+            for field in descriptor.fields: self.__collect_arrays(field, visited)
+        else:
+            self.__collect_arrays(getattr(descriptor, 'descriptor', None), visited)
+
     def generate(self):
+        self.__collect_arrays(self.schema.descriptor, set())
         self.__code.write('from jsonbuf import *')
+        self.__code.write('import struct')
+        if self.records: self.__code.write('import operator')
         self.__code.write('')
         count = self.schema.classes['count'] # type: int
         for n in range(count):
@@ -76,9 +113,9 @@ class PyGenerator(object):
         return type
 
     def __rtype(self, type):
-        if isinstance(type, ClassDescriptor): return type.name
+        if isinstance(type, ClassDescriptor): return '{}Record'.format(type.name) if self.__record else type.name
         if isinstance(type, ArrayDescriptor):
-            return 'list[{}]'.format(self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
+            return '{}[{}]'.format('tuple' if self.__record else 'list', self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
         if isinstance(type, DictionaryDescriptor):
             return 'dict[{},{}]'\
                 .format(self.__ctype(type.key), self.__rtype(type=type.descriptor) if type.descriptor else self.__ctype(type.type))
@@ -88,31 +125,208 @@ class PyGenerator(object):
         assert isinstance(type, str)
         return self.__ctype(type)
 
+    @staticmethod
+    def __struct_format(type): # type: (str)->str
+        # '?' unpacks to bool like read_bool() and packs any truthy value to 1
+        return '?' if type == JSONTYPE_bool else STRUCT_FORMATS[type]
+
+    def __column_spec(self, cls): # type: (ClassDescriptor)->str
+        """codes of pack_column() for each field, bools are bitmaps and strings sizes followed by their bytes"""
+        return '<' + ''.join('s' if f.type == JSONTYPE_string else self.__struct_format(f.type) for f in cls.fields)
+
+    @staticmethod
+    def __fixed(type, varint): # type: (str, bool)->bool
+        return type in STRUCT_FORMATS and not (varint and type in VARINT_RANGES)
+
+    def __group_fields(self, cls): # type: (ClassDescriptor)->List[Tuple[Optional[str], List[FieldDescriptor]]]
+        """consecutive fixed-width scalar fields fused into runs read and written by one module-level struct"""
+        runs = [] # type: List[Tuple[bool, List[FieldDescriptor]]]
+        for field in cls.fields:
+            fixed = not field.descriptor and self.__fixed(field.type, field.varint)
+            if fixed and runs and runs[-1][0]:
+                runs[-1][1].append(field)
+            else:
+                runs.append((fixed, [field]))
+        # single fields are read and written by their own methods
+        result = [] # type: List[Tuple[Optional[str], List[FieldDescriptor]]]
+        for fixed, fields in runs:
+            if fixed and len(fields) > 1:
+                result.append(('{}_S{}'.format(cls.name, len([r for r in result if r[0]])), fields))
+            else:
+                result.extend((None, [f]) for f in fields)
+        return result
+
+    def __records_array(self, cls): # type: (ClassDescriptor)->Optional[ArrayDescriptor]
+        if not self.numpy or cls not in self.__arrays or not cls.fields: return None
+        for field in cls.fields:
+            if field.descriptor or not self.__fixed(field.type, field.varint): return None
+        # columns are read by deserialize_columns()
+        if self.__arrays[cls].layout == LAYOUT_COLUMNAR: return None
+        return self.__arrays[cls]
+
     def __generate_class(self, cls, indent=''):
+        runs = self.__runs[cls] = self.__group_fields(cls)
+        structs = [(name, fields) for name, fields in runs if name is not None]
+        for name, fields in structs:
+            self.__code.write("{}{} = struct.Struct('<{}')".format(indent, name, ''.join(self.__struct_format(f.type) for f in fields)))
+        if cls in self.__aligned:
+            offsets, size, _ = aligned_layout(cls)
+            format, position = '', 0
+            for offset, field in zip(offsets, cls.fields):
+                format += 'x' * (offset - position) + self.__struct_format(field.type)
+                position = offset + struct.calcsize('<' + STRUCT_FORMATS[field.type])
+            self.__code.write("{}{}_A = struct.Struct('<{}')".format(indent, cls.name, format + 'x' * (size - position)))
+        if cls in self.__columnar: self.__code.write("{}{}_C = '{}'".format(indent, cls.name, self.__column_spec(cls)))
+        array = self.__records_array(cls)
+        if array:
+            formats = ["'{}'".format('?' if f.type == JSONTYPE_bool else '<' + STRUCT_FORMATS[f.type]) for f in cls.fields]
+            if array.layout == LAYOUT_ALIGNED:
+                offsets, size, _ = aligned_layout(cls)
+                self.__code.write("{}{}_DTYPE = {{'names': [{}], 'formats': [{}], 'offsets': {}, 'itemsize': {}}}".format(
+                    indent, cls.name, ', '.join(repr(f.name) for f in cls.fields), ', '.join(formats), offsets, size))
+            else:
+                dtype = ', '.join('({!r}, {})'.format(f.name, format) for f, format in zip(cls.fields, formats))
+                self.__code.write('{}{}_DTYPE = [{}]'.format(indent, cls.name, dtype))
+        if structs or array or cls in self.__aligned or cls in self.__columnar: self.__code.write('')
         self.__code.write('{}class {}(IJsonbuf):'.format(indent, cls.name))
+        if self.slots:
+            self.__code.write('{}{}__slots__ = {}'.format(indent, self.indent, self.__tuple(repr(f.name) for f in cls.fields)))
+            self.__code.write('')
         self.__code.write('{}{}def __init__(self):'.format(indent, self.indent))
         for filed in cls.fields:
-            self.__code.write('{}{}{}self.{} = {} # type: {}'.format(indent, self.indent, self.indent, filed.name, self.__get_default(filed.type), self.__rtype(filed)))
+            default = self.__get_default(filed.type)
+            # empty containers are shared as they are replaced rather than filled by deserialize()
+            if self.slots and filed.type == 'array': default = '()'
+            if self.slots and filed.type == 'dict': default = 'EMPTY_DICT'
+            self.__code.write('{}{}{}self.{} = {} # type: {}'.format(indent, self.indent, self.indent, filed.name, default, self.__rtype(filed)))
         self.__code.write('')
         self.__generate_decode_method(cls, indent=indent + self.indent)
         self.__code.write('')
         self.__generate_encode_method(cls, indent=indent + self.indent)
         self.__code.write('')
+        for field in cls.fields:
+            if isinstance(field.descriptor, DictionaryDescriptor) and field.descriptor.sorted:
+                self.__generate_lookup_method(field, indent=indent + self.indent)
+                self.__code.write('')
+            if isinstance(field.descriptor, ArrayDescriptor) and field.descriptor.indexed:
+                self.__generate_element_method(field, indent=indent + self.indent)
+                self.__code.write('')
+        if self.__records_array(cls): self.__generate_records_method(cls, indent=indent + self.indent)
+        if cls in self.__columnar: self.__generate_columns_method(cls, indent=indent + self.indent)
+        if self.records: self.__generate_record(cls, indent)
+
+    def __generate_records_method(self, cls, indent): # type: (ClassDescriptor, str)->None
+        array = self.__records_array(cls)
+        self.__code.write('{}@staticmethod'.format(indent))
+        self.__code.write('{}def deserialize_array(decoder, columns=False): # type: (JsonbufStream, bool)->numpy.ndarray'.format(indent))
+        self.__code.write('{}{}"""array of {} at decoder as numpy structured array, or dict of column arrays"""'.format(indent, self.indent, cls.name))
+        self.__code.write('{}{}count = decoder.{}()'.format(indent, self.indent, 'read_varint_count' if array.varint else self.__get_decode_m(JSONTYPE_uint)))
+        if array.indexed: self.__code.write('{}{}if count != 0xFFFFFFFF: decoder.read_offsets(count)'.format(indent, self.indent))
+        if array.layout == LAYOUT_ALIGNED:
+            self.__code.write('{}{}if count != 0xFFFFFFFF: decoder.align({})'.format(indent, self.indent, aligned_layout(cls)[2]))
+        self.__code.write('{}{}return decoder.read_records({}_DTYPE, count, columns)'.format(indent, self.indent, cls.name))
+        self.__code.write('')
+
+    def __generate_columns_method(self, cls, indent): # type: (ClassDescriptor, str)->None
+        array = self.__columnar[cls]
+        self.__code.write('{}@staticmethod'.format(indent))
+        self.__code.write('{}def deserialize_columns(decoder): # type: (JsonbufStream)->dict'.format(indent))
+        self.__code.write('{}{}"""columnar array of {} at decoder as dict of columns by field name"""'.format(indent, self.indent, cls.name))
+        self.__code.write('{}{}count = decoder.{}()'.format(indent, self.indent, 'read_varint_count' if array.varint else self.__get_decode_m(JSONTYPE_uint)))
+        self.__code.write('{}{}if count == 0xFFFFFFFF: return None'.format(indent, self.indent))
+        self.__code.write('{}{}return dict(zip({}, decoder.read_columns({}_C, count{})))'.format(
+            indent, self.indent, self.__tuple(repr(f.name) for f in cls.fields), cls.name, ', True' if self.numpy else ''))
+        self.__code.write('')
+
+    def __generate_record(self, cls, indent=''): # type: (ClassDescriptor, str)->None
+        self.__record = True
+        self.__code.write('{}class {}Record(tuple):'.format(indent, cls.name))
+        self.__code.write('{}{}__slots__ = ()'.format(indent, self.indent))
+        for n, field in enumerate(cls.fields):
+            self.__code.write('{}{}{} = property(operator.itemgetter({})) # type: {}'.format(indent, self.indent, field.name, n, self.__rtype(field)))
+        self.__code.write('')
+        self.__code.write('{}{}@classmethod'.format(indent, self.indent))
+        self.__code.write('{}{}def deserialize(cls, decoder): # type: (JsonbufStream)->{}Record'.format(indent, self.indent, cls.name))
+        method = indent + self.indent + self.indent
+        if cls is self.schema.descriptor and cls.pool: self.__code.write('{}decoder.read_pool()'.format(method))
+        index = IndexAttr(0)
+        for run, fields in self.__runs[cls]:
+            if run is None:
+                self.__generate_decode_field(name=fields[0].name, descriptor=fields[0], indent=method, level=1, attr=index)
+            else:
+                self.__code.write('{}{} = decoder.unpack({})'.format(method, ', '.join(self.__target(f.name) for f in fields), run))
+        self.__code.write('{}return tuple.__new__(cls, {})'.format(method, self.__tuple(self.__target(f.name) for f in cls.fields)))
+        self.__code.write('')
+        self.__generate_encode_method(cls, indent=indent + self.indent)
+        self.__code.write('')
+        self.__record = False
+
+    @staticmethod
+    def __tuple(items): # type: (Iterable[str])->str
+        items = list(items)
+        return '({}{})'.format(', '.join(items), ',' if len(items) == 1 else '')
+
+    def __target(self, name): # type: (str)->str
+        """where decoded field is stored, locals packed into the tuple at last for records"""
+        return 'v_{}'.format(name) if self.__record else 'self.{}'.format(name)
 
     def __generate_decode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
         self.__code.write('{}def deserialize(self, decoder): # type: (JsonbufStream)->None'.format(indent, cls.name))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__code.write('{}{}decoder.read_pool()'.format(indent, self.indent))
         index = IndexAttr(0)
-        for field in cls.fields:
-            self.__generate_decode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
+        for run, fields in self.__runs[cls]:
+            if run is None:
+                self.__generate_decode_field(name=fields[0].name, descriptor=fields[0], indent=indent + self.indent, level=1, attr=index)
+            else:
+                self.__code.write('{}{}{} = decoder.unpack({})'.format(
+                    indent, self.indent, ', '.join('self.{}'.format(f.name) for f in fields), run))
 
     def __generate_encode_method(self, cls, indent): # type: (ClassDescriptor, str)->None
         self.__code.write('{}def serialize(self, encoder): # type: (JsonbufStream)->None'.format(indent, cls.name))
+        pooled = cls is self.schema.descriptor and cls.pool
+        if pooled: self.__code.write('{}{}encoder.begin_pool()'.format(indent, self.indent))
         index = IndexAttr(0)
-        for field in cls.fields:
-            self.__generate_encode_field(name=field.name, descriptor=field, indent=indent + self.indent, level=1, attr=index)
+        for run, fields in self.__runs[cls]:
+            if run is None:
+                self.__generate_encode_field(name=fields[0].name, descriptor=fields[0], indent=indent + self.indent, level=1, attr=index)
+            else:
+                self.__code.write('{}{}encoder.pack({}, {})'.format(
+                    indent, self.indent, run, ', '.join('self.{}'.format(f.name) for f in fields)))
+        if pooled: self.__code.write('{}{}encoder.end_pool()'.format(indent, self.indent))
+
+    def __generate_lookup_method(self, field, indent): # type: (FieldDescriptor, str)->None
+        descriptor = field.descriptor # type: DictionaryDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count, key, val = 'c{}'.format(name), 'k{}'.format(name), 'v{}'.format(name)
+        self.__code.write('{}@staticmethod'.format(indent))
+        self.__code.write('{}def lookup_{}(decoder, key): # type: (JsonbufStream, {})->{}'.format(
+            indent, field.name, self.__ctype(descriptor.key), self.__rtype(descriptor.descriptor if descriptor.descriptor else descriptor.type)))
+        indent += self.indent
+        self.__code.write('{}{} = decoder.{}()'.format(indent, count, 'read_varint_count' if descriptor.varint else self.__get_decode_m(JSONTYPE_uint)))
+        self.__code.write('{}if {} == 0xFFFFFFFF: return None'.format(indent, count))
+        if descriptor.key == JSONTYPE_string:
+            self.__code.write("{}if isinstance(key, str): key = key.encode('utf-8')".format(indent))
+            self.__code.write('{}{} = None'.format(indent, key))
+            self.__code.write('{}for {} in range(decoder.find_block({}, key)):'.format(indent, name, count))
+            self.__code.write('{}{}{} = decoder.read_prefixed_string({} if {} else None)'.format(indent, self.indent, key, key, name))
+        else:
+            read_key = self.__get_decode_m(descriptor.key, descriptor.varint)
+            self.__code.write('{}for {} in range(decoder.find_block({}, key, decoder.{})):'.format(indent, name, count, read_key))
+            self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, key, read_key))
+        # keys ascend within a block, so past key it is absent and no further value is decoded
+        self.__code.write('{}{}if {} > key: return None'.format(indent, self.indent, key))
+        if descriptor.descriptor:
+            self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=2, attr=index)
+        else:
+            self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, val, self.__get_decode_m(descriptor.type, descriptor.varint)))
+        self.__code.write('{}{}if {} == key: return {}'.format(indent, self.indent, key, val))
+        self.__code.write('{}return None'.format(indent))
 
     @staticmethod
-    def __get_decode_m(type):
+    def __get_decode_m(type, varint=False):
+        if varint and type in VARINT_RANGES: return 'read_zigzag' if VARINT_RANGES[type][0] < 0 else 'read_varint'
         if type == JSONTYPE_bool: return 'read_bool'
         elif type == JSONTYPE_int8: return 'read_int8'
         elif type in (JSONTYPE_uint8, JSONTYPE_byte): return 'read_uint8'
@@ -128,7 +342,8 @@ class PyGenerator(object):
         raise NotImplementedError('Type[={}] not supported'.format(type))
 
     @staticmethod
-    def __get_encode_m(type):
+    def __get_encode_m(type, varint=False):
+        if varint and type in VARINT_RANGES: return 'write_zigzag' if VARINT_RANGES[type][0] < 0 else 'write_varint'
         if type == JSONTYPE_bool: return 'write_bool'
         elif type == JSONTYPE_int8: return 'write_int8'
         elif type in (JSONTYPE_uint8, JSONTYPE_byte): return 'write_uint8'
@@ -143,59 +358,141 @@ class PyGenerator(object):
         elif type == JSONTYPE_string: return 'write_string'
         raise NotImplementedError('Type[={}] not supported'.format(type))
 
+    def __write_count(self, name, varint, indent): # type: (str, bool, str)->None
+        # varint counts are written as count + 1 with 0 for null
+        self.__code.write('{}if {} is None:'.format(indent, name))
+        if varint:
+            self.__code.write('{}{}encoder.write_varint(0)'.format(indent, self.indent))
+        else:
+            self.__code.write('{}{}encoder.{}(-1)'.format(indent, self.indent, self.__get_encode_m(JSONTYPE_int)))
+        self.__code.write('{}else:'.format(indent))
+        if varint:
+            self.__code.write('{}{}encoder.write_varint(len({}) + 1)'.format(indent, self.indent, name))
+        else:
+            self.__code.write('{}{}encoder.{}(len({}))'.format(indent, self.indent, self.__get_encode_m(JSONTYPE_uint), name))
+
     @staticmethod
     def __local_name(index): # type: (int)->str
         shift = ord('l') - 97
         value = ''
         while index > 0:
             c = index % 26
-            index /= 26
+            index //= 26
             value += chr(((c + shift) % 26) + 97)
         return value
 
 
+    def __generate_element_method(self, field, indent): # type: (FieldDescriptor, str)->None
+        descriptor = field.descriptor # type: ArrayDescriptor
+        index = IndexAttr(0)
+        name = self.__local_name(index.next)
+        count, element = 'c{}'.format(name), 't{}'.format(name)
+        self.__code.write('{}@staticmethod'.format(indent))
+        self.__code.write('{}def read_{}_at(decoder, n): # type: (JsonbufStream, int)->{}'.format(
+            indent, field.name, self.__rtype(descriptor.descriptor)))
+        indent += self.indent
+        self.__code.write('{}"""element n of {} positioned at its count, none of the elements ahead of it are decoded"""'.format(indent, field.name))
+        self.__code.write('{}{} = decoder.{}()'.format(indent, count, 'read_varint_count' if descriptor.varint else self.__get_decode_m(JSONTYPE_uint)))
+        self.__code.write('{}if {} == 0xFFFFFFFF: return None'.format(indent, count))
+        self.__code.write('{}if not 0 <= n < {}: raise IndexError(n)'.format(indent, count))
+        self.__code.write('{}decoder.seek_element({}, n)'.format(indent, count))
+        self.__generate_decode_field(element, descriptor=descriptor.descriptor, indent=indent, level=2, attr=index)
+        self.__code.write('{}return {}'.format(indent, element))
+
     def __generate_decode_field(self, name, descriptor, indent, level=0, attr=None): # type: (str, Descriptor, str, int, IndexAttr)->None
         if isinstance(descriptor, ClassDescriptor):
+            if self.__record:
+                self.__code.write('{}{} = {}.deserialize(decoder)'.format(indent, name, self.__rtype(descriptor)))
+                return
             self.__code.write('{}{} = {}()'.format(indent, name, self.__rtype(descriptor)))
             self.__code.write('{}{}.deserialize(decoder)'.format(indent, name))
         elif isinstance(descriptor, ArrayDescriptor):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             element = 't{}'.format(index)
-            self.__code.write('{}{} = [] # type: {}'.format(indent, name, self.__rtype(descriptor)))
-            self.__code.write('{}{} = decoder.{}()'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
+            self.__code.write('{}{} = {} # type: {}'.format(indent, name, '()' if self.__record else '[]', self.__rtype(descriptor)))
+            self.__code.write('{}{} = decoder.{}()'.format(indent, count, 'read_varint_count' if descriptor.varint else self.__get_decode_m(JSONTYPE_uint)))
             self.__code.write('{}if {} != 0xFFFFFFFF:'.format(indent, count))
             indent += self.indent
+            if descriptor.layout == LAYOUT_ALIGNED:
+                self.__generate_decode_records(name, descriptor.descriptor, index, indent)
+                return
+            if descriptor.layout == LAYOUT_COLUMNAR:
+                self.__generate_decode_columns(name, descriptor.descriptor, index, indent)
+                return
+            if not descriptor.descriptor and self.__fixed(descriptor.type, descriptor.varint):
+                read = "decoder.read_array('{}', {})".format(self.__struct_format(descriptor.type), count)
+                self.__code.write('{}{} = {}'.format(indent, name, 'tuple({})'.format(read) if self.__record else read))
+                return
+            if self.__record: self.__code.write('{}{} = []'.format(indent, name))
+            if descriptor.indexed:
+                self.__code.write('{}b{}, o{} = decoder.read_offsets({})'.format(indent, index, index, count))
             self.__code.write('{}for {} in range({}):'.format(indent, index, count))
             if descriptor.descriptor:
                 self.__generate_decode_field(element, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, element, self.__get_decode_m(descriptor.type)))
+                self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, element, self.__get_decode_m(descriptor.type, descriptor.varint)))
             self.__code.write('{}{}{}.append({})'.format(indent, self.indent, name, element))
+            # end of an indexed array is where its table says, whatever the elements read
+            if descriptor.indexed: self.__code.write('{}decoder.seek(b{} + o{}[{}])'.format(indent, index, index, count))
+            if self.__record: self.__code.write('{}{} = tuple({})'.format(indent, name, name))
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = 'c{}'.format(index)
             key = 'k{}'.format(index)
             val = 'v{}'.format(index)
             self.__code.write('{}{} = {{}} # type: {}'.format(indent, name, self.__rtype(descriptor)))
-            self.__code.write('{}{} = decoder.{}()'.format(indent, count, self.__get_decode_m(JSONTYPE_uint)))
+            self.__code.write('{}{} = decoder.{}()'.format(indent, count, 'read_varint_count' if descriptor.varint else self.__get_decode_m(JSONTYPE_uint)))
             self.__code.write('{}if {} != 0xFFFFFFFF:'.format(indent, count))
             indent += self.indent
-            self.__code.write('{}for {} in range({}):'.format(indent, index, count))
-            self.__code.write(
-                '{}{}{} = decoder.{}()'.format(indent, self.indent, key, self.__get_decode_m(descriptor.key)))
+            if descriptor.sorted:
+                self.__code.write('{}b{}, o{} = decoder.read_offsets(({} + 15) // 16)'.format(indent, index, index, count))
+            if descriptor.sorted and descriptor.key == JSONTYPE_string:
+                self.__code.write('{}{} = None'.format(indent, key))
+                self.__code.write('{}for {} in range({}):'.format(indent, index, count))
+                self.__code.write('{}{}{} = decoder.read_prefixed_string({} if {} % 16 else None)'.format(indent, self.indent, key, key, index))
+            else:
+                self.__code.write('{}for {} in range({}):'.format(indent, index, count))
+                self.__code.write(
+                    '{}{}{} = decoder.{}()'.format(indent, self.indent, key, self.__get_decode_m(descriptor.key, descriptor.varint)))
             if descriptor.descriptor:
                 self.__generate_decode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, val, self.__get_decode_m(descriptor.type)))
+                self.__code.write('{}{}{} = decoder.{}()'.format(indent, self.indent, val, self.__get_decode_m(descriptor.type, descriptor.varint)))
             self.__code.write('{}{}{}[{}] = {}'.format(indent, self.indent, name, key, val))
         else:
             assert isinstance(descriptor, FieldDescriptor)
             field = descriptor
             if field.descriptor:
-                self.__generate_decode_field(name='self.{}'.format(field.name), descriptor=field.descriptor, indent=indent, level=level, attr=attr)
+                self.__generate_decode_field(name=self.__target(field.name), descriptor=field.descriptor, indent=indent, level=level, attr=attr)
             else:
-                self.__code.write('{}self.{} = decoder.{}()'.format(indent, name, self.__get_decode_m(field.type)))
+                self.__code.write('{}{} = decoder.{}()'.format(indent, self.__target(name), self.__get_decode_m(field.type, field.varint)))
+
+    def __generate_decode_records(self, name, cls, index, indent): # type: (str, ClassDescriptor, str, str)->None
+        """elements of an aligned array, padding ahead of them is skipped even when there are none"""
+        count, element = 'c{}'.format(index), 't{}'.format(index)
+        self.__code.write('{}decoder.align({})'.format(indent, aligned_layout(cls)[2]))
+        if self.__record:
+            self.__code.write('{}{} = tuple({}Record(decoder.unpack({}_A)) for {} in range({}))'.format(indent, name, cls.name, cls.name, index, count))
+            return
+        targets = ['{}.{}'.format(element, f.name) for f in cls.fields]
+        self.__code.write('{}for {} in range({}):'.format(indent, index, count))
+        self.__code.write('{}{}{} = {}()'.format(indent, self.indent, element, cls.name))
+        self.__code.write('{}{}{}{} = decoder.unpack({}_A)'.format(indent, self.indent, ', '.join(targets), ',' if len(targets) == 1 else '', cls.name))
+        self.__code.write('{}{}{}.append({})'.format(indent, self.indent, name, element))
+
+    def __generate_decode_columns(self, name, cls, index, indent): # type: (str, ClassDescriptor, str, str)->None
+        """elements of a columnar array, rebuilt row by row from all columns at once"""
+        count, element, values = 'c{}'.format(index), 't{}'.format(index), 'v{}'.format(index)
+        rows = 'zip(*decoder.read_columns({}_C, {}))'.format(cls.name, count)
+        if self.__record:
+            self.__code.write('{}{} = tuple({}Record({}) for {} in {})'.format(indent, name, cls.name, values, values, rows))
+            return
+        targets = ['{}.{}'.format(element, f.name) for f in cls.fields]
+        self.__code.write('{}for {} in {}:'.format(indent, values, rows))
+        self.__code.write('{}{}{} = {}()'.format(indent, self.indent, element, cls.name))
+        self.__code.write('{}{}{}{} = {}'.format(indent, self.indent, ', '.join(targets), ',' if len(targets) == 1 else '', values))
+        self.__code.write('{}{}{}.append({})'.format(indent, self.indent, name, element))
 
     def __generate_encode_field(self, name, descriptor, indent, level=0, attr=None): # type: (str, Descriptor, str, int, IndexAttr)->None
         if isinstance(descriptor, ClassDescriptor):
@@ -204,39 +501,83 @@ class PyGenerator(object):
             index = self.__local_name(attr.next)
             count = 'len({})'.format(name)
             element = '{}'.format(index)
-            self.__code.write('{}if {} is None:'.format(indent, name))
-            self.__code.write('{}{}encoder.{}(-1)'.format(indent, self.indent, self.__get_encode_m(JSONTYPE_int)))
-            self.__code.write('{}else:'.format(indent))
+            self.__write_count(name, descriptor.varint, indent)
             indent += self.indent
-            self.__code.write('{}encoder.{}({})'.format(indent, self.__get_encode_m(JSONTYPE_uint), count))
+            if descriptor.layout == LAYOUT_ALIGNED:
+                cls = descriptor.descriptor # type: ClassDescriptor
+                self.__code.write('{}encoder.write_align({})'.format(indent, aligned_layout(cls)[2]))
+                self.__code.write('{}for {} in {}:'.format(indent, element, name))
+                self.__code.write('{}{}encoder.pack({}_A, {})'.format(
+                    indent, self.indent, cls.name, ', '.join('{}.{}'.format(element, f.name) for f in cls.fields)))
+                return
+            if descriptor.layout == LAYOUT_COLUMNAR:
+                cls = descriptor.descriptor # type: ClassDescriptor
+                self.__code.write('{}encoder.write_columns({}_C, {})'.format(
+                    indent, cls.name, ', '.join('[{}.{} for {} in {}]'.format(element, f.name, element, name) for f in cls.fields)))
+                return
+            if not descriptor.descriptor and self.__fixed(descriptor.type, descriptor.varint):
+                self.__code.write("{}encoder.write_array('{}', {})".format(indent, self.__struct_format(descriptor.type), name))
+                return
+            if descriptor.indexed:
+                table, base, offsets = 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index)
+                self.__code.write('{}{} = encoder.tell()'.format(indent, table))
+                self.__code.write('{}encoder.write_offsets([0] * ({} + 1))'.format(indent, count))
+                self.__code.write('{}{} = encoder.tell()'.format(indent, base))
+                self.__code.write('{}{} = []'.format(indent, offsets))
             self.__code.write('{}for {} in {}:'.format(indent, element, name))
+            if descriptor.indexed:
+                self.__code.write('{}{}{}.append(encoder.tell() - {})'.format(indent, self.indent, offsets, base))
             if descriptor.descriptor:
                 self.__generate_encode_field('{}'.format(element), descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.type), element))
+                self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.type, descriptor.varint), element))
+            if descriptor.indexed:
+                self.__code.write('{}{}.append(encoder.tell() - {})'.format(indent, offsets, base))
+                self.__code.write('{}encoder.seek({})'.format(indent, table))
+                self.__code.write('{}encoder.write_offsets({})'.format(indent, offsets))
+                self.__code.write('{}encoder.seek({} + {}[-1])'.format(indent, base, offsets))
         elif isinstance(descriptor, DictionaryDescriptor):
             index = self.__local_name(attr.next)
             count = 'len({})'.format(name)
             key = 'k{}'.format(index)
             val = 'v{}'.format(index)
-            self.__code.write('{}if {} is None:'.format(indent, name))
-            self.__code.write('{}{}encoder.{}(-1)'.format(indent, self.indent, self.__get_encode_m(JSONTYPE_int)))
-            self.__code.write('{}else:'.format(indent))
+            self.__write_count(name, descriptor.varint, indent)
             indent += self.indent
-            self.__code.write('{}encoder.{}({})'.format(indent, self.__get_encode_m(JSONTYPE_uint), count))
-            self.__code.write('{}for {},{} in {}.items():'.format(indent, key, val, name))
-            self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.key), self.__get_key(key, type=descriptor.key)))
+            if descriptor.sorted:
+                table, base, offsets, previous = 'q{}'.format(index), 'b{}'.format(index), 'o{}'.format(index), 'r{}'.format(index)
+                self.__code.write('{}{} = encoder.tell()'.format(indent, table))
+                self.__code.write('{}encoder.write_offsets([0] * (({} + 15) // 16 + 1))'.format(indent, count))
+                self.__code.write('{}{} = encoder.tell()'.format(indent, base))
+                self.__code.write('{}{}, {} = [], None'.format(indent, offsets, previous))
+                if descriptor.key == JSONTYPE_string:
+                    self.__code.write('{}for {}, {} in enumerate(sorted({})):'.format(indent, index, key, name))
+                else:
+                    self.__code.write('{}for {}, {} in enumerate(sorted({}, key=lambda x: {})):'.format(indent, index, key, name, self.__get_key('x', type=descriptor.key)))
+                self.__code.write('{}{}{} = {}[{}]'.format(indent, self.indent, val, name, key))
+                self.__code.write('{}{}if {} % 16 == 0: {}.append(encoder.tell() - {})'.format(indent, self.indent, index, offsets, base))
+                if descriptor.key == JSONTYPE_string:
+                    self.__code.write('{}{}{} = encoder.write_prefixed_string({}, {} if {} % 16 else None)'.format(indent, self.indent, previous, key, previous, index))
+                else:
+                    self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.key, descriptor.varint), self.__get_key(key, type=descriptor.key)))
+            else:
+                self.__code.write('{}for {},{} in {}.items():'.format(indent, key, val, name))
+                self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.key, descriptor.varint), self.__get_key(key, type=descriptor.key)))
             if descriptor.descriptor:
                 self.__generate_encode_field(val, descriptor=descriptor.descriptor, indent=indent + self.indent, level=level + 1, attr=attr)
             else:
-                self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.type), val))
+                self.__code.write('{}{}encoder.{}({})'.format(indent, self.indent, self.__get_encode_m(descriptor.type, descriptor.varint), val))
+            if descriptor.sorted:
+                self.__code.write('{}{}.append(encoder.tell() - {})'.format(indent, offsets, base))
+                self.__code.write('{}encoder.seek({})'.format(indent, table))
+                self.__code.write('{}encoder.write_offsets({})'.format(indent, offsets))
+                self.__code.write('{}encoder.seek({} + {}[-1])'.format(indent, base, offsets))
         else:
             assert isinstance(descriptor, FieldDescriptor)
             field = descriptor
             if field.descriptor:
                 self.__generate_encode_field(name='self.{}'.format(field.name), descriptor=field.descriptor, indent=indent, level=level, attr=attr)
             else:
-                self.__code.write('{}encoder.{}(self.{})'.format(indent, self.__get_encode_m(field.type), field.name))
+                self.__code.write('{}encoder.{}(self.{})'.format(indent, self.__get_encode_m(field.type, field.varint), field.name))
 
 
 def main():
@@ -244,6 +585,9 @@ def main():
     arguments = argparse.ArgumentParser()
     arguments.add_argument('--schema', '-s', nargs='+', required=True, help='data structure definition')
     arguments.add_argument('--output', '-o', default='.', help='path for saving generated files')
+    arguments.add_argument('--slots', action='store_true', help='declare __slots__ and share empty containers as defaults')
+    arguments.add_argument('--records', action='store_true', help='generate read-only tuple-backed {class}Record variants as well')
+    arguments.add_argument('--numpy', action='store_true', help='generate deserialize_array() into numpy arrays for fixed-width classes')
     arguments.add_argument('--verbose', '-v', action='store_true', help='enable verbose printing')
     options = arguments.parse_args(sys.argv[1:])
 
@@ -253,7 +597,7 @@ def main():
         print('[S] {}'.format(p.abspath(filename)))
         schema = JsonbufSchema()
         schema.load(filename)
-        generator = PyGenerator(schema, output)
+        generator = PyGenerator(schema, output, slots=options.slots, records=options.records, numpy=options.numpy)
         generator.generate()
         print('>>> {}\n'.format(generator.filename))
 
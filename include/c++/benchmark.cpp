@@ -0,0 +1,117 @@
+//
+//  benchmark.cpp
+//  jsonbuf
+//
+//  Decoding a table of records through JsonbufStream over std::stringstream against JsonbufBuffer over
+//  the same bytes, with strings copied or viewed in place.
+//
+//  g++ -O2 -std=c++17 benchmark.cpp jsonbuf.cpp -o benchmark && ./benchmark [records] [repeat]
+//
+
+#include "jsonbuf.h"
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <type_traits>
+
+using namespace jsonbuf;
+
+template<class S>
+struct Record
+{
+    int32_t id;
+    float scale;
+    double weight;
+    S name;
+    std::vector<int32_t> items;
+};
+
+template<class S, class D>
+static S read_name(D& decoder)
+{
+    if constexpr (std::is_same<S, std::string_view>::value) { return decoder.read_string_view(); }
+    else { return decoder.read_string(); }
+}
+
+template<class S, class D>
+static void decode(D& decoder, std::vector<Record<S>>& records)
+{
+    auto count = decoder.template read<uint32_t>();
+    records.clear();
+    records.reserve(count);
+    for (uint32_t n = 0; n < count; n++)
+    {
+        Record<S> r;
+        r.id = decoder.template read<int32_t>();
+        r.scale = decoder.template read<float>();
+        r.weight = decoder.template read<double>();
+        r.name = read_name<S>(decoder);
+        auto size = decoder.template read<uint32_t>();
+        r.items.reserve(size);
+        for (uint32_t i = 0; i < size; i++) { r.items.emplace_back(decoder.template read<int32_t>()); }
+        records.emplace_back(std::move(r));
+    }
+}
+
+static std::string encode(uint32_t count)
+{
+    std::stringstream stream;
+    JsonbufStream encoder(&stream);
+    encoder.write<uint32_t>(count);
+    srand(0);
+    for (uint32_t n = 0; n < count; n++)
+    {
+        encoder.write<int32_t>(static_cast<int32_t>(n));
+        encoder.write<float>(static_cast<float>(rand() % 1000) / 4);
+        encoder.write<double>(static_cast<double>(rand()) / RAND_MAX);
+        encoder.write_string("assets/" + std::to_string(rand() % 20) + "/" + std::to_string(rand() % 10000) + ".prefab");
+        auto size = static_cast<uint32_t>(rand() % 8);
+        encoder.write<uint32_t>(size);
+        for (uint32_t i = 0; i < size; i++) { encoder.write<int32_t>(rand()); }
+    }
+    return stream.str();
+}
+
+template<class M>
+static double measure(M method, int repeat)
+{
+    double best = 0;
+    for (int n = 0; n < repeat; n++)
+    {
+        auto start = std::chrono::steady_clock::now();
+        method();
+        std::chrono::duration<double> elapse = std::chrono::steady_clock::now() - start;
+        if (n == 0 || elapse.count() < best) { best = elapse.count(); }
+    }
+    return best;
+}
+
+int main(int argc, char* argv[])
+{
+    uint32_t count = argc > 1 ? static_cast<uint32_t>(atoi(argv[1])) : 200000;
+    int repeat = argc > 2 ? atoi(argv[2]) : 5;
+    auto data = encode(count);
+
+    std::vector<Record<std::string>> records;
+    std::vector<Record<std::string_view>> views;
+    auto stream = measure([&]() {
+        std::stringstream source(data);
+        JsonbufStream decoder(&source);
+        decode(decoder, records);
+    }, repeat);
+    auto buffer = measure([&]() {
+        JsonbufBuffer decoder(data.data(), data.size());
+        decode(decoder, records);
+    }, repeat);
+    auto view = measure([&]() {
+        JsonbufBuffer decoder(data.data(), data.size());
+        decode(decoder, views);
+    }, repeat);
+
+    printf("%u records, %zu bytes\n", count, data.size());
+    printf("%-28s %10s %10s %8s\n", "decoder", "ms", "MB/s", "x");
+    printf("%-28s %10.2f %10.1f %8.1f\n", "JsonbufStream", stream * 1e3, data.size() / stream / 1e6, 1.0);
+    printf("%-28s %10.2f %10.1f %8.1f\n", "JsonbufBuffer", buffer * 1e3, data.size() / buffer / 1e6, stream / buffer);
+    printf("%-28s %10.2f %10.1f %8.1f\n", "JsonbufBuffer string_view", view * 1e3, data.size() / view / 1e6, stream / view);
+    return 0;
+}
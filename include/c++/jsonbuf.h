@@ -11,18 +11,97 @@
 
 #include <iostream>
 #include <string>
+#include <string_view>
+#include <vector>
+#include <deque>
+#include <sstream>
+#include <unordered_map>
+#include <algorithm>
+#include <cstring>
+#include <stdexcept>
 
 namespace jsonbuf {
 
+// records of aligned arrays, viewed in place by JsonbufBuffer when its data is suitably aligned and owned otherwise,
+// views stay valid as long as the data does
+template<class T>
+class JsonbufRecords
+{
+    std::vector<T> __owned;
+    const T* __data = nullptr;
+    size_t __size = 0;
+    
+public:
+    JsonbufRecords() = default;
+    JsonbufRecords(std::vector<T> records): __owned(std::move(records)), __data(__owned.data()), __size(__owned.size()) {}
+    JsonbufRecords(const JsonbufRecords& other) { *this = other; }
+    JsonbufRecords(JsonbufRecords&& other) noexcept { *this = std::move(other); }
+    
+    JsonbufRecords& operator=(const JsonbufRecords& other)
+    {
+        if (this == &other) { return *this; }
+        __owned = other.__owned;
+        __data = other.owned() ? __owned.data() : other.__data;
+        __size = other.__size;
+        return *this;
+    }
+    
+    // moving a vector keeps its storage, so owned records need no fixup
+    JsonbufRecords& operator=(JsonbufRecords&& other) noexcept
+    {
+        __owned = std::move(other.__owned);
+        __data = other.__data;
+        __size = other.__size;
+        other.__data = nullptr;
+        other.__size = 0;
+        return *this;
+    }
+    
+    void view(const T* data, size_t size)
+    {
+        __owned.clear();
+        __data = data;
+        __size = size;
+    }
+    
+    // owned storage for size records to be filled in, viewed records are dropped
+    T* resize(size_t size)
+    {
+        __owned.resize(size);
+        __data = __owned.data();
+        __size = size;
+        return __owned.data();
+    }
+    
+    bool owned() const { return __data == __owned.data() && !__owned.empty(); }
+    const T* data() const { return __data; }
+    size_t size() const { return __size; }
+    bool empty() const { return __size == 0; }
+    const T* begin() const { return __data; }
+    const T* end() const { return __data + __size; }
+    const T& operator[](size_t index) const { return __data[index]; }
+};
+
 class JsonbufStream
 {
     std::iostream *__stream;
     size_t __buf_size;
     char* __buf;
     
+    bool __pooled = false;
+    std::unordered_map<uint32_t, std::string> __pool;
+    std::unordered_map<std::string, uint32_t> __offsets;
+    std::string __entries;
+    std::iostream *__target = nullptr;
+    std::stringstream *__body = nullptr;
+    std::deque<std::string> __strings;
+    // records of aligned arrays are padded by position from document start
+    std::streampos __origin_g;
+    std::streampos __origin_p;
+    
 public:
     JsonbufStream(std::iostream *stream): JsonbufStream(stream, 256) {}
-    JsonbufStream(std::iostream *stream, size_t size): __stream(stream)
+    JsonbufStream(std::iostream *stream, size_t size): __stream(stream), __origin_g(stream->tellg()), __origin_p(stream->tellp())
     {
         __buf = new char[size];
         __buf_size = size;
@@ -53,19 +132,349 @@ public:
     template<class T>
     T read();
     
-    template<> void write(std::string v);
-    template<> void write(const char* v);
+    std::streampos tellg() { return __stream->tellg(); }
+    void seekg(std::streampos pos) { __stream->seekg(pos); }
+    std::streampos tellp() { return __stream->tellp(); }
+    void seekp(std::streampos pos) { __stream->seekp(pos); }
+    
+    // offset table of indexed arrays, element n starts at tellg() + offsets[n]
+    std::vector<uint32_t> read_offsets(uint32_t count)
+    {
+        std::vector<uint32_t> offsets(count + 1);
+        __stream->read((char*)offsets.data(), sizeof(uint32_t) * offsets.size());
+        return offsets;
+    }
 
-    template<> std::string read();
-    template<> const char* read();
+    // positions at element n of an indexed array after its count, reading only its own offset from the table
+    void seek_element(uint32_t count, uint32_t n)
+    {
+        auto table = tellg();
+        seekg(table + std::streamoff(4 * static_cast<uint64_t>(n)));
+        seekg(table + std::streamoff(4 * (static_cast<uint64_t>(count) + 1) + read<uint32_t>()));
+    }
+    
+    // elements to reserve for an array of count elements, streams do not know their size so the
+    // reservation is capped and vectors grow past it as elements are read
+    uint32_t reserve_count(uint32_t count, size_t /* min_size */)
+    {
+        static const uint32_t RESERVE_LIMIT = 1 << 12;
+        return std::min(count, RESERVE_LIMIT);
+    }
+
+    void write_offsets(const std::vector<uint32_t>& offsets)
+    {
+        __stream->write((const char*)offsets.data(), sizeof(uint32_t) * offsets.size());
+    }
+    
+    // skips padding ahead of records of aligned arrays up to a multiple of alignment from document start
+    void align(size_t alignment)
+    {
+        auto position = static_cast<size_t>(tellg() - __origin_g);
+        __stream->ignore((alignment - position % alignment) % alignment);
+    }
+    
+    template<class T>
+    void read_records(JsonbufRecords<T>& records, uint32_t count)
+    {
+        align(alignof(T));
+        __stream->read((char*)records.resize(count), sizeof(T) * count);
+    }
+    
+    void write_align(size_t alignment)
+    {
+        static const char zeros[16] = {};
+        auto position = static_cast<size_t>(tellp() - __origin_p);
+        __stream->write(zeros, (alignment - position % alignment) % alignment);
+    }
+    
+    template<class T>
+    void write_records(const JsonbufRecords<T>& records)
+    {
+        write_align(alignof(T));
+        __stream->write((const char*)records.data(), sizeof(T) * records.size());
+    }
+    
+    // one column of a columnar array, numbers are a single block
+    template<class T>
+    void read_column(std::vector<T>& values, uint32_t count)
+    {
+        values.resize(count);
+        __stream->read((char*)values.data(), sizeof(T) * count);
+    }
+    
+    // bools are a bitmap with element n at bit n % 8 of byte n / 8
+    void read_column(std::vector<bool>& values, uint32_t count)
+    {
+        std::string bits((count + 7) / 8, '\0');
+        __stream->read(&bits[0], bits.size());
+        values.resize(count);
+        for (uint32_t n = 0; n < count; n++) { values[n] = (static_cast<uint8_t>(bits[n >> 3]) >> (n & 7) & 1) != 0; }
+    }
+    
+    // strings are count uint16 sizes followed by their bytes, null and empty strings are both empty
+    void read_column(std::vector<std::string>& values, uint32_t count)
+    {
+        std::vector<uint16_t> sizes;
+        read_column(sizes, count);
+        values.resize(count);
+        for (uint32_t n = 0; n < count; n++)
+        {
+            if (sizes[n] == 0xFFFF || sizes[n] == 0) { values[n].clear(); continue; }
+            values[n].resize(sizes[n]);
+            __stream->read(&values[n][0], sizes[n]);
+        }
+    }
+    
+    // strings are kept by the stream as read_string_view() does
+    void read_column(std::vector<std::string_view>& values, uint32_t count)
+    {
+        std::vector<std::string> strings;
+        read_column(strings, count);
+        values.resize(count);
+        for (uint32_t n = 0; n < count; n++) { values[n] = __strings.emplace_back(std::move(strings[n])); }
+    }
+    
+    template<class T>
+    void write_column(const std::vector<T>& values)
+    {
+        __stream->write((const char*)values.data(), sizeof(T) * values.size());
+    }
+    
+    void write_column(const std::vector<bool>& values)
+    {
+        std::string bits((values.size() + 7) / 8, '\0');
+        for (size_t n = 0; n < values.size(); n++)
+        {
+            if (values[n]) { bits[n >> 3] |= static_cast<char>(1 << (n & 7)); }
+        }
+        __stream->write(bits.data(), bits.size());
+    }
+    
+    void write_column(const std::vector<std::string>& values) { __write_strings(values); }
+    void write_column(const std::vector<std::string_view>& values) { __write_strings(values); }
+    
+    // LEB128, low 7 bits first and high bit set on every byte but the last
+    template<class T>
+    T read_varint()
+    {
+        uint64_t v = 0;
+        for (int shift = 0; shift < 64; shift += 7)
+        {
+            auto byte = static_cast<uint8_t>(__stream->get());
+            v |= static_cast<uint64_t>(byte & 0x7F) << shift;
+            if ((byte & 0x80) == 0) { break; }
+        }
+        return static_cast<T>(v);
+    }
+    
+    // signed integers are zigzag mapped so that small negatives stay short
+    template<class T>
+    T read_zigzag()
+    {
+        auto v = read_varint<uint64_t>();
+        return static_cast<T>(static_cast<int64_t>(v >> 1) ^ -static_cast<int64_t>(v & 1));
+    }
+    
+    // varint counts are stored as count + 1 with 0 for null, which reads as 0xFFFFFFFF like fixed counts
+    uint32_t read_varint_count()
+    {
+        auto v = read_varint<uint32_t>();
+        return v == 0 ? 0xFFFFFFFF : v - 1;
+    }
+    
+    void write_varint(uint64_t v)
+    {
+        char bytes[10];
+        size_t size = 0;
+        while (v >= 0x80)
+        {
+            bytes[size++] = static_cast<char>((v & 0x7F) | 0x80);
+            v >>= 7;
+        }
+        bytes[size++] = static_cast<char>(v);
+        __stream->write(bytes, size);
+    }
+    
+    void write_zigzag(int64_t v)
+    {
+        write_varint((static_cast<uint64_t>(v) << 1) ^ static_cast<uint64_t>(v >> 63));
+    }
+    
+    // loads string pool at start of a pooled document, strings are read as offsets into it since
+    void read_pool()
+    {
+        auto size = read<uint32_t>();
+        std::string entries(size, '\0');
+        __stream->read(&entries[0], size);
+        __pool.clear();
+        __pooled = true;
+        for (size_t position = 0; position + 2 <= entries.size();)
+        {
+            uint16_t length;
+            memcpy(&length, entries.data() + position, sizeof(uint16_t));
+            __pool[static_cast<uint32_t>(4 + position)] = entries.substr(position + 2, length);
+            position += 2 + length;
+        }
+    }
+    
+    // strings are pooled until end_pool(), which writes the pool ahead of everything written since
+    void begin_pool()
+    {
+        __offsets.clear();
+        __entries.clear();
+        __pooled = true;
+        __target = __stream;
+        __stream = __body = new std::stringstream();
+    }
+    
+    void end_pool()
+    {
+        auto body = __body->str();
+        delete __body;
+        __body = nullptr;
+        __stream = __target;
+        __target = nullptr;
+        __pooled = false;
+        write<uint32_t>(static_cast<uint32_t>(__entries.size()));
+        __stream->write(__entries.data(), __entries.size());
+        __stream->write(body.data(), body.size());
+    }
+    
+    std::string read_string()
+    {
+        if (__pooled)
+        {
+            auto offset = read<uint32_t>();
+            if (offset == 0xFFFFFFFF) { return std::string(); }
+            return __pool[offset];
+        }
+        auto size = read<uint16_t>();
+        if (size == 0xFFFF || size == 0) { return std::string(); }
+        std::string v(size, '\0');
+        __stream->read(&v[0], size);
+        return v;
+    }
+    
+    // strings are kept by the stream, views stay valid until it is destroyed or read_pool() is called again
+    std::string_view read_string_view()
+    {
+        if (__pooled)
+        {
+            auto offset = read<uint32_t>();
+            if (offset == 0xFFFFFFFF) { return std::string_view(); }
+            return __pool[offset];
+        }
+        return __strings.emplace_back(read_string());
+    }
+    
+    void write_string(std::string_view v) { write_string(std::string(v)); }
+    
+    void write_string(const std::string& v)
+    {
+        if (__pooled)
+        {
+            auto iter = __offsets.find(v);
+            if (iter == __offsets.end())
+            {
+                iter = __offsets.emplace(v, static_cast<uint32_t>(4 + __entries.size())).first;
+                auto size = static_cast<uint16_t>(v.size());
+                __entries.append((const char*)&size, sizeof(uint16_t));
+                __entries.append(v);
+            }
+            write<uint32_t>(iter->second);
+            return;
+        }
+        write<uint16_t>(static_cast<uint16_t>(v.size()));
+        __stream->write(v.data(), v.size());
+    }
+    
+    // front-coded key of sorted dicts, key holds previous key on entry and is overwritten unless restart
+    void read_prefixed_string(std::string& key, bool restart)
+    {
+        uint16_t shared = restart ? 0 : read<uint16_t>();
+        uint16_t size = read<uint16_t>();
+        key.resize(shared + size);
+        __stream->read(&key[shared], size);
+    }
+    
+    void write_prefixed_string(const std::string& v, const std::string& previous, bool restart)
+    {
+        size_t shared = 0;
+        if (!restart)
+        {
+            auto limit = std::min<size_t>(std::min(v.size(), previous.size()), 0xFFFF);
+            while (shared < limit && v[shared] == previous[shared]) { shared++; }
+            write<uint16_t>(static_cast<uint16_t>(shared));
+        }
+        write<uint16_t>(static_cast<uint16_t>(v.size() - shared));
+        __stream->write(v.data() + shared, v.size() - shared);
+    }
+    
+    // binary searches blocks of a sorted dict positioned after its count, leaves stream at the block
+    // that may hold key and returns its number of entries
+    uint32_t find_block(uint32_t count, const std::string& key)
+    {
+        std::string first;
+        return __find_block(count, key, [this, &first]() -> const std::string& { read_prefixed_string(first, true); return first; });
+    }
+    
+    template<class T>
+    uint32_t find_block(uint32_t count, T key)
+    {
+        return __find_block(count, key, [this]() { return read<T>(); });
+    }
+    
+    // varint keys are read by the given reader
+    template<class T, class R>
+    uint32_t find_block(uint32_t count, T key, R read_key)
+    {
+        return __find_block(count, key, read_key);
+    }
     
     ~JsonbufStream()
     {
         __stream = nullptr;
         delete [] __buf;
+        delete __body;
+    }
+    
+private:
+    template<class S>
+    void __write_strings(const std::vector<S>& values)
+    {
+        std::vector<uint16_t> sizes(values.size());
+        for (size_t n = 0; n < values.size(); n++) { sizes[n] = static_cast<uint16_t>(values[n].size()); }
+        write_column(sizes);
+        for (auto& v : values) { __stream->write(v.data(), v.size()); }
+    }
+    
+    template<class T, class R>
+    uint32_t __find_block(uint32_t count, const T& key, R read_key)
+    {
+        static const uint32_t BLOCK_SIZE = 16;
+        auto blocks = (count + BLOCK_SIZE - 1) / BLOCK_SIZE;
+        auto table = tellg();
+        auto base = table + std::streamoff(4 * (blocks + 1));
+        uint32_t lo = 0, hi = blocks;
+        while (lo < hi)
+        {
+            auto mid = (lo + hi) / 2;
+            seekg(table + std::streamoff(4 * mid));
+            seekg(base + std::streamoff(read<uint32_t>()));
+            if (key < read_key()) { hi = mid; } else { lo = mid + 1; }
+        }
+        if (lo == 0) { return 0; }
+        seekg(table + std::streamoff(4 * (lo - 1)));
+        seekg(base + std::streamoff(read<uint32_t>()));
+        return std::min(BLOCK_SIZE, count - (lo - 1) * BLOCK_SIZE);
     }
 };
 
+template<> void JsonbufStream::write(std::string v);
+template<> void JsonbufStream::write(const char* v);
+template<> std::string JsonbufStream::read();
+template<> const char* JsonbufStream::read();
+
 template<typename T> void JsonbufStream::write(T v)
 {
     auto ptr = (char*)&v;
@@ -78,10 +487,241 @@ template<typename T> T JsonbufStream::read()
     return *(T *)__buf;
 }
 
+// reader over a contiguous buffer such as a mmap'd file, which must outlive the reader and the views it returns,
+// reads are bounds checked and throw std::out_of_range past the end
+class JsonbufBuffer
+{
+    const char* __data;
+    size_t __size;
+    size_t __offset = 0;
+
+    bool __pooled = false;
+    size_t __pool = 0;
+
+public:
+    JsonbufBuffer(const char* data, size_t size): __data(data), __size(size) {}
+
+    const char* data() const { return __data; }
+    size_t size() const { return __size; }
+    size_t tellg() const { return __offset; }
+    void seekg(size_t pos) { __offset = __check(pos, 0); }
+
+    template<class T>
+    T read()
+    {
+        T v;
+        memcpy(&v, __data + __check(__offset, sizeof(T)), sizeof(T));
+        __offset += sizeof(T);
+        return v;
+    }
+
+    std::vector<uint32_t> read_offsets(uint32_t count)
+    {
+        // checked ahead of allocating, so a corrupt count can not ask for more than data holds
+        auto size = sizeof(uint32_t) * (static_cast<size_t>(count) + 1);
+        auto data = __data + __check(__offset, size);
+        std::vector<uint32_t> offsets(static_cast<size_t>(count) + 1);
+        memcpy(offsets.data(), data, size);
+        __offset += size;
+        return offsets;
+    }
+
+    // elements to reserve for an array of count elements taking at least min_size bytes each
+    uint32_t reserve_count(uint32_t count, size_t min_size)
+    {
+        __check(__offset, min_size * count);
+        return count;
+    }
+
+    void seek_element(uint32_t count, uint32_t n)
+    {
+        auto table = __offset;
+        __offset = __check(table + 4 * static_cast<size_t>(n), sizeof(uint32_t));
+        seekg(table + 4 * (static_cast<size_t>(count) + 1) + read<uint32_t>());
+    }
+
+    void align(size_t alignment)
+    {
+        __offset = __check(__offset + (alignment - __offset % alignment) % alignment, 0);
+    }
+
+    // records are viewed in place when data is aligned for them, as mmap'd files are, and copied otherwise
+    template<class T>
+    void read_records(JsonbufRecords<T>& records, uint32_t count)
+    {
+        align(alignof(T));
+        auto size = sizeof(T) * count;
+        auto data = __data + __check(__offset, size);
+        __offset += size;
+        if (reinterpret_cast<uintptr_t>(data) % alignof(T) == 0)
+        {
+            records.view(reinterpret_cast<const T*>(data), count);
+        }
+        else
+        {
+            memcpy(records.resize(count), data, size);
+        }
+    }
+
+    // columns of columnar arrays, see JsonbufStream::read_column()
+    template<class T>
+    void read_column(std::vector<T>& values, uint32_t count)
+    {
+        auto size = sizeof(T) * count;
+        auto data = __data + __check(__offset, size);
+        values.resize(count);
+        memcpy(values.data(), data, size);
+        __offset += size;
+    }
+
+    void read_column(std::vector<bool>& values, uint32_t count)
+    {
+        auto bits = __data + __check(__offset, (count + 7) / 8);
+        __offset += (count + 7) / 8;
+        values.resize(count);
+        for (uint32_t n = 0; n < count; n++) { values[n] = (static_cast<uint8_t>(bits[n >> 3]) >> (n & 7) & 1) != 0; }
+    }
+
+    // zero-copy views into data like read_string_view()
+    void read_column(std::vector<std::string_view>& values, uint32_t count)
+    {
+        std::vector<uint16_t> sizes;
+        read_column(sizes, count);
+        values.resize(count);
+        for (uint32_t n = 0; n < count; n++)
+        {
+            if (sizes[n] == 0xFFFF || sizes[n] == 0) { values[n] = std::string_view(); continue; }
+            values[n] = std::string_view(__data + __check(__offset, sizes[n]), sizes[n]);
+            __offset += sizes[n];
+        }
+    }
+
+    void read_column(std::vector<std::string>& values, uint32_t count)
+    {
+        std::vector<std::string_view> views;
+        read_column(views, count);
+        values.assign(views.begin(), views.end());
+    }
+
+    template<class T>
+    T read_varint()
+    {
+        uint64_t v = 0;
+        for (int shift = 0; shift < 64; shift += 7)
+        {
+            auto byte = static_cast<uint8_t>(__data[__check(__offset, 1)]);
+            __offset++;
+            v |= static_cast<uint64_t>(byte & 0x7F) << shift;
+            if ((byte & 0x80) == 0) { break; }
+        }
+        return static_cast<T>(v);
+    }
+
+    template<class T>
+    T read_zigzag()
+    {
+        auto v = read_varint<uint64_t>();
+        return static_cast<T>(static_cast<int64_t>(v >> 1) ^ -static_cast<int64_t>(v & 1));
+    }
+
+    uint32_t read_varint_count()
+    {
+        auto v = read_varint<uint32_t>();
+        return v == 0 ? 0xFFFFFFFF : v - 1;
+    }
+
+    // pool entries are left in place, pooled strings are viewed at pool start + offset
+    void read_pool()
+    {
+        __pool = __offset;
+        auto size = read<uint32_t>();
+        __offset = __check(__offset, size) + size;
+        __pooled = true;
+    }
+
+    // zero-copy view into data, null and empty strings are both empty views
+    std::string_view read_string_view()
+    {
+        if (__pooled)
+        {
+            auto offset = read<uint32_t>();
+            if (offset == 0xFFFFFFFF) { return std::string_view(); }
+            auto position = __check(__pool + offset, sizeof(uint16_t));
+            uint16_t size;
+            memcpy(&size, __data + position, sizeof(uint16_t));
+            return std::string_view(__data + __check(position + 2, size), size);
+        }
+        auto size = read<uint16_t>();
+        if (size == 0xFFFF || size == 0) { return std::string_view(); }
+        std::string_view v(__data + __check(__offset, size), size);
+        __offset += size;
+        return v;
+    }
+
+    std::string read_string() { return std::string(read_string_view()); }
+
+    void read_prefixed_string(std::string& key, bool restart)
+    {
+        uint16_t shared = restart ? 0 : read<uint16_t>();
+        uint16_t size = read<uint16_t>();
+        key.resize(shared);
+        key.append(__data + __check(__offset, size), size);
+        __offset += size;
+    }
+
+    uint32_t find_block(uint32_t count, const std::string& key)
+    {
+        std::string first;
+        return __find_block(count, key, [this, &first]() -> const std::string& { read_prefixed_string(first, true); return first; });
+    }
+
+    template<class T>
+    uint32_t find_block(uint32_t count, T key)
+    {
+        return __find_block(count, key, [this]() { return read<T>(); });
+    }
+
+    template<class T, class R>
+    uint32_t find_block(uint32_t count, T key, R read_key)
+    {
+        return __find_block(count, key, read_key);
+    }
+
+private:
+    // position if size bytes can be read there
+    size_t __check(size_t position, size_t size) const
+    {
+        if (position > __size || size > __size - position) { throw std::out_of_range("jsonbuf: read past end of buffer"); }
+        return position;
+    }
+
+    template<class T, class R>
+    uint32_t __find_block(uint32_t count, const T& key, R read_key)
+    {
+        static const uint32_t BLOCK_SIZE = 16;
+        auto blocks = (count + BLOCK_SIZE - 1) / BLOCK_SIZE;
+        auto table = __offset;
+        auto base = table + 4 * (blocks + 1);
+        uint32_t lo = 0, hi = blocks;
+        while (lo < hi)
+        {
+            auto mid = (lo + hi) / 2;
+            seekg(table + 4 * mid);
+            seekg(base + read<uint32_t>());
+            if (key < read_key()) { hi = mid; } else { lo = mid + 1; }
+        }
+        if (lo == 0) { return 0; }
+        seekg(table + 4 * (lo - 1));
+        seekg(base + read<uint32_t>());
+        return std::min(BLOCK_SIZE, count - (lo - 1) * BLOCK_SIZE);
+    }
+};
+
 class IJsonbuf
 {
 public:
     virtual void deserialize(JsonbufStream& decoder) = 0;
+    virtual void deserialize(JsonbufBuffer& decoder) = 0;
     virtual void serialize(JsonbufStream& encoder) = 0;
 };
 
@@ -8,5 +8,6 @@ namespace jsonbuf
     {
         void Serialize(JsonbufWriter encoder);
         void Deserialize(JsonbufReader decoder);
+        void Deserialize(ref JsonbufSpanReader decoder);
     }
 }
@@ -1,22 +1,245 @@
+using System;
+using System.Collections.Generic;
 using System.IO;
+using System.Runtime.InteropServices;
 using System.Text;
 
 namespace jsonbuf
 {
     public class JsonbufReader: BinaryReader
     {
+        private Dictionary<uint, string> pool;
+        private readonly long origin;
+        private byte[] scratch;
+        
         public JsonbufReader(Stream input) : base(input)
         {
-            
+            origin = input.CanSeek ? input.Position : 0;
         }
         
         public JsonbufReader(Stream input, Encoding encoding) : base(input, encoding)
         {
-            
+            origin = input.CanSeek ? input.Position : 0;
+        }
+
+        public long Position
+        {
+            get { return BaseStream.Position; }
+            set { BaseStream.Position = value; }
+        }
+
+        // interns strings read afterwards, see JsonbufStringCache
+        public JsonbufStringCache Cache { get; set; }
+
+        // offset table of indexed arrays, element n starts at Position + offsets[n]
+        public uint[] ReadOffsets(uint count)
+        {
+            var offsets = new uint[count + 1];
+            for (var i = 0; i < offsets.Length; i++)
+            {
+                offsets[i] = ReadUInt32();
+            }
+
+            return offsets;
+        }
+
+        // positions at element n of an indexed array after its count, reading only its own offset from the table
+        public void SeekElement(uint count, uint n)
+        {
+            var table = Position;
+            Position = table + 4L * n;
+            Position = table + 4L * (count + 1L) + ReadUInt32();
+        }
+
+        // skips zero padding up to a multiple of size, measured from where the document starts
+        public void Align(int size)
+        {
+            var pad = (int)((size - (Position - origin) % size) % size);
+            if (pad > 0) Position += pad;
+        }
+
+        // records of aligned arrays are read as a block straight into T[], whose explicit layout must match
+        // the encoded one byte for byte, little-endian as written
+        public T[] ReadRecords<T>(uint count, int align) where T : struct
+        {
+            Align(align);
+            return ReadColumn<T>(count);
+        }
+
+        // numeric columns of columnar arrays are read as a block straight into T[], little-endian as written
+        public T[] ReadColumn<T>(uint count) where T : struct
+        {
+            var values = new T[count];
+            Fill(MemoryMarshal.AsBytes(values.AsSpan()));
+            return values;
+        }
+
+        // bool columns are bitmaps, value n at bit n % 8 of byte n / 8
+        public bool[] ReadBitmap(uint count)
+        {
+            var bits = ReadBytes((int)((count + 7) >> 3));
+            if (bits.Length != (count + 7) >> 3) throw new EndOfStreamException();
+            var values = new bool[count];
+            for (var i = 0; i < values.Length; i++)
+            {
+                values[i] = (bits[i >> 3] >> (i & 7) & 1) != 0;
+            }
+
+            return values;
+        }
+
+        // string columns hold all sizes ahead of the concatenated bytes, which are read as one block
+        public string[] ReadStrings(uint count)
+        {
+            var sizes = ReadColumn<ushort>(count);
+            var total = 0;
+            foreach (var size in sizes)
+            {
+                if (size != ushort.MaxValue) total += size;
+            }
+
+            if (scratch == null || scratch.Length < total) scratch = new byte[Math.Max(total, 256)];
+            Fill(scratch.AsSpan(0, total));
+            var values = new string[count];
+            var offset = 0;
+            for (var i = 0; i < values.Length; i++)
+            {
+                if (sizes[i] == ushort.MaxValue) continue;
+                var data = new ReadOnlySpan<byte>(scratch, offset, sizes[i]);
+                values[i] = data.Length == 0 ? string.Empty : Cache != null ? Cache.Get(data) : Encoding.UTF8.GetString(data);
+                offset += sizes[i];
+            }
+
+            return values;
+        }
+
+        private void Fill(Span<byte> data)
+        {
+            while (data.Length > 0)
+            {
+                var size = Read(data);
+                if (size == 0) throw new EndOfStreamException();
+                data = data.Slice(size);
+            }
+        }
+
+        // front-coded key of sorted dicts, previous holds utf-8 bytes of last key and is ignored on restart
+        public string ReadPrefixedString(ref byte[] previous, bool restart)
+        {
+            var shared = restart ? 0 : ReadUInt16();
+            var size = ReadUInt16();
+            var data = new byte[shared + size];
+            if (shared > 0)
+            {
+                Buffer.BlockCopy(previous, 0, data, 0, shared);
+            }
+
+            var suffix = ReadBytes(size);
+            Buffer.BlockCopy(suffix, 0, data, shared, suffix.Length);
+            previous = data;
+            return Encoding.UTF8.GetString(data);
+        }
+
+        // binary searches blocks of a sorted dict positioned after its count, leaves stream at the block
+        // that may hold key and returns its number of entries
+        public uint FindBlock(uint count, string key)
+        {
+            var target = Encoding.UTF8.GetBytes(key);
+            byte[] first = null;
+            return FindBlock(count, () =>
+            {
+                ReadPrefixedString(ref first, true);
+                return CompareBytes(target, first) < 0;
+            });
+        }
+
+        public uint FindBlock<T>(uint count, T key, Func<T> readKey) where T : IComparable<T>
+        {
+            return FindBlock(count, () => key.CompareTo(readKey()) < 0);
+        }
+
+        private uint FindBlock(uint count, Func<bool> precedes)
+        {
+            const uint blockSize = 16;
+            var blocks = (count + blockSize - 1) / blockSize;
+            var table = Position;
+            var entries = table + 4 * (blocks + 1);
+            uint lo = 0, hi = blocks;
+            while (lo < hi)
+            {
+                var mid = (lo + hi) / 2;
+                Position = table + 4 * mid;
+                Position = entries + ReadUInt32();
+                if (precedes()) hi = mid; else lo = mid + 1;
+            }
+
+            if (lo == 0) return 0;
+            Position = table + 4 * (lo - 1);
+            Position = entries + ReadUInt32();
+            return Math.Min(blockSize, count - (lo - 1) * blockSize);
+        }
+
+        private static int CompareBytes(byte[] x, byte[] y)
+        {
+            var length = Math.Min(x.Length, y.Length);
+            for (var i = 0; i < length; i++)
+            {
+                if (x[i] != y[i]) return x[i] - y[i];
+            }
+
+            return x.Length - y.Length;
+        }
+
+        // LEB128, low 7 bits first and high bit set on every byte but the last
+        public ulong ReadVarint()
+        {
+            ulong value = 0;
+            for (var shift = 0; shift < 64; shift += 7)
+            {
+                var b = ReadByte();
+                value |= (ulong)(b & 0x7F) << shift;
+                if ((b & 0x80) == 0) break;
+            }
+
+            return value;
+        }
+
+        // signed integers are zigzag mapped so that small negatives stay short
+        public long ReadZigzag()
+        {
+            var value = ReadVarint();
+            return (long)(value >> 1) ^ -(long)(value & 1);
+        }
+
+        // varint counts are stored as count + 1 with 0 for null, which reads as 0xFFFFFFFF like fixed counts
+        public uint ReadVarintCount()
+        {
+            var value = (uint)ReadVarint();
+            return value == 0 ? uint.MaxValue : value - 1;
+        }
+
+        // loads string pool at start of a pooled document, strings are read as offsets into it since
+        public void ReadPool()
+        {
+            var entries = ReadBytes((int)ReadUInt32());
+            pool = new Dictionary<uint, string>();
+            var position = 0;
+            while (position + 2 <= entries.Length)
+            {
+                var size = entries[position] | entries[position + 1] << 8;
+                pool[(uint)(4 + position)] = size == 0 ? string.Empty : Encoding.UTF8.GetString(entries, position + 2, size);
+                position += 2 + size;
+            }
         }
 
         public new string ReadString()
         {
+            if (pool != null)
+            {
+                var offset = ReadUInt32();
+                return offset == uint.MaxValue ? null : pool[offset];
+            }
+            
             var size = ReadUInt16();
             if (size == ushort.MaxValue)
             {
@@ -28,7 +251,17 @@ namespace jsonbuf
                 return string.Empty;
             }
 
-            return Encoding.UTF8.GetString(ReadBytes(size));
+            // bytes of strings go through one reused buffer instead of a byte[] each
+            if (scratch == null || scratch.Length < size) scratch = new byte[Math.Max((int)size, 256)];
+            for (var offset = 0; offset < size;)
+            {
+                var n = Read(scratch, offset, size - offset);
+                if (n == 0) throw new EndOfStreamException();
+                offset += n;
+            }
+
+            var data = new ReadOnlySpan<byte>(scratch, 0, size);
+            return Cache != null ? Cache.Get(data) : Encoding.UTF8.GetString(data);
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,209 @@
+using System;
+using System.Buffers.Binary;
+using System.Collections.Generic;
+using System.IO;
+using System.Runtime.InteropServices;
+using System.Text;
+
+namespace jsonbuf
+{
+    // decodes a whole document held in memory, scalars are read in place with no stream or per-string byte[]
+    // in between, Position is measured from the start of data, which must be where the document starts
+    public ref struct JsonbufSpanReader
+    {
+        private readonly ReadOnlySpan<byte> data;
+        private readonly JsonbufStringCache cache;
+        private Dictionary<uint, string> pool;
+        private int position;
+
+        public JsonbufSpanReader(ReadOnlySpan<byte> data, JsonbufStringCache cache = null)
+        {
+            this.data = data;
+            this.cache = cache;
+            pool = null;
+            position = 0;
+        }
+
+        public int Position
+        {
+            get { return position; }
+            set { position = value; }
+        }
+
+        public int Remaining
+        {
+            get { return data.Length - position; }
+        }
+
+        private ReadOnlySpan<byte> Take(int size)
+        {
+            if (size > data.Length - position) throw new EndOfStreamException();
+            var span = data.Slice(position, size);
+            position += size;
+            return span;
+        }
+
+        public bool ReadBoolean() { return Take(1)[0] != 0; }
+        public byte ReadByte() { return Take(1)[0]; }
+        public sbyte ReadSByte() { return (sbyte)Take(1)[0]; }
+        public short ReadInt16() { return BinaryPrimitives.ReadInt16LittleEndian(Take(2)); }
+        public ushort ReadUInt16() { return BinaryPrimitives.ReadUInt16LittleEndian(Take(2)); }
+        public int ReadInt32() { return BinaryPrimitives.ReadInt32LittleEndian(Take(4)); }
+        public uint ReadUInt32() { return BinaryPrimitives.ReadUInt32LittleEndian(Take(4)); }
+        public long ReadInt64() { return BinaryPrimitives.ReadInt64LittleEndian(Take(8)); }
+        public ulong ReadUInt64() { return BinaryPrimitives.ReadUInt64LittleEndian(Take(8)); }
+        public float ReadSingle() { return BitConverter.Int32BitsToSingle(ReadInt32()); }
+        public double ReadDouble() { return BitConverter.Int64BitsToDouble(ReadInt64()); }
+
+        // offset table of indexed arrays, element n starts at Position + offsets[n]
+        public uint[] ReadOffsets(uint count)
+        {
+            var offsets = new uint[count + 1];
+            for (var i = 0; i < offsets.Length; i++)
+            {
+                offsets[i] = ReadUInt32();
+            }
+
+            return offsets;
+        }
+
+        // front-coded key of sorted dicts, previous holds utf-8 bytes of last key and is ignored on restart
+        public string ReadPrefixedString(ref byte[] previous, bool restart)
+        {
+            var shared = restart ? 0 : ReadUInt16();
+            var suffix = Take(ReadUInt16());
+            var key = new byte[shared + suffix.Length];
+            if (shared > 0)
+            {
+                Buffer.BlockCopy(previous, 0, key, 0, shared);
+            }
+
+            suffix.CopyTo(key.AsSpan(shared));
+            previous = key;
+            return Decode(key);
+        }
+
+        // LEB128, low 7 bits first and high bit set on every byte but the last
+        public ulong ReadVarint()
+        {
+            ulong value = 0;
+            for (var shift = 0; shift < 64; shift += 7)
+            {
+                var b = ReadByte();
+                value |= (ulong)(b & 0x7F) << shift;
+                if ((b & 0x80) == 0) break;
+            }
+
+            return value;
+        }
+
+        // signed integers are zigzag mapped so that small negatives stay short
+        public long ReadZigzag()
+        {
+            var value = ReadVarint();
+            return (long)(value >> 1) ^ -(long)(value & 1);
+        }
+
+        // varint counts are stored as count + 1 with 0 for null, which reads as 0xFFFFFFFF like fixed counts
+        public uint ReadVarintCount()
+        {
+            var value = (uint)ReadVarint();
+            return value == 0 ? uint.MaxValue : value - 1;
+        }
+
+        // skips zero padding up to a multiple of size
+        public void Align(int size)
+        {
+            Take((size - position % size) % size);
+        }
+
+        // records of aligned arrays are copied as a block into T[], whose explicit layout must match the encoded
+        // one byte for byte
+        public T[] ReadRecords<T>(uint count, int align) where T : struct
+        {
+            Align(align);
+            var records = new T[count];
+            var bytes = MemoryMarshal.AsBytes(records.AsSpan());
+            Take(bytes.Length).CopyTo(bytes);
+            return records;
+        }
+
+        // numeric columns of columnar arrays are copied as a block into T[], little-endian as written
+        public T[] ReadColumn<T>(uint count) where T : struct
+        {
+            var values = new T[count];
+            var bytes = MemoryMarshal.AsBytes(values.AsSpan());
+            Take(bytes.Length).CopyTo(bytes);
+            return values;
+        }
+
+        // bool columns are bitmaps, value n at bit n % 8 of byte n / 8
+        public bool[] ReadBitmap(uint count)
+        {
+            var bits = Take((int)((count + 7) >> 3));
+            var values = new bool[count];
+            for (var i = 0; i < values.Length; i++)
+            {
+                values[i] = (bits[i >> 3] >> (i & 7) & 1) != 0;
+            }
+
+            return values;
+        }
+
+        // string columns hold all sizes ahead of the concatenated bytes, which are decoded in place
+        public string[] ReadStrings(uint count)
+        {
+            var sizes = Take(2 * (int)count);
+            var values = new string[count];
+            for (var i = 0; i < values.Length; i++)
+            {
+                var size = BinaryPrimitives.ReadUInt16LittleEndian(sizes.Slice(2 * i));
+                if (size == ushort.MaxValue) continue;
+                values[i] = size == 0 ? string.Empty : Decode(Take(size));
+            }
+
+            return values;
+        }
+
+        // loads string pool at start of a pooled document, strings are read as offsets into it since
+        public void ReadPool()
+        {
+            var entries = Take((int)ReadUInt32());
+            pool = new Dictionary<uint, string>();
+            var offset = 0;
+            while (offset + 2 <= entries.Length)
+            {
+                var size = entries[offset] | entries[offset + 1] << 8;
+                pool[(uint)(4 + offset)] = size == 0 ? string.Empty : Decode(entries.Slice(offset + 2, size));
+                offset += 2 + size;
+            }
+        }
+
+        public string ReadString()
+        {
+            if (pool != null)
+            {
+                var offset = ReadUInt32();
+                return offset == uint.MaxValue ? null : pool[offset];
+            }
+
+            var size = ReadUInt16();
+            if (size == ushort.MaxValue)
+            {
+                return null;
+            }
+
+            if (size == 0)
+            {
+                return string.Empty;
+            }
+
+            return Decode(Take(size));
+        }
+
+        private string Decode(ReadOnlySpan<byte> bytes)
+        {
+            return cache != null ? cache.Get(bytes) : Encoding.UTF8.GetString(bytes);
+        }
+    }
+}
@@ -0,0 +1,84 @@
+using System;
+using System.Text;
+
+namespace jsonbuf
+{
+    // interns decoded strings by their utf-8 bytes, so that values repeated across records share one instance
+    // and hits allocate nothing, strings longer than maxLength bytes are decoded as usual
+    public class JsonbufStringCache
+    {
+        private struct Entry
+        {
+            public int Hash;
+            public byte[] Key;
+            public string Value;
+        }
+
+        private readonly int maxLength;
+        private Entry[] entries;
+        private int count;
+
+        public JsonbufStringCache(int maxLength = 64, int capacity = 256)
+        {
+            this.maxLength = maxLength;
+            var size = 16;
+            while (size < capacity * 2) size <<= 1;
+            entries = new Entry[size];
+        }
+
+        public int Count
+        {
+            get { return count; }
+        }
+
+        public void Clear()
+        {
+            Array.Clear(entries, 0, entries.Length);
+            count = 0;
+        }
+
+        public string Get(ReadOnlySpan<byte> data)
+        {
+            if (data.Length > maxLength) return Encoding.UTF8.GetString(data);
+            var hash = Hash(data);
+            var mask = entries.Length - 1;
+            var n = hash & mask;
+            while (entries[n].Key != null)
+            {
+                if (entries[n].Hash == hash && data.SequenceEqual(entries[n].Key)) return entries[n].Value;
+                n = (n + 1) & mask;
+            }
+
+            var value = Encoding.UTF8.GetString(data);
+            entries[n] = new Entry { Hash = hash, Key = data.ToArray(), Value = value };
+            if (++count * 2 > entries.Length) Grow();
+            return value;
+        }
+
+        private void Grow()
+        {
+            var previous = entries;
+            entries = new Entry[previous.Length * 2];
+            var mask = entries.Length - 1;
+            foreach (var entry in previous)
+            {
+                if (entry.Key == null) continue;
+                var n = entry.Hash & mask;
+                while (entries[n].Key != null) n = (n + 1) & mask;
+                entries[n] = entry;
+            }
+        }
+
+        // FNV-1a, non-negative so that it masks into the table directly
+        private static int Hash(ReadOnlySpan<byte> data)
+        {
+            var hash = 2166136261;
+            for (var i = 0; i < data.Length; i++)
+            {
+                hash = (hash ^ data[i]) * 16777619;
+            }
+
+            return (int)(hash & 0x7FFFFFFF);
+        }
+    }
+}
@@ -1,27 +1,229 @@
 using System;
+using System.Collections.Generic;
 using System.IO;
+using System.Runtime.InteropServices;
 using System.Text;
 
 namespace jsonbuf
 {
     public class JsonbufWriter: BinaryWriter
     {
+        private Dictionary<string, uint> pool;
+        private MemoryStream entries;
+        private Stream target;
+        private long origin;
+        private byte[] scratch;
+
+        protected JsonbufWriter()
+        {
+            
+        }
+
+        public JsonbufWriter(Stream output) : base(output)
+        {
+            origin = output.CanSeek ? output.Position : 0;
+        }
+
+        public JsonbufWriter(Stream output, Encoding encoding) : base(output, encoding)
+        {
+            origin = output.CanSeek ? output.Position : 0;
+        }
+        
+        public long Position
+        {
+            get { Flush(); return BaseStream.Position; }
+            set { Flush(); BaseStream.Position = value; }
+        }
+
+        public void WriteOffsets(uint[] offsets)
+        {
+            for (var i = 0; i < offsets.Length; i++)
+            {
+                Write(offsets[i]);
+            }
+        }
+
+        // zero padding up to a multiple of size, measured from where the document starts
+        public void Align(int size)
+        {
+            var pad = (int)((size - (Position - origin) % size) % size);
+            for (var i = 0; i < pad; i++) Write((byte)0);
+        }
+
+        public void WriteRecords<T>(T[] records, int align) where T : struct
+        {
+            Align(align);
+            WriteColumn(records);
+        }
+
+        // numeric columns of columnar arrays, written as one little-endian block
+        public void WriteColumn<T>(T[] values) where T : struct
+        {
+            Write(MemoryMarshal.AsBytes(values.AsSpan()));
+        }
+
+        // bool columns are bitmaps, value n at bit n % 8 of byte n / 8
+        public void WriteBitmap(bool[] values)
+        {
+            var bits = new byte[(values.Length + 7) >> 3];
+            for (var i = 0; i < values.Length; i++)
+            {
+                if (values[i]) bits[i >> 3] |= (byte)(1 << (i & 7));
+            }
+
+            Write(bits);
+        }
+
+        // string columns write all sizes ahead of the concatenated bytes, null as 0xFFFF
+        public void WriteStrings(string[] values)
+        {
+            foreach (var value in values)
+            {
+                if (value == null)
+                {
+                    Write(ushort.MaxValue);
+                    continue;
+                }
+
+                var size = Encoding.UTF8.GetByteCount(value);
+                if (size >= ushort.MaxValue)
+                {
+                    throw new ArgumentOutOfRangeException();
+                }
+
+                Write((ushort)size);
+            }
+
+            foreach (var value in values)
+            {
+                if (string.IsNullOrEmpty(value)) continue;
+                var size = Encoding.UTF8.GetByteCount(value);
+                if (scratch == null || scratch.Length < size) scratch = new byte[Math.Max(size, 256)];
+                Encoding.UTF8.GetBytes(value, 0, value.Length, scratch, 0);
+                Write(scratch, 0, size);
+            }
+        }
+
+        public void WriteVarint(ulong value)
+        {
+            while (value >= 0x80)
+            {
+                Write((byte)(value | 0x80));
+                value >>= 7;
+            }
+
+            Write((byte)value);
+        }
+
+        public void WriteZigzag(long value)
+        {
+            WriteVarint((ulong)(value << 1) ^ (ulong)(value >> 63));
+        }
+
+        // keys of sorted dicts are ordered by utf-8 bytes, which is code point order
+        public static readonly IComparer<string> KeyOrder = new Utf8Comparer();
+
+        // front-coded key of sorted dicts, previous holds utf-8 bytes of last key and is ignored on restart
+        public void WritePrefixedString(string value, ref byte[] previous, bool restart)
+        {
+            var data = Encoding.UTF8.GetBytes(value);
+            var shared = 0;
+            if (!restart)
+            {
+                var limit = Math.Min(Math.Min(data.Length, previous.Length), ushort.MaxValue);
+                while (shared < limit && data[shared] == previous[shared]) shared++;
+                Write((ushort)shared);
+            }
+            
+            Write((ushort)(data.Length - shared));
+            Write(data, shared, data.Length - shared);
+            previous = data;
+        }
+
+        // strings are pooled until EndPool(), which writes the pool ahead of everything written since
+        public void BeginPool()
+        {
+            Flush();
+            pool = new Dictionary<string, uint>();
+            entries = new MemoryStream();
+            target = OutStream;
+            OutStream = new MemoryStream();
+        }
+
+        public void EndPool()
+        {
+            Flush();
+            var body = (MemoryStream)OutStream;
+            OutStream = target;
+            Write((uint)entries.Length);
+            entries.WriteTo(OutStream);
+            body.WriteTo(OutStream);
+            pool = null;
+            entries = null;
+            target = null;
+        }
+
         public new void Write(string value)
         {
+            if (pool != null)
+            {
+                Write(value == null ? uint.MaxValue : Pool(value));
+                return;
+            }
+            
             if (value == null)
             {
                 Write((short)-1);
                 return;
             }
 
+            // encoded into one reused buffer instead of a byte[] per string
+            var size = Encoding.UTF8.GetByteCount(value);
+            if (size >= ushort.MaxValue)
+            {
+                throw new ArgumentOutOfRangeException();
+            }
+
+            if (scratch == null || scratch.Length < size) scratch = new byte[Math.Max(size, 256)];
+            Encoding.UTF8.GetBytes(value, 0, value.Length, scratch, 0);
+            Write((ushort)size);
+            Write(scratch, 0, size);
+        }
+
+        private uint Pool(string value)
+        {
+            uint offset;
+            if (pool.TryGetValue(value, out offset)) return offset;
             var data = Encoding.UTF8.GetBytes(value);
             if (data.Length >= ushort.MaxValue)
             {
                 throw new ArgumentOutOfRangeException();
             }
-            
-            Write((ushort)data.Length);
-            Write(data, 0, data.Length);
+
+            offset = pool[value] = (uint)(4 + entries.Length);
+            entries.WriteByte((byte)data.Length);
+            entries.WriteByte((byte)(data.Length >> 8));
+            entries.Write(data, 0, data.Length);
+            return offset;
+        }
+
+        private class Utf8Comparer : IComparer<string>
+        {
+            public int Compare(string x, string y)
+            {
+                var length = Math.Min(x.Length, y.Length);
+                for (var i = 0; i < length; i++)
+                {
+                    int a = x[i], b = y[i];
+                    if (a == b) continue;
+                    // surrogates encode code points above U+FFFF, move them after U+E000-U+FFFF
+                    if (a >= 0xD800) a += a >= 0xE000 ? -0x800 : 0x2000;
+                    if (b >= 0xD800) b += b >= 0xE000 ? -0x800 : 0x2000;
+                    return a - b;
+                }
+
+                return x.Length - y.Length;
+            }
         }
     }
 }
\ No newline at end of file
@@ -1,9 +1,192 @@
-import io, struct
+import io, struct, os, sys, collections, importlib, mmap, array, types
 import typing
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FRAME_MAGIC = b'JBFR'
+FRAME_CODECS = ['zlib', 'lzma', 'bz2']
+FRAME_HEADER = struct.Struct('<4sBI')
+FRAME_TRAILER = struct.Struct('<QI4s')
+
+BOOL, INT8, UINT8 = struct.Struct('?'), struct.Struct('b'), struct.Struct('B')
+INT16, UINT16 = struct.Struct('<h'), struct.Struct('<H')
+INT32, UINT32 = struct.Struct('<i'), struct.Struct('<I')
+INT64, UINT64 = struct.Struct('<q'), struct.Struct('<Q')
+FLOAT, DOUBLE = struct.Struct('<f'), struct.Struct('<d')
+
+# read-only empty dict shared as default by generated classes with __slots__
+EMPTY_DICT = types.MappingProxyType({})
+
+def pack_column(code, values):
+    """
+    one column of a columnar array, code is '?' for bools written as bitmap with element n at bit n % 8 of
+    byte n // 8, 's' for strings written as uint16 sizes followed by their bytes, else struct format of numbers
+    """
+    if code == '?':
+        bits = bytearray((len(values) + 7) >> 3)
+        for n, v in enumerate(values):
+            if v: bits[n >> 3] |= 1 << (n & 7)
+        return bytes(bits)
+    if code == 's':
+        values = [v.encode('utf-8') if isinstance(v, str) else v for v in values]
+        sizes = [0xFFFF if v is None else min(len(v), 0xFFFF - 1) for v in values]
+        return struct.pack('<{}H'.format(len(sizes)), *sizes) + b''.join(v[:n] for v, n in zip(values, sizes) if v)
+    return struct.pack('<{}{}'.format(len(values), code), *values)
+
+def column_size(code, count, data, offset):
+    """bytes taken by a column of count elements at offset, data needs to hold the sizes of string columns only"""
+    if code == '?': return (count + 7) >> 3
+    if code == 's': return 2 * count + sum(n for n in struct.unpack_from('<{}H'.format(count), data, offset) if n != 0xFFFF)
+    return struct.calcsize('<' + code) * count
+
+def unpack_column(code, count, data, offset, arrays=False):
+    """
+    (values, offset) of a column packed by pack_column(), strings are bytes as read by read_string(). arrays
+    reads numbers and bools into numpy arrays
+    """
+    if code == '?':
+        end = offset + ((count + 7) >> 3)
+        if arrays:
+            bits = numpy.frombuffer(data, numpy.uint8, end - offset, offset)
+            return numpy.unpackbits(bits, count=count, bitorder='little').astype(bool), end
+        return [data[offset + (n >> 3)] >> (n & 7) & 1 == 1 for n in range(count)], end
+    if code == 's':
+        sizes = struct.unpack_from('<{}H'.format(count), data, offset)
+        offset += 2 * count
+        values = []
+        for size in sizes:
+            if size == 0xFFFF or size == 0:
+                values.append(None if size else '')
+            else:
+                values.append(bytes(data[offset:offset + size]))
+                offset += size
+        return values, offset
+    end = offset + struct.calcsize('<' + code) * count
+    if arrays: return numpy.frombuffer(data, numpy.dtype('<' + code), count, offset).astype('=' + code), end
+    return list(struct.unpack_from('<{}{}'.format(count, code), data, offset)), end
+
+class JsonbufFrameReader(object):
+    """
+    seekable read-only view of the payload of a block-compressed document, blocks are decompressed when first
+    read and the most recently used cache_size ones are kept, so lookups decompress only the blocks they touch
+    """
+    def __init__(self, fp, cache_size=8):
+        self.__fp = fp # type: typing.BinaryIO
+        self.__start = fp.tell()
+        magic, codec, self.block_size = FRAME_HEADER.unpack(fp.read(FRAME_HEADER.size))
+        assert magic == FRAME_MAGIC
+        self.__decompress = importlib.import_module(FRAME_CODECS[codec]).decompress
+        fp.seek(-FRAME_TRAILER.size, os.SEEK_END)
+        self.size, count, magic = FRAME_TRAILER.unpack(fp.read(FRAME_TRAILER.size))
+        assert magic == FRAME_MAGIC
+        fp.seek(-FRAME_TRAILER.size - 8 * (count + 1), os.SEEK_END)
+        self.__index = struct.unpack('<{}Q'.format(count + 1), fp.read(8 * (count + 1)))
+        self.__cache = collections.OrderedDict()
+        self.__cache_size = max(1, cache_size)
+        self.__position = 0
+
+    def __block(self, index):
+        block = self.__cache.get(index)
+        if block is not None:
+            self.__cache.move_to_end(index)
+            return block
+        self.__fp.seek(self.__start + self.__index[index])
+        block = self.__decompress(self.__fp.read(self.__index[index + 1] - self.__index[index]))
+        self.__cache[index] = block
+        if len(self.__cache) > self.__cache_size: self.__cache.popitem(last=False)
+        return block
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.__position + size)
+        chunks = []
+        while self.__position < end:
+            index, offset = divmod(self.__position, self.block_size)
+            chunk = self.__block(index)[offset:offset + end - self.__position]
+            chunks.append(chunk)
+            self.__position += len(chunk)
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR: offset += self.__position
+        elif whence == os.SEEK_END: offset += self.size
+        self.__position = offset
+        return offset
+
+    def tell(self):
+        return self.__position
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
 class JsonbufStream(object):
-    def __init__(self, fp):
+    def __init__(self, fp, frame=False):
+        # framed documents are decoded through their block index, plain ones may start with any bytes so
+        # framing is never guessed from them
+        if frame: fp = JsonbufFrameReader(fp)
         self.__stream = fp # type: typing.BinaryIO
+        # records of aligned arrays are padded by position from document start
+        self.__origin = fp.tell() if fp.seekable() else 0
+        self.__pool = None # type: dict
+        self.__entries = None # type: io.BytesIO
+        self.__target = None # type: typing.BinaryIO
+
+    def tell(self):
+        return self.__stream.tell()
+
+    def seek(self, position):
+        self.__stream.seek(position)
+
+    def read_offsets(self, count):
+        """offset table of indexed arrays, element n starts at position + offsets[n]"""
+        offsets = struct.unpack('<{}I'.format(count + 1), self.__stream.read(4 * (count + 1)))
+        return self.__stream.tell(), offsets
+
+    def seek_element(self, count, n):
+        """positions at element n of an indexed array after its count, reading only its own offset from the table"""
+        table = self.__stream.tell()
+        self.__stream.seek(table + 4 * n)
+        self.__stream.seek(table + 4 * (count + 1) + self.read_uint32())
+
+    def align(self, size):
+        """skips padding ahead of records of aligned arrays up to a multiple of size from document start"""
+        self.__stream.read(-(self.__stream.tell() - self.__origin) % size)
+
+    def read_prefixed_string(self, previous):
+        """front-coded key of sorted dicts sharing prefix with previous key, previous is None at start of each block"""
+        shared = 0 if previous is None else self.read_uint16()
+        suffix = self.__stream.read(self.read_uint16())
+        return previous[:shared] + suffix if shared else suffix
+
+    def find_block(self, count, key, read_key=None):
+        """
+        binary searches blocks of a sorted dict positioned after its count, leaves stream at the block that may
+        hold key and returns its number of entries, read_key is None for string keys
+        """
+        if read_key is None:
+            read_key = lambda: self.read_prefixed_string(None)
+            if isinstance(key, str): key = key.encode('utf-8')
+        blocks = (count + 15) // 16
+        table = self.__stream.tell()
+        base = table + 4 * (blocks + 1)
+        lo, hi = 0, blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            self.__stream.seek(table + 4 * mid)
+            self.__stream.seek(base + self.read_uint32())
+            if key < read_key():
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo == 0: return 0
+        self.__stream.seek(table + 4 * (lo - 1))
+        self.__stream.seek(base + self.read_uint32())
+        return min(16, count - (lo - 1) * 16)
 
     def read_bool(self):
         v, = struct.unpack('b', self.__stream.read(1))
@@ -49,7 +232,76 @@ class JsonbufStream(object):
         v, = struct.unpack('<d', self.__stream.read(8))
         return v
 
+    def unpack(self, s):
+        """values of a run of fixed-width fields packed by s"""
+        return s.unpack(self.__stream.read(s.size))
+
+    def read_array(self, code, count):
+        """list of count fixed-width numbers of struct format code"""
+        if code == '?': return [v != 0 for v in self.read_array('b', count)]
+        values = array.array(code)
+        values.frombytes(self.__stream.read(values.itemsize * count))
+        if sys.byteorder == 'big': values.byteswap()
+        return values.tolist()
+
+    def read_records(self, fields, count, columns=False):
+        """
+        count packed records of fields [(name, format)] as numpy structured array, or dict of contiguous column
+        arrays with columns, None for null count. fields may be any numpy dtype spec, like the padded records
+        of aligned arrays with offsets and itemsize.
+        """
+        if numpy is None: raise ImportError('numpy is required by read_records()')
+        if count == 0xFFFFFFFF: return None
+        dtype = numpy.dtype(fields)
+        records = numpy.frombuffer(self.__stream.read(dtype.itemsize * count), dtype=dtype, count=count)
+        if columns: return dict((name, numpy.ascontiguousarray(records[name])) for name in dtype.names)
+        return records
+
+    def read_columns(self, spec, count, arrays=False):
+        """
+        list of the columns of a columnar array with count elements, spec holds the code of each column after
+        byte order, see pack_column(). arrays reads numbers and bools into numpy arrays
+        """
+        if arrays and numpy is None: raise ImportError('numpy is required by read_columns()')
+        columns = []
+        for code in spec[1:]:
+            data = self.__stream.read(2 * count) if code == 's' else b''
+            data += self.__stream.read(column_size(code, count, data, 0) - len(data))
+            columns.append(unpack_column(code, count, data, 0, arrays)[0])
+        return columns
+
+    def read_varint(self):
+        """LEB128 unsigned integer, 7 bits per byte from lowest with high bit set on all but the last byte"""
+        v, shift = 0, 0
+        while True:
+            byte = self.__stream.read(1)[0]
+            v |= (byte & 0x7F) << shift
+            if byte < 0x80: return v
+            shift += 7
+
+    def read_zigzag(self):
+        v = self.read_varint()
+        return (v >> 1) ^ -(v & 1)
+
+    def read_varint_count(self):
+        """count of arrays and dicts with varint encoding, written as count + 1 with 0 for null"""
+        v = self.read_varint()
+        return v - 1 if v else 0xFFFFFFFF
+
+    def read_pool(self):
+        """loads string pool at start of a pooled document, strings are read as offsets into the pool since"""
+        entries = self.__stream.read(self.read_uint32())
+        self.__pool = {}
+        position = 0
+        while position < len(entries):
+            size, = struct.unpack_from('<H', entries, position)
+            self.__pool[4 + position] = entries[position + 2:position + 2 + size] if size else ''
+            position += 2 + size
+
     def read_string(self):
+        if self.__pool is not None:
+            offset = self.read_uint32()
+            return None if offset == 0xFFFFFFFF else self.__pool[offset]
         size = self.read_uint16()
         if size == 0xFFFF: return None
         if size == 0: return ''
@@ -88,7 +340,70 @@ class JsonbufStream(object):
     def write_double(self, v):
         self.__stream.write(struct.pack('<d', v))
 
+    def pack(self, s, *values):
+        self.__stream.write(s.pack(*values))
+
+    def write_columns(self, spec, *columns):
+        """columns of a columnar array as read by read_columns()"""
+        for code, values in zip(spec[1:], columns): self.__stream.write(pack_column(code, values))
+
+    def write_array(self, code, values):
+        self.__stream.write(struct.pack('<{}{}'.format(len(values), code), *values))
+
+    def write_varint(self, v):
+        while v >= 0x80:
+            self.__stream.write(struct.pack('B', v & 0x7F | 0x80))
+            v >>= 7
+        self.__stream.write(struct.pack('B', v))
+
+    def write_zigzag(self, v):
+        self.write_varint((v << 1) ^ (v >> 63))
+
+    def write_offsets(self, offsets):
+        self.__stream.write(struct.pack('<{}I'.format(len(offsets)), *offsets))
+
+    def write_align(self, size):
+        """zero padding ahead of records of aligned arrays up to a multiple of size from document start"""
+        self.__stream.write(bytes(-(self.__stream.tell() - self.__origin) % size))
+
+    def write_prefixed_string(self, v, previous):
+        """returns utf-8 bytes of v to be passed as previous of next key, previous is None at start of each block"""
+        if isinstance(v, str): v = v.encode('utf-8')
+        shared = 0
+        if previous is not None:
+            limit = min(len(v), len(previous), 0xFFFF)
+            while shared < limit and v[shared] == previous[shared]: shared += 1
+            self.write_uint16(shared)
+        self.write_uint16(len(v) - shared)
+        self.__stream.write(v[shared:])
+        return v
+
+    def begin_pool(self):
+        """strings are pooled until end_pool(), which writes the pool ahead of everything written since"""
+        self.__pool, self.__entries = {}, io.BytesIO()
+        self.__target, self.__stream = self.__stream, io.BytesIO()
+
+    def end_pool(self):
+        body, entries = self.__stream.getvalue(), self.__entries.getvalue()
+        self.__stream = self.__target
+        self.__pool = self.__entries = self.__target = None
+        self.write_uint32(len(entries))
+        self.__stream.write(entries)
+        self.__stream.write(body)
+
     def write_string(self, v):
+        if self.__pool is not None:
+            if v is None:
+                self.write_uint32(0xFFFFFFFF)
+                return
+            if isinstance(v, str): v = v.encode('utf-8')
+            offset = self.__pool.get(v)
+            if offset is None:
+                offset = self.__pool[v] = 4 + self.__entries.tell()
+                self.__entries.write(struct.pack('<H', len(v)))
+                self.__entries.write(v)
+            self.write_uint32(offset)
+            return
         if v is None:
             self.write_int16(-1)
             return
@@ -97,7 +412,347 @@ class JsonbufStream(object):
         return self.__stream.write(v)
 
 
+class JsonbufBuffer(object):
+    """
+    JsonbufStream over memory, values are unpacked in place from data at offset by precompiled structs instead
+    of reading a fresh bytes object per value. Reads data when given, bytes and mmaps directly and any other
+    buffer through a memoryview, otherwise writes into a bytearray returned by getvalue(). Framed data is
+    decompressed as a whole when frame is set.
+    """
+    def __init__(self, data=None, offset=0, frame=False):
+        if frame:
+            frame = io.BytesIO(data)
+            frame.seek(offset)
+            data, offset = JsonbufFrameReader(frame).read(), 0
+        if data is None: data = bytearray()
+        elif not isinstance(data, (bytes, mmap.mmap)): data = memoryview(data)
+        self.__data = data # type: typing.Union[bytes, mmap.mmap, memoryview, bytearray]
+        self.offset = offset
+        # records of aligned arrays are padded by position from document start
+        self.__origin = offset
+        self.__pool = None # type: dict
+        self.__entries = None # type: bytearray
+        self.__target = None # type: typing.Tuple[bytearray, int]
+
+    @property
+    def data(self):
+        return self.__data
+
+    def getvalue(self):
+        return bytes(self.__data)
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, position):
+        self.offset = position
+
+    def unpack(self, s):
+        """values of a run of fixed-width fields packed by s"""
+        values = s.unpack_from(self.__data, self.offset)
+        self.offset += s.size
+        return values
+
+    def read_array(self, code, count):
+        """list of count fixed-width numbers of struct format code"""
+        if code == '?': return [v != 0 for v in self.read_array('b', count)]
+        values = array.array(code)
+        size = values.itemsize * count
+        values.frombytes(self.__data[self.offset:self.offset + size])
+        if sys.byteorder == 'big': values.byteswap()
+        self.offset += size
+        return values.tolist()
+
+    def read_records(self, fields, count, columns=False):
+        """
+        count packed records of fields [(name, format)] as read-only numpy structured array over data, or dict of
+        contiguous column arrays with columns, None for null count
+        """
+        if numpy is None: raise ImportError('numpy is required by read_records()')
+        if count == 0xFFFFFFFF: return None
+        dtype = numpy.dtype(fields)
+        records = numpy.frombuffer(self.__data, dtype=dtype, count=count, offset=self.offset)
+        self.offset += dtype.itemsize * count
+        if columns: return dict((name, numpy.ascontiguousarray(records[name])) for name in dtype.names)
+        return records
+
+    def read_columns(self, spec, count, arrays=False):
+        """
+        list of the columns of a columnar array with count elements, spec holds the code of each column after
+        byte order, see pack_column(). arrays reads numbers and bools into numpy arrays
+        """
+        if arrays and numpy is None: raise ImportError('numpy is required by read_columns()')
+        columns = []
+        for code in spec[1:]:
+            values, self.offset = unpack_column(code, count, self.__data, self.offset, arrays)
+            columns.append(values)
+        return columns
+
+    def read_offsets(self, count):
+        """offset table of indexed arrays, element n starts at position + offsets[n]"""
+        offsets = struct.unpack_from('<{}I'.format(count + 1), self.__data, self.offset)
+        self.offset += 4 * (count + 1)
+        return self.offset, offsets
+
+    def seek_element(self, count, n):
+        """positions at element n of an indexed array after its count, reading only its own offset from the table"""
+        self.offset += 4 * (count + 1) + UINT32.unpack_from(self.__data, self.offset + 4 * n)[0]
+
+    def align(self, size):
+        """skips padding ahead of records of aligned arrays up to a multiple of size from document start"""
+        self.offset += -(self.offset - self.__origin) % size
+
+    def read_bytes(self, size):
+        v = bytes(self.__data[self.offset:self.offset + size])
+        self.offset += size
+        return v
+
+    def read_prefixed_string(self, previous):
+        """front-coded key of sorted dicts sharing prefix with previous key, previous is None at start of each block"""
+        shared = 0 if previous is None else self.read_uint16()
+        suffix = self.read_bytes(self.read_uint16())
+        return previous[:shared] + suffix if shared else suffix
+
+    def find_block(self, count, key, read_key=None):
+        """
+        binary searches blocks of a sorted dict positioned after its count, leaves offset at the block that may
+        hold key and returns its number of entries, read_key is None for string keys
+        """
+        if read_key is None:
+            read_key = lambda: self.read_prefixed_string(None)
+            if isinstance(key, str): key = key.encode('utf-8')
+        blocks = (count + 15) // 16
+        table = self.offset
+        base = table + 4 * (blocks + 1)
+        lo, hi = 0, blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            self.offset = base + UINT32.unpack_from(self.__data, table + 4 * mid)[0]
+            if key < read_key():
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo == 0: return 0
+        self.offset = base + UINT32.unpack_from(self.__data, table + 4 * (lo - 1))[0]
+        return min(16, count - (lo - 1) * 16)
+
+    def read_bool(self):
+        v, = INT8.unpack_from(self.__data, self.offset)
+        self.offset += 1
+        return v != 0
+
+    def read_int8(self):
+        v, = INT8.unpack_from(self.__data, self.offset)
+        self.offset += 1
+        return v
+
+    def read_uint8(self):
+        v = self.__data[self.offset]
+        self.offset += 1
+        return v
+
+    def read_int16(self):
+        v, = INT16.unpack_from(self.__data, self.offset)
+        self.offset += 2
+        return v
+
+    def read_uint16(self):
+        v, = UINT16.unpack_from(self.__data, self.offset)
+        self.offset += 2
+        return v
+
+    def read_int32(self):
+        v, = INT32.unpack_from(self.__data, self.offset)
+        self.offset += 4
+        return v
+
+    def read_uint32(self):
+        v, = UINT32.unpack_from(self.__data, self.offset)
+        self.offset += 4
+        return v
+
+    def read_int64(self):
+        v, = INT64.unpack_from(self.__data, self.offset)
+        self.offset += 8
+        return v
+
+    def read_uint64(self):
+        v, = UINT64.unpack_from(self.__data, self.offset)
+        self.offset += 8
+        return v
+
+    def read_float(self):
+        v, = FLOAT.unpack_from(self.__data, self.offset)
+        self.offset += 4
+        return v
+
+    def read_double(self):
+        v, = DOUBLE.unpack_from(self.__data, self.offset)
+        self.offset += 8
+        return v
+
+    def read_varint(self):
+        """LEB128 unsigned integer, 7 bits per byte from lowest with high bit set on all but the last byte"""
+        data, offset = self.__data, self.offset
+        v, shift = 0, 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            v |= (byte & 0x7F) << shift
+            if byte < 0x80: break
+            shift += 7
+        self.offset = offset
+        return v
+
+    def read_zigzag(self):
+        v = self.read_varint()
+        return (v >> 1) ^ -(v & 1)
+
+    def read_varint_count(self):
+        """count of arrays and dicts with varint encoding, written as count + 1 with 0 for null"""
+        v = self.read_varint()
+        return v - 1 if v else 0xFFFFFFFF
+
+    def read_pool(self):
+        """loads string pool at start of a pooled document, strings are read as offsets into the pool since"""
+        size = self.read_uint32()
+        end = self.offset + size
+        self.__pool = {}
+        position = 4
+        while self.offset < end:
+            length = self.read_uint16()
+            self.__pool[position] = self.read_bytes(length) if length else ''
+            position += 2 + length
+
+    def read_string(self):
+        if self.__pool is not None:
+            offset = self.read_uint32()
+            return None if offset == 0xFFFFFFFF else self.__pool[offset]
+        offset = self.offset + 2
+        size, = UINT16.unpack_from(self.__data, self.offset)
+        if size == 0xFFFF or size == 0:
+            self.offset = offset
+            return None if size else ''
+        self.offset = offset + size
+        return bytes(self.__data[offset:offset + size])
+
+    def write(self, v):
+        end = self.offset + len(v)
+        self.__data[self.offset:end] = v
+        self.offset = end
+
+    def pack(self, s, *values):
+        self.write(s.pack(*values))
+
+    def write_columns(self, spec, *columns):
+        """columns of a columnar array as read by read_columns()"""
+        for code, values in zip(spec[1:], columns): self.write(pack_column(code, values))
+
+    def write_array(self, code, values):
+        self.write(struct.pack('<{}{}'.format(len(values), code), *values))
+
+    def write_bool(self, v):
+        self.write(BOOL.pack(bool(v)))
+
+    def write_int8(self, v):
+        self.write(INT8.pack(v))
+
+    def write_uint8(self, v):
+        self.write(UINT8.pack(v))
+
+    def write_int16(self, v):
+        self.write(INT16.pack(v))
+
+    def write_uint16(self, v):
+        self.write(UINT16.pack(v))
+
+    def write_int32(self, v):
+        self.write(INT32.pack(v))
+
+    def write_uint32(self, v):
+        self.write(UINT32.pack(v))
+
+    def write_int64(self, v):
+        self.write(INT64.pack(v))
+
+    def write_uint64(self, v):
+        self.write(UINT64.pack(v))
+
+    def write_float(self, v):
+        self.write(FLOAT.pack(v))
+
+    def write_double(self, v):
+        self.write(DOUBLE.pack(v))
+
+    def write_varint(self, v):
+        data = bytearray()
+        while v >= 0x80:
+            data.append(v & 0x7F | 0x80)
+            v >>= 7
+        data.append(v)
+        self.write(data)
+
+    def write_zigzag(self, v):
+        self.write_varint((v << 1) ^ (v >> 63))
+
+    def write_offsets(self, offsets):
+        self.write(struct.pack('<{}I'.format(len(offsets)), *offsets))
+
+    def write_align(self, size):
+        """zero padding ahead of records of aligned arrays up to a multiple of size from document start"""
+        self.write(bytes(-(self.offset - self.__origin) % size))
+
+    def write_prefixed_string(self, v, previous):
+        """returns utf-8 bytes of v to be passed as previous of next key, previous is None at start of each block"""
+        if isinstance(v, str): v = v.encode('utf-8')
+        shared = 0
+        if previous is not None:
+            limit = min(len(v), len(previous), 0xFFFF)
+            while shared < limit and v[shared] == previous[shared]: shared += 1
+            self.write_uint16(shared)
+        self.write_uint16(len(v) - shared)
+        self.write(v[shared:])
+        return v
+
+    def begin_pool(self):
+        """strings are pooled until end_pool(), which writes the pool ahead of everything written since"""
+        self.__pool, self.__entries = {}, bytearray()
+        self.__target = self.__data, self.offset
+        self.__data, self.offset = bytearray(), 0
+
+    def end_pool(self):
+        body, entries = self.__data, self.__entries
+        self.__data, self.offset = self.__target
+        self.__pool = self.__entries = self.__target = None
+        self.write_uint32(len(entries))
+        self.write(entries)
+        self.write(body)
+
+    def write_string(self, v):
+        if self.__pool is not None:
+            if v is None:
+                self.write_uint32(0xFFFFFFFF)
+                return
+            if isinstance(v, str): v = v.encode('utf-8')
+            offset = self.__pool.get(v)
+            if offset is None:
+                offset = self.__pool[v] = 4 + len(self.__entries)
+                self.__entries += UINT16.pack(len(v))
+                self.__entries += v
+            self.write_uint32(offset)
+            return
+        if v is None:
+            self.write_int16(-1)
+            return
+        if isinstance(v, str): v = v.encode('utf-8')
+        size = min(len(v), 0xFFFF - 1)
+        self.write_uint16(size)
+        self.write(v[:size])
+
+
 class IJsonbuf(object):
+    __slots__ = ()
+
     def deserialize(self, decoder): # type: (JsonbufStream)->None
         pass
 
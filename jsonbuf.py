@@ -1,11 +1,25 @@
 #!/usr/bin/env python
 # encoding: utf-8
 from __future__ import print_function
-import lxml.etree as etree
 import os.path as p
-import json, io, struct, os, re
+import json, io, struct, os, re, operator, mmap, array, sys, collections, collections.abc, tempfile, shutil, importlib
+import hashlib, pickle, glob, time, concurrent.futures, contextlib, threading
 from typing import *
 
+etree = None # lxml.etree, imported by _etree() on first use, schemas and bridges loaded from cache never need it
+
+def _etree():
+    global etree
+    if etree is None:
+        import lxml.etree
+        etree = lxml.etree
+    return etree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 JSONTYPE_double = 'double'
 JSONTYPE_float = 'float'
 JSONTYPE_ushort = 'ushort'
@@ -33,6 +47,163 @@ UINT16_MAX = (1 << 16) - 1
 UINT32_MAX = (1 << 32) - 1
 UINT64_MAX = (1 << 64) - 1
 
+SORTED_BLOCK_SIZE = 16 # entries per front-coded block of sorted dicts
+
+# layout="aligned" arrays of fixed-width classes are written as naturally aligned, zero padded records
+LAYOUT_ALIGNED = 'aligned'
+# layout="columnar" arrays of classes are written field by field, each field of all elements as one column
+LAYOUT_COLUMNAR = 'columnar'
+ARRAY_LAYOUTS = ('', LAYOUT_ALIGNED, LAYOUT_COLUMNAR)
+
+SCHEMA_CACHE_VERSION = 2 # bumped when pickled descriptors change shape
+# decoded schemas and bridges are pickled here, empty JSONBUF_CACHE_DIR disables caching
+SCHEMA_CACHE_DIR = os.environ.get('JSONBUF_CACHE_DIR', p.join(os.environ.get('XDG_CACHE_HOME') or p.expanduser('~/.cache'), 'jsonbuf'))
+
+FRAME_MAGIC = b'JBFR'
+FRAME_CODECS = ['zlib', 'lzma', 'bz2'] # stdlib modules with compress/decompress, stored by index in frame header
+FRAME_HEADER = struct.Struct('<4sBI') # magic, codec, block size
+FRAME_TRAILER = struct.Struct('<QI4s') # payload size, block count, magic
+FRAME_BLOCK_SIZE = 1 << 16
+FRAME_CACHE_SIZE = 8 # decompressed blocks kept by readers
+
+STRUCT_FORMATS = {
+    JSONTYPE_bool: 'b',
+    JSONTYPE_int8: 'b',
+    JSONTYPE_uint8: 'B', JSONTYPE_byte: 'B',
+    JSONTYPE_int16: 'h', JSONTYPE_short: 'h',
+    JSONTYPE_uint16: 'H', JSONTYPE_ushort: 'H',
+    JSONTYPE_int32: 'i', JSONTYPE_int: 'i',
+    JSONTYPE_uint32: 'I', JSONTYPE_uint: 'I',
+    JSONTYPE_int64: 'q', JSONTYPE_long: 'q',
+    JSONTYPE_uint64: 'Q', JSONTYPE_ulong: 'Q',
+    JSONTYPE_float32: 'f', JSONTYPE_float: 'f',
+    JSONTYPE_float64: 'd', JSONTYPE_double: 'd',
+} # type: Dict[str, str]
+
+def _array_typecodes(): # type: ()->Dict[str, str]
+    typecodes = {}
+    for format, candidates in (('b', 'b'), ('B', 'B'), ('h', 'h'), ('H', 'H'), ('i', 'il'), ('I', 'IL'),
+                               ('q', 'lq'), ('Q', 'LQ'), ('f', 'f'), ('d', 'd')):
+        for code in candidates:
+            if array.array(code).itemsize == struct.calcsize('<' + format):
+                typecodes[format] = code
+                break
+    return typecodes
+
+ARRAY_TYPECODES = _array_typecodes() # type: Dict[str, str]
+
+# integers wider than a byte are written as LEB128 varints under encoding="varint", zigzag mapped when signed
+VARINT_RANGES = {
+    JSONTYPE_int16: (-0x8000, 0x7FFF), JSONTYPE_short: (-0x8000, 0x7FFF),
+    JSONTYPE_uint16: (0, UINT16_MAX), JSONTYPE_ushort: (0, UINT16_MAX),
+    JSONTYPE_int32: (-0x80000000, 0x7FFFFFFF), JSONTYPE_int: (-0x80000000, 0x7FFFFFFF),
+    JSONTYPE_uint32: (0, UINT32_MAX), JSONTYPE_uint: (0, UINT32_MAX),
+    JSONTYPE_int64: (-(1 << 63), (1 << 63) - 1), JSONTYPE_long: (-(1 << 63), (1 << 63) - 1),
+    JSONTYPE_uint64: (0, UINT64_MAX), JSONTYPE_ulong: (0, UINT64_MAX),
+} # type: Dict[str, Tuple[int, int]]
+
+VARINT_PREFIX = 'varint:' # scalar type key of varint coded integers, e.g. 'varint:int32'
+
+def _scalar_type(type, varint): # type: (str, bool)->str
+    return VARINT_PREFIX + type if varint and type in VARINT_RANGES else type
+
+def aligned_layout(schema): # type: (ClassDescriptor)->Tuple[List[int], int, int]
+    """
+    field offsets, size and alignment of records of layout="aligned" arrays, fields are placed in schema order
+    at multiples of their own size as C compilers do and size is rounded up to the widest field
+    """
+    offsets, size, align = [], 0, 1
+    for field in schema.fields:
+        width = struct.calcsize('<' + STRUCT_FORMATS[field.type])
+        size += -size % width
+        offsets.append(size)
+        size += width
+        align = max(align, width)
+    return offsets, size + -size % align, align
+
+def _has_aligned(descriptor, visited=None): # type: (Descriptor, Optional[set])->bool
+    """whether a layout="aligned" array is reachable from descriptor"""
+    if descriptor is None: return False
+    if visited is None: visited = set()
+    if id(descriptor) in visited: return False
+    visited.add(id(descriptor))
+    if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_ALIGNED: return True
+    if isinstance(descriptor, ClassDescriptor): return any(_has_aligned(f, visited) for f in descriptor.fields)
+    return _has_aligned(descriptor.descriptor, visited)
+
+def _pack_column(type, values, endian='<'): # type: (str, Sequence, str)->bytes
+    """
+    one column of a layout="columnar" array: bools as bitmap with element n at bit n % 8 of byte n // 8, strings
+    as block of uint16 sizes, 0xFFFF for null, followed by their utf-8 bytes, numbers as one block
+    """
+    ndarray = numpy is not None and isinstance(values, numpy.ndarray)
+    if type == JSONTYPE_bool:
+        if ndarray: return numpy.packbits(values.astype(bool), bitorder='little').tobytes()
+        bits = bytearray((len(values) + 7) >> 3)
+        for n, v in enumerate(values):
+            if v: bits[n >> 3] |= 1 << (n & 7)
+        return bytes(bits)
+    if type == JSONTYPE_string:
+        data = [None if v is None else str(v).encode('utf-8') for v in values]
+        sizes = [UINT16_MAX if v is None else len(v) for v in data]
+        return struct.pack('{}{}H'.format(endian, len(sizes)), *sizes) + b''.join(v for v in data if v)
+    format = STRUCT_FORMATS[type]
+    if ndarray: return values.astype(endian + format).tobytes()
+    return struct.pack('{}{}{}'.format(endian, len(values), format), *values)
+
+def _unpack_column(type, size, data, offset, endian='<', ndarray=False): # type: (str, int, bytes, int, str, bool)->Tuple[Sequence, int]
+    """(values, offset) of a column of size elements at offset, with ndarray numbers and bools as numpy arrays"""
+    if type == JSONTYPE_bool:
+        end = offset + ((size + 7) >> 3)
+        bits = data[offset:end]
+        if ndarray: return numpy.unpackbits(numpy.frombuffer(bits, dtype=numpy.uint8), count=size, bitorder='little').astype(bool), end
+        return [bits[n >> 3] >> (n & 7) & 1 == 1 for n in range(size)], end
+    if type == JSONTYPE_string:
+        sizes = struct.unpack('{}{}H'.format(endian, size), data[offset:offset + 2 * size])
+        offset += 2 * size
+        values = []
+        for n in sizes:
+            if n == UINT16_MAX:
+                values.append(None)
+            else:
+                values.append(str(data[offset:offset + n], 'utf-8'))
+                offset += n
+        return values, offset
+    format = STRUCT_FORMATS[type]
+    end = offset + size * struct.calcsize(format)
+    if ndarray:
+        # astype copies into native byte order, leaving no export on the source buffer
+        dtype = numpy.dtype(endian + format)
+        return numpy.frombuffer(data[offset:end], dtype=dtype).astype(dtype.newbyteorder('=')), end
+    return list(struct.unpack('{}{}{}'.format(endian, size, format), data[offset:end])), end
+
+def _skip_column(type, size, data, offset, endian='<'): # type: (str, int, bytes, int, str)->int
+    if type == JSONTYPE_bool: return offset + ((size + 7) >> 3)
+    if type == JSONTYPE_string:
+        sizes = struct.unpack('{}{}H'.format(endian, size), data[offset:offset + 2 * size])
+        return offset + 2 * size + sum(n for n in sizes if n != UINT16_MAX)
+    return offset + size * struct.calcsize(STRUCT_FORMATS[type])
+
+def _pack_varint(value): # type: (int)->bytes
+    if value < 0x80: return bytes((value,))
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+def _unpack_varint(data, offset): # type: (bytes, int)->Tuple[int, int]
+    byte = data[offset]
+    if byte < 0x80: return byte, offset + 1
+    value, shift = byte & 0x7F, 7
+    while True:
+        offset += 1
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80: return value, offset + 1
+        shift += 7
+
 class Descriptor(object):
     def __init__(self, tag):
         self.tag = tag
@@ -43,6 +214,7 @@ class FieldDescriptor(Descriptor):
         self.name = ''
         self.type = ''
         self.enum = ''
+        self.varint = False # integer value written as varint
         self.descriptor = None # type: Descriptor
 
 class DictionaryDescriptor(Descriptor):
@@ -50,6 +222,8 @@ class DictionaryDescriptor(Descriptor):
         super(DictionaryDescriptor, self).__init__('dict')
         self.type = ''
         self.key = JSONTYPE_string
+        self.sorted = False # entries in key order behind a block offset table, string keys front-coded
+        self.varint = False # count, integer keys and values written as varints
         self.filters = []  # type: List[FilterDescriptor]
         self.descriptor = None # type: ClassDescriptor
 
@@ -58,6 +232,9 @@ class ArrayDescriptor(Descriptor):
         super(ArrayDescriptor, self).__init__('array')
         self.type = ''
         self.mutable = False
+        self.indexed = False # element offset table after count, for arrays of class/array/dict only
+        self.varint = False # count and integer elements written as varints
+        self.layout = '' # one of ARRAY_LAYOUTS, elements are written one after another by default
         self.filters = [] # type: List[FilterDescriptor]
         self.descriptor = None # type: ClassDescriptor
 
@@ -66,6 +243,7 @@ class ClassDescriptor(Descriptor):
         super(ClassDescriptor, self).__init__('class')
         self.name = ''
         self.namespace = ''
+        self.pool = False # distinct strings written once ahead of root value, referenced by offset
         self.fields = [] # type: List[FieldDescriptor]
 
 class JsonbufClassBridge(object):
@@ -79,16 +257,71 @@ class JsonbufEnumBridge(JsonbufClassBridge):
         self.values = {} # type: Dict[int, str]
         self.cases = {} # type: Dict[str, int]
 
+class JsonbufCache(object):
+    """
+    Pickled result of parsing a source file in SCHEMA_CACHE_DIR, one entry per source path. An entry is valid
+    while the source keeps its mtime and content hash and this module is unchanged, unreadable or stale entries
+    count as misses. Entries only unpickle into descriptor and bridge classes.
+    """
+    class __Unpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            if name in ('FieldDescriptor', 'DictionaryDescriptor', 'ArrayDescriptor', 'ClassDescriptor', 'FilterDescriptor',
+                        'JsonbufClassBridge', 'JsonbufEnumBridge'):
+                return globals()[name]
+            raise pickle.UnpicklingError('{}.{} not allowed in cache'.format(module, name))
+
+    def __init__(self, filename): # type: (str)->None
+        with open(filename, 'rb') as fp: self.content = fp.read()
+        self.key = (SCHEMA_CACHE_VERSION, os.stat(filename).st_mtime_ns, hashlib.sha1(self.content).hexdigest(),
+                    os.stat(__file__).st_mtime_ns)
+        self.path = None # type: Optional[str]
+        if SCHEMA_CACHE_DIR:
+            self.path = p.join(SCHEMA_CACHE_DIR, '{}.pickle'.format(hashlib.sha1(p.realpath(filename).encode('utf-8')).hexdigest()))
+
+    def load(self): # type: ()->any
+        if self.path is None or not p.exists(self.path): return None
+        try:
+            with open(self.path, 'rb') as fp:
+                key, value = self.__Unpickler(fp).load()
+        except Exception:
+            return None
+        return value if key == self.key else None
+
+    def save(self, value): # type: (any)->None
+        if self.path is None: return
+        # written aside and renamed over, so concurrent processes never see a partial entry
+        temp = None
+        try:
+            os.makedirs(SCHEMA_CACHE_DIR, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=SCHEMA_CACHE_DIR)
+            with os.fdopen(fd, 'wb') as fp: pickle.dump((self.key, value), fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self.path)
+        except OSError:
+            if temp is not None and p.exists(temp): os.remove(temp)
+
 class JsonbufBridges(object):
+    __shared = None # type: JsonbufBridges
+
     def __init__(self):
         self.classes = {} # type: Dict[str, JsonbufClassBridge]
         self.enums = {} # type: Dict[str, JsonbufEnumBridge]
         self.__setup()
 
+    @classmethod
+    def shared(cls): # type: ()->JsonbufBridges
+        """instance shared by the whole process, bridges are not modified once set up"""
+        if cls.__shared is None: cls.__shared = cls()
+        return cls.__shared
+
     def __setup(self):
         filename = p.join(p.dirname(p.realpath(p.abspath(__file__))), 'jsonbuf.xml')
         if p.exists(filename):
-            data = etree.parse(filename).getroot()
+            cache = JsonbufCache(filename)
+            cached = cache.load()
+            if cached is not None:
+                self.enums, self.classes = cached
+                return
+            data = _etree().fromstring(cache.content)
             for item in data.xpath('//enums/enum'):
                 enum = JsonbufEnumBridge()
                 enum.namespace = item.get('namespace')
@@ -105,6 +338,7 @@ class JsonbufBridges(object):
                 cls.namespace = item.get('namespace')
                 cls.name = item.get('name')
                 self.classes[cls.name] = cls
+            cache.save((self.enums, self.classes))
 
 class FilterDescriptor(Descriptor):
     def __init__(self):
@@ -124,45 +358,88 @@ class JsonbufSchema(object):
         assert 'JSONTYPE_{}'.format(type) in globals(), 'JSONTYPE_{}'.format(type)
 
     def load(self, filename):
-        self.classes = {}
-        schema = etree.parse(filename).getroot()
-        self.descriptor = self.decode(schema, attr=self.classes)
+        cache = JsonbufCache(filename)
+        cached = cache.load()
+        if cached is not None:
+            self.descriptor, self.classes = cached
+        else:
+            self.classes = {}
+            self.descriptor = self.decode(_etree().fromstring(cache.content), attr=self.classes)
+            self.__check_layout(self.descriptor, pool=False, nested=False, visited=set())
+            cache.save((self.descriptor, self.classes))
         self.name = re.sub(r'\.[^.]+$', '', p.basename(filename))
         return self.descriptor
 
+    def __check_layout(self, descriptor, pool, nested, visited): # type: (Descriptor, bool, bool, set)->None
+        # aligned records are padded by output position, which is unknown inside offset tables and sorted dicts
+        # staged in scratch buffers and in bodies of pooled documents written ahead of their pool, columns of
+        # strings hold their bytes, which pooled documents keep in the pool
+        if descriptor is None or (id(descriptor), nested) in visited: return
+        visited.add((id(descriptor), nested))
+        if isinstance(descriptor, ClassDescriptor):
+            pool = pool or descriptor.pool
+            for field in descriptor.fields: self.__check_layout(field, pool, nested, visited)
+        elif isinstance(descriptor, FieldDescriptor):
+            self.__check_layout(descriptor.descriptor, pool, nested, visited)
+        else:
+            if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_ALIGNED:
+                assert not pool and not nested and not descriptor.indexed, \
+                    'aligned array can not be indexed, pooled or inside an array/dict'
+                cls = descriptor.descriptor
+                assert isinstance(cls, ClassDescriptor) and cls.fields and \
+                       all(not f.descriptor and _scalar_type(f.type, f.varint) in STRUCT_FORMATS for f in cls.fields), \
+                    'aligned array requires class elements of fixed-width scalar fields'
+            if isinstance(descriptor, ArrayDescriptor) and descriptor.layout == LAYOUT_COLUMNAR:
+                assert not pool and not descriptor.indexed, 'columnar array can not be indexed or pooled'
+                cls = descriptor.descriptor
+                assert isinstance(cls, ClassDescriptor) and cls.fields and \
+                       all(not f.descriptor and (f.type == JSONTYPE_string or _scalar_type(f.type, f.varint) in STRUCT_FORMATS)
+                           for f in cls.fields), \
+                    'columnar array requires class elements of fixed-width scalar or string fields'
+            self.__check_layout(descriptor.descriptor, pool, True, visited)
+
     def dumps(self):
         schema = self.encode(descriptor=self.descriptor, attr={})
-        return etree.tostring(schema, pretty_print=True, encoding='utf-8').decode('utf-8')
+        return _etree().tostring(schema, pretty_print=True, encoding='utf-8').decode('utf-8')
 
     def dump(self, filename):
         schema = self.encode(descriptor=self.descriptor, attr={})
         with open(filename, 'w') as fp:
-            content = etree.tostring(schema, pretty_print=True, encoding='utf-8').decode('utf-8')
+            content = _etree().tostring(schema, pretty_print=True, encoding='utf-8').decode('utf-8')
             fp.write(content)
             print('>>> {}'.format(p.abspath(fp.name)))
             print(content)
 
-    def encode(self, descriptor, attr): # type: (Descriptor, dict)->etree.Element
-        schema = etree.Element(descriptor.tag)
+    def encode(self, descriptor, attr, varint=False): # type: (Descriptor, dict, bool)->etree.Element
+        # encoding is written where it differs from the one inherited, same as decode resolves it
+        schema = _etree().Element(descriptor.tag)
+        encoding = None
+        if getattr(descriptor, 'varint', varint) != varint:
+            varint = descriptor.varint
+            encoding = 'varint' if varint else 'fixed'
         if isinstance(descriptor, ArrayDescriptor) or isinstance(descriptor, DictionaryDescriptor):
             schema.set('type', descriptor.type)
             if isinstance(descriptor, ArrayDescriptor):
                 if descriptor.mutable: schema.set('mutable', descriptor.mutable)
+                if descriptor.indexed: schema.set('indexed', 'true')
+                if descriptor.layout: schema.set('layout', descriptor.layout)
+            elif descriptor.sorted:
+                schema.set('sorted', 'true')
             if descriptor.type == 'class':
                 assert isinstance(descriptor.descriptor, ClassDescriptor)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
             elif descriptor.type == 'array':
                 assert isinstance(descriptor.descriptor, ArrayDescriptor)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
             elif descriptor.type == 'dict':
                 assert isinstance(descriptor.descriptor, DictionaryDescriptor)
                 if descriptor.key != JSONTYPE_string: schema.set('key', descriptor.key)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
             else:
                 self.__check_type(descriptor.type)
             if descriptor.filters:
                 for f in descriptor.filters:
-                    item = etree.Element(f.tag)
+                    item = _etree().Element(f.tag)
                     item.set('name', f.name)
                     item.set('type', f.type)
                     item.text = str(f.value)
@@ -170,29 +447,31 @@ class JsonbufSchema(object):
         elif isinstance(descriptor, ClassDescriptor):
             schema.set('name', descriptor.name)
             if descriptor.namespace: schema.set('namespace', descriptor.namespace)
+            if descriptor.pool: schema.set('pool', 'true')
             if descriptor.name not in attr:
                 attr[descriptor.name] = schema
                 assert descriptor.fields
                 for field in descriptor.fields:
-                    schema.append(self.encode(descriptor=field, attr=attr))
+                    schema.append(self.encode(descriptor=field, attr=attr, varint=varint))
         elif isinstance(descriptor, FieldDescriptor):
             schema.set('type', descriptor.type)
             schema.set('name', descriptor.name or '')
             if descriptor.enum: schema.set('enum', descriptor.enum)
             if descriptor.type == 'class':
                 assert isinstance(descriptor.descriptor, ClassDescriptor)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
             elif descriptor.type == 'array':
                 assert isinstance(descriptor.descriptor, ArrayDescriptor)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
             elif descriptor.type == 'dict':
                 assert isinstance(descriptor.descriptor, DictionaryDescriptor)
-                schema.append(self.encode(descriptor.descriptor, attr=attr))
+                schema.append(self.encode(descriptor.descriptor, attr=attr, varint=varint))
 
             else:
                 self.__check_type(descriptor.type)
         else:
             raise NotImplementedError('<{}/>'.format(descriptor.tag))
+        if encoding: schema.set('encoding', encoding)
         return schema
 
     @staticmethod
@@ -204,7 +483,11 @@ class JsonbufSchema(object):
         assert type == JSONTYPE_string
         return v
 
-    def decode(self, schema, attr): # type: (etree.Element, dict)->Descriptor
+    def decode(self, schema, attr, varint=False): # type: (etree.Element, dict, bool)->Descriptor
+        # encoding="varint|fixed" on any element applies to everything below it, root class sets it for the schema
+        encoding = schema.get('encoding')
+        assert encoding in (None, 'varint', 'fixed'), 'encoding[={!r}] not supported'.format(encoding)
+        if encoding is not None: varint = encoding == 'varint'
         tag = schema.tag
         if tag in ('array', 'dict'):
             type = schema.get('type')
@@ -212,7 +495,7 @@ class JsonbufSchema(object):
             if type in ('class', 'array', 'dict'):
                 nest_schema = schema[0]
                 assert nest_schema.tag == type
-                descriptor = self.decode(schema=nest_schema, attr=attr)
+                descriptor = self.decode(schema=nest_schema, attr=attr, varint=varint)
             else:
                 self.__check_type(type)
             filters = []
@@ -227,6 +510,11 @@ class JsonbufSchema(object):
                 array.descriptor = descriptor
                 array.type = type
                 array.mutable = schema.get('mutable', False)
+                array.indexed = schema.get('indexed', 'false').lower() == 'true'
+                array.layout = schema.get('layout', '')
+                assert array.layout in ARRAY_LAYOUTS, 'layout[={!r}] not supported'.format(array.layout)
+                array.varint = varint
+                assert not array.indexed or descriptor, 'indexed array requires class/array/dict elements'
                 array.filters = filters
                 return array
             else:
@@ -234,6 +522,8 @@ class JsonbufSchema(object):
                 dictionary.descriptor = descriptor
                 dictionary.type = type
                 dictionary.key = schema.get('key', JSONTYPE_string)
+                dictionary.sorted = schema.get('sorted', 'false').lower() == 'true'
+                dictionary.varint = varint
                 dictionary.filters = filters
                 return dictionary
         elif tag == 'class':
@@ -244,9 +534,18 @@ class JsonbufSchema(object):
                 cls = ClassDescriptor()
                 cls.name = schema.get('name')
                 cls.namespace = schema.get('namespace', '')
+                cls.pool = schema.get('pool', 'false').lower() == 'true'
                 for item in schema.xpath('./*'):
-                    assert item.tag == 'field'
-                    field = self.decode(schema=item, attr=attr)
+                    if item.tag in ('array', 'dict'):
+                        # bare container as in schemas/excel tables, loaded as an anonymous field
+                        field = FieldDescriptor()
+                        field.name = item.get('name', '')
+                        field.type = item.tag
+                        field.descriptor = self.decode(schema=item, attr=attr, varint=varint)
+                        field.varint = field.descriptor.varint
+                    else:
+                        assert item.tag == 'field'
+                        field = self.decode(schema=item, attr=attr, varint=varint)
                     cls.fields.append(field)
                 attr[cls.name] = cls
                 index = 'count'
@@ -259,34 +558,1584 @@ class JsonbufSchema(object):
             field.name = schema.get('name')
             field.type = schema.get('type')
             field.enum = schema.get('enum')
+            field.varint = varint
             if field.type in ('class', 'array', 'dict'):
                 nest_schema = schema[0]
                 assert nest_schema.tag == field.type
-                field.descriptor = self.decode(schema=nest_schema, attr=attr)
+                field.descriptor = self.decode(schema=nest_schema, attr=attr, varint=varint)
             else:
                 self.__check_type(field.type)
             return field
         else:
             raise NotImplementedError('<{}/> not supported'.format(tag))
 
+class JsonbufStringPool(object):
+    """
+    Distinct strings of a pooled document, which starts with uint32 byte size of the pool followed by uint16
+    length prefixed utf-8 entries. Strings in the root value are uint32 offsets of their entries from document
+    start, UINT32_MAX for null, so pooled documents are always decoded from start of buffer.
+    """
+    def __init__(self, endian='<'):
+        self.__pack_size = struct.Struct(endian + 'H').pack
+        self.__pack_count = struct.Struct(endian + 'I').pack
+        self.offsets = {} # type: Dict[str, int]
+        self.__entries = io.BytesIO()
+
+    def reset(self):
+        self.offsets = {}
+        self.__entries = io.BytesIO()
+
+    def add(self, value): # type: (str)->int
+        offset = self.offsets.get(value)
+        if offset is None:
+            bin = value.encode('utf-8')
+            offset = self.offsets[value] = 4 + self.__entries.tell()
+            self.__entries.write(self.__pack_size(len(bin)))
+            self.__entries.write(bin)
+        return offset
+
+    def mark(self): # type: ()->Tuple[int, int]
+        return len(self.offsets), self.__entries.tell()
+
+    def rollback(self, mark): # type: (Tuple[int, int])->None
+        """drops strings added since mark, which must not be referenced by anything written"""
+        count, size = mark
+        while len(self.offsets) > count: self.offsets.popitem()
+        self.__entries.seek(size)
+        self.__entries.truncate()
+
+    def write(self, buffer): # type: (io.BytesIO)->None
+        entries = self.__entries.getvalue()
+        buffer.write(self.__pack_count(len(entries)))
+        buffer.write(entries)
+
+class JsonbufFrameWriter(object):
+    """
+    Block-compressed output, payload written through it is cut into blocks of block_size bytes and each one
+    is compressed on its own. close() appends the block index, uint64 offsets of every block and the end of
+    the last one from frame start, and a trailer, so readers can seek to any payload byte and decompress
+    only the block holding it. The wrapped stream is left open and is never seeked.
+    """
+    def __init__(self, fp, codec='zlib', block_size=FRAME_BLOCK_SIZE): # type: (BinaryIO, str, int)->None
+        assert codec in FRAME_CODECS, 'codec[={}] not in {}'.format(codec, FRAME_CODECS)
+        assert block_size > 0
+        self.codec = codec
+        self.block_size = block_size
+        self.__fp = fp
+        self.__compress = importlib.import_module(codec).compress
+        self.__pending = bytearray()
+        self.__index = [FRAME_HEADER.size] # type: List[int]
+        self.__size = 0
+        fp.write(FRAME_HEADER.pack(FRAME_MAGIC, FRAME_CODECS.index(codec), block_size))
+
+    def __enter__(self): return self
+
+    def __exit__(self, *args): self.close()
+
+    def write(self, data): # type: (bytes)->int
+        self.__pending += data
+        self.__size += len(data)
+        while len(self.__pending) >= self.block_size:
+            self.__write_block(self.block_size)
+        return len(data)
+
+    def __write_block(self, size): # type: (int)->None
+        block = self.__compress(bytes(self.__pending[:size]))
+        del self.__pending[:size]
+        self.__fp.write(block)
+        self.__index.append(self.__index[-1] + len(block))
+
+    def tell(self): return self.__size
+
+    def seekable(self): return False
+
+    def flush(self): self.__fp.flush()
+
+    def close(self):
+        if self.__fp is None: return
+        if self.__pending: self.__write_block(len(self.__pending))
+        count = len(self.__index) - 1
+        self.__fp.write(struct.pack('<{}Q'.format(count + 1), *self.__index))
+        self.__fp.write(FRAME_TRAILER.pack(self.__size, count, FRAME_MAGIC))
+        self.__fp = None
+
+class JsonbufFrameReader(object):
+    """
+    Seekable read-only view of the payload of a block-compressed document, written by JsonbufFrameWriter.
+    Blocks are decompressed when a read first touches them and the most recently used cache_size blocks
+    are kept, so seeking around a sorted dict or an indexed array decompresses only the blocks it lands on.
+    """
+    def __init__(self, fp, cache_size=FRAME_CACHE_SIZE): # type: (BinaryIO, int)->None
+        self.__fp = fp
+        self.__start = fp.tell()
+        magic, codec, self.block_size = FRAME_HEADER.unpack(fp.read(FRAME_HEADER.size))
+        assert magic == FRAME_MAGIC, 'not a framed document'
+        self.codec = FRAME_CODECS[codec]
+        self.__decompress = importlib.import_module(self.codec).decompress
+        fp.seek(-FRAME_TRAILER.size, os.SEEK_END)
+        self.size, count, magic = FRAME_TRAILER.unpack(fp.read(FRAME_TRAILER.size))
+        assert magic == FRAME_MAGIC, 'framed document is truncated'
+        fp.seek(-FRAME_TRAILER.size - 8 * (count + 1), os.SEEK_END)
+        self.__index = struct.unpack('<{}Q'.format(count + 1), fp.read(8 * (count + 1)))
+        self.__cache = collections.OrderedDict() # type: Dict[int, bytes]
+        self.__cache_size = max(1, cache_size)
+        self.__position = 0
+
+    @classmethod
+    def unframe(cls, data): # type: (Union[bytes, bytearray, memoryview, mmap.mmap])->Union[bytes, bytearray, memoryview, mmap.mmap]
+        """whole payload of framed data"""
+        return cls(data if isinstance(data, mmap.mmap) else io.BytesIO(data), cache_size=1).read()
+
+    def block(self, index): # type: (int)->bytes
+        """decompressed block at index, from the cache when recently used"""
+        block = self.__cache.get(index)
+        if block is not None:
+            self.__cache.move_to_end(index)
+            return block
+        self.__fp.seek(self.__start + self.__index[index])
+        block = self.__decompress(self.__fp.read(self.__index[index + 1] - self.__index[index]))
+        self.__cache[index] = block
+        if len(self.__cache) > self.__cache_size: self.__cache.popitem(last=False)
+        return block
+
+    def read(self, size=-1): # type: (int)->bytes
+        end = self.size if size is None or size < 0 else min(self.size, self.__position + size)
+        chunks = []
+        while self.__position < end:
+            index, offset = divmod(self.__position, self.block_size)
+            chunk = self.block(index)[offset:offset + end - self.__position]
+            chunks.append(chunk)
+            self.__position += len(chunk)
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def seek(self, offset, whence=os.SEEK_SET): # type: (int, int)->int
+        if whence == os.SEEK_CUR: offset += self.__position
+        elif whence == os.SEEK_END: offset += self.size
+        assert offset >= 0, 'negative seek position {}'.format(offset)
+        self.__position = offset
+        return offset
+
+    def tell(self): return self.__position
+
+    def seekable(self): return True
+
+    def readable(self): return True
+
+    def close(self): self.__cache.clear()
+
+class JsonbufFrameView(object):
+    """
+    Bytes-like view of the payload of framed data for codecs compiled framed, indexing and slicing decompress
+    only the blocks they touch through a JsonbufFrameReader, so lazy lookups leave the other blocks compressed.
+    Slices come back as bytes, the block last read is kept aside so runs of small reads skip the cache.
+    """
+    def __init__(self, data, cache_size=FRAME_CACHE_SIZE): # type: (Union[bytes, bytearray, memoryview, mmap.mmap], int)->None
+        self.reader = JsonbufFrameReader(data if isinstance(data, mmap.mmap) else io.BytesIO(data), cache_size=cache_size)
+        self.__size, self.__block_size = self.reader.size, self.reader.block_size
+        self.__index, self.__block = -1, b''
+
+    def __len__(self): return self.__size
+
+    def __getitem__(self, key): # type: (Union[int, slice])->Union[int, bytes]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.__size)
+            assert step == 1, 'frame view slices must be contiguous'
+            if start >= stop: return b''
+        else:
+            start = key + self.__size if key < 0 else key
+            if not 0 <= start < self.__size: raise IndexError('frame view index out of range')
+            stop = None
+        index, offset = divmod(start, self.__block_size)
+        if index != self.__index: self.__index, self.__block = index, self.reader.block(index)
+        if stop is None: return self.__block[offset]
+        if offset + stop - start <= len(self.__block): return self.__block[offset:offset + stop - start]
+        self.reader.seek(start)
+        return self.reader.read(stop - start)
+
+    def release(self):
+        self.__index, self.__block = -1, b''
+        self.reader.close()
+
+class JsonbufLazyClass(collections.abc.Mapping):
+    """Read-only view of an encoded class object, fields are located and decoded on first access"""
+    def __init__(self, codec, schema, data, offset):
+        self.__codec = codec # type: JsonbufCodec
+        self.__schema = schema # type: ClassDescriptor
+        self.__data = data
+        self.__origin = offset
+        self.__index, self.__openers, self.__skippers = codec.layout(schema)
+        self.__offsets = [offset + 1 if codec.class_nullable else offset]
+        self.__values = {}
+
+    def __getitem__(self, name):
+        values = self.__values
+        if name in values: return values[name]
+        n = self.__index[name]
+        data, offsets, skippers = self.__data, self.__offsets, self.__skippers
+        while len(offsets) <= n:
+            offsets.append(skippers[len(offsets) - 1](data, offsets[-1]))
+        value = values[name] = self.__openers[n](data, offsets[n])
+        return value
+
+    def __iter__(self): return iter(self.__index)
+
+    def __len__(self): return len(self.__index)
+
+    def __repr__(self): return '<{} {}@{}>'.format(self.__class__.__name__, self.__schema.name, self.__origin)
+
+    def decode(self): # type: ()->dict
+        return self.__codec.decoder(self.__schema)(self.__data, self.__origin)[0]
+
+class JsonbufLazyArray(collections.abc.Sequence):
+    """Read-only view of an encoded array, elements are located on demand"""
+    def __init__(self, codec, schema, data, origin, offset, size):
+        element = schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint)
+        self.__codec = codec # type: JsonbufCodec
+        self.__schema = schema # type: ArrayDescriptor
+        self.__data = data
+        self.__size = size
+        self.__origin = origin
+        self.__start = offset
+        self.__open = codec.opener(element)
+        self.__skip = codec.skipper(element)
+        self.__stride = codec.fixed_size(element)
+        self.__offsets = [offset]
+        self.__values = {}
+        self.__unpack_offset = None
+        self.__rows = None # type: Optional[list]
+        if schema.layout == LAYOUT_ALIGNED:
+            _, self.__stride, align = aligned_layout(schema.descriptor)
+            self.__start += -offset % align
+            decode = codec.record_decoder(schema.descriptor)
+            self.__open = lambda data, offset: decode(data, offset)[0]
+        if schema.indexed:
+            self.__unpack_offset = codec.unpacker(JSONTYPE_uint32)
+            self.__offsets = [offset + 4 * (size + 1)]
+
+    def __locate(self, index): # type: (int)->int
+        if self.__unpack_offset is not None:
+            # offset table of indexed arrays is relative to the first element
+            shift, = self.__unpack_offset(self.__data, self.__start + 4 * index)
+            return self.__offsets[0] + shift
+        if self.__stride is not None: return self.__start + index * self.__stride
+        data, offsets, skip = self.__data, self.__offsets, self.__skip
+        while len(offsets) <= index:
+            offsets.append(skip(data, offsets[-1]))
+        return offsets[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return [self[n] for n in range(*index.indices(self.__size))]
+        if index < 0: index += self.__size
+        if not 0 <= index < self.__size: raise IndexError('array index out of range')
+        if self.__schema.layout == LAYOUT_COLUMNAR:
+            # fields of an element are spread over all columns, so rows are decoded together on first access
+            if self.__rows is None:
+                decode = self.__codec.column_decoder(self.__schema.descriptor)
+                self.__rows = decode(self.__data, self.__start, self.__size)[0]
+            return self.__rows[index]
+        values = self.__values
+        if index in values: return values[index]
+        value = values[index] = self.__open(self.__data, self.__locate(index))
+        return value
+
+    def __len__(self): return self.__size
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, str): return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self): return '<{} [{}]@{}>'.format(self.__class__.__name__, self.__size, self.__origin)
+
+    def decode(self): # type: ()->list
+        return self.__codec.decoder(self.__schema)(self.__data, self.__origin)[0]
+
+    def columns(self): # type: ()->dict
+        """dict of columns by field name of a layout="columnar" array, see JsonbufCodec.column_decoder()"""
+        assert self.__schema.layout == LAYOUT_COLUMNAR, 'columns of {} array'.format(self.__schema.layout or 'plain')
+        return self.__codec.column_decoder(self.__schema.descriptor, columns=True)(self.__data, self.__start, self.__size)[0]
+
+class JsonbufLazyDict(collections.abc.Mapping):
+    """
+    Read-only view of an encoded dict, keys are scanned on first access and values decoded on demand.
+    Sorted dicts are binary searched over their blocks, so single lookups never scan all keys.
+    """
+    def __init__(self, codec, schema, data, origin, offset, size):
+        element = schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint)
+        self.__codec = codec # type: JsonbufCodec
+        self.__schema = schema # type: DictionaryDescriptor
+        self.__data = data
+        self.__size = size
+        self.__origin = origin
+        self.__start = offset
+        self.__open = codec.opener(element)
+        self.__skip = codec.skipper(element)
+        self.__offsets = None # type: Dict[any, int]
+        self.__values = {}
+        self.__blocks = 0
+        self.__base = offset
+        if schema.sorted:
+            self.__blocks = (size + SORTED_BLOCK_SIZE - 1) // SORTED_BLOCK_SIZE
+            self.__base = offset + 4 * (self.__blocks + 1)
+            self.__unpack_offset = codec.unpacker(JSONTYPE_uint32)
+            self.__decode_key = codec.key_decoder(_scalar_type(schema.key, schema.varint))
+
+    def __scan(self): # type: ()->Dict[any, int]
+        if self.__offsets is None:
+            data, offset, skip = self.__data, self.__base, self.__skip
+            offsets = {}
+            if self.__schema.sorted:
+                decode_key = self.__decode_key
+                raw = None
+                for n in range(self.__size):
+                    key, raw, offset = decode_key(data, offset, raw if n % SORTED_BLOCK_SIZE else None)
+                    offsets[key] = offset
+                    offset = skip(data, offset)
+            else:
+                decode_key = self.__codec.decoder(_scalar_type(self.__schema.key, self.__schema.varint))
+                for _ in range(self.__size):
+                    key, offset = decode_key(data, offset)
+                    offsets[key] = offset
+                    offset = skip(data, offset)
+            self.__offsets = offsets
+        return self.__offsets
+
+    def __find(self, key): # type: (any)->int
+        data, decode_key, unpack_offset = self.__data, self.__decode_key, self.__unpack_offset
+        target = key.encode('utf-8') if isinstance(key, str) else key
+        try:
+            # last block whose first key is not greater than target
+            lo, hi = 0, self.__blocks
+            while lo < hi:
+                mid = (lo + hi) // 2
+                shift, = unpack_offset(data, self.__start + 4 * mid)
+                if target < decode_key(data, self.__base + shift, None)[1]:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            if lo > 0:
+                shift, = unpack_offset(data, self.__start + 4 * (lo - 1))
+                offset, raw = self.__base + shift, None
+                for _ in range(min(SORTED_BLOCK_SIZE, self.__size - (lo - 1) * SORTED_BLOCK_SIZE)):
+                    _, raw, offset = decode_key(data, offset, raw)
+                    if raw == target: return offset
+                    if raw > target: break
+                    offset = self.__skip(data, offset)
+        except TypeError:
+            # keys not comparable with the dict's, like '5' in a dict of int keys, are absent as in a plain dict
+            pass
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        values = self.__values
+        if key in values: return values[key]
+        if self.__offsets is None and self.__schema.sorted:
+            offset = self.__find(key)
+        else:
+            offset = self.__scan()[key]
+        value = values[key] = self.__open(self.__data, offset)
+        return value
+
+    def lookup(self, key): # type: (any)->any
+        """value of key or None if absent"""
+        try:
+            return self[key]
+        except KeyError:
+            return None
+
+    def __iter__(self): return iter(self.__scan())
+
+    def __len__(self): return len(self.__scan())
+
+    def __repr__(self): return '<{} [{}]@{}>'.format(self.__class__.__name__, self.__size, self.__origin)
+
+    def decode(self): # type: ()->dict
+        return self.__codec.decoder(self.__schema)(self.__data, self.__origin)[0]
+
+class JsonbufDefaults(object):
+    """
+    Defaults substituted for missing fields on encode, counted by {class}.{field} path. The first samples
+    parent records of each path are kept as examples, so summary() may be printed once after encoding.
+    """
+    def __init__(self, samples=3, width=240): # type: (int, int)->None
+        self.samples = samples
+        self.width = width
+        self.counts = {} # type: Dict[str, int]
+        self.records = {} # type: Dict[str, list]
+
+    def add(self, path, record=None): # type: (str, Optional[dict])->None
+        count = self.counts.get(path, 0)
+        self.counts[path] = count + 1
+        if count < self.samples and record is not None: self.records.setdefault(path, []).append(record)
+
+    def reset(self):
+        self.counts = {}
+        self.records = {}
+
+    def summary(self): # type: ()->str
+        lines = ['[D] {:,} defaults in {} fields'.format(sum(self.counts.values()), len(self.counts))]
+        for path, count in sorted(self.counts.items(), key=lambda x: (-x[1], x[0])):
+            lines.append('[D] {} {:,}'.format(path, count))
+            for record in self.records.get(path, []):
+                content = json.dumps(record, ensure_ascii=False, default=str)
+                if len(content) > self.width: content = content[:self.width - 3] + '...'
+                lines.append('    {}'.format(content))
+        return '\n'.join(lines)
+
+class _JsonbufSession(threading.local):
+    """state of the encode call running on a thread, compiled codecs are shared so it can not live on them"""
+    defaults = None # type: Optional[JsonbufDefaults]
+    pool = None # type: Optional[JsonbufStringPool]
+
+class JsonbufCodec(object):
+    """
+    Descriptor tree compiled once into pre-bound encode/decode closures, so that no isinstance or
+    type-string dispatching is left at runtime. Output is byte-identical to JsonbufSerializer.
+    encode(value, buffer) writes into a file object, decode(data, offset) reads from a bytes-like
+    object and returns (value, offset), substituted defaults are counted into encode(value, buffer, defaults)
+    when given. Arrays of fixed-width numbers are decoded as list, array.array
+    or numpy.ndarray according to array_type. With array_type numpy or columns and class_nullable off,
+    arrays of classes holding only fixed-width scalars are decoded by one frombuffer into a structured
+    ndarray or a dict of column ndarrays, enum fields stay numbers there. Aligned arrays are decoded so
+    with class_nullable on as well, their records carry no null flag. Columnar arrays are decoded into
+    a dict of columns with array_type numpy or columns whatever their fields, string columns stay lists.
+    Codecs compiled framed decode from a JsonbufFrameView as well, reading every value through a slice.
+    """
+    # most recently compiled codecs, keyed by ids that are checked against the codec as ids are reused
+    __cache = collections.OrderedDict() # type: Dict[tuple, JsonbufCodec]
+    __cache_size = 32
+
+    def __init__(self, schema, class_nullable=True, enable_default=True, verbose=True, endian='<', enums=None, array_type='list',
+                 framed=False):
+        assert array_type in ('list', 'array', 'numpy', 'columns'), array_type
+        if array_type in ('numpy', 'columns') and numpy is None: raise ImportError('numpy is required by array_type={!r}'.format(array_type))
+        self.schema = schema # type: Descriptor
+        self.class_nullable = class_nullable
+        self.enable_default = enable_default
+        self.verbose = verbose
+        self.__session = _JsonbufSession()
+        self.endian = endian
+        self.array_type = array_type
+        self.framed = framed
+        little = endian == '<' or (endian in '=@' and sys.byteorder == 'little')
+        self.byteswap = little != (sys.byteorder == 'little')
+        self.enums = enums if enums is not None else JsonbufBridges.shared().enums # type: Dict[str, JsonbufEnumBridge]
+        self.pooled = isinstance(schema, ClassDescriptor) and schema.pool # type: bool
+        self.__encoders = {} # type: Dict[int, Callable[[any, io.BytesIO], None]]
+        self.__decoders = {} # type: Dict[int, Callable[[bytes, int], Tuple[any, int]]]
+        self.__skippers = {} # type: Dict[Union[Descriptor, str], Callable[[bytes, int], int]]
+        self.__openers = {} # type: Dict[Union[Descriptor, str], Callable[[bytes, int], any]]
+        self.__layouts = {} # type: Dict[ClassDescriptor, tuple]
+        self.__keys = {} # type: Dict[str, tuple]
+        self.__values = {} # type: Dict[str, Callable[[any, io.BytesIO], None]]
+        self.encode = self.__compile_encoder(schema)
+        self.decode = self.__compile_decoder(schema)
+        if self.pooled: self.__compile_pool()
+        self.__compile_session()
+
+    @classmethod
+    def compile(cls, schema, class_nullable=True, enable_default=True, verbose=True, endian='<', enums=None, array_type='list',
+                framed=False):
+        # type: (Descriptor, bool, bool, bool, str, Dict[str, JsonbufEnumBridge], str, bool)->JsonbufCodec
+        if enums is None: enums = JsonbufBridges.shared().enums
+        key = (id(schema), id(enums), class_nullable, enable_default, verbose, endian, array_type, framed)
+        codec = cls.__cache.get(key)
+        if codec is None or codec.schema is not schema or codec.enums is not enums:
+            codec = cls(schema, class_nullable=class_nullable, enable_default=enable_default, verbose=verbose, endian=endian,
+                        enums=enums, array_type=array_type, framed=framed)
+            cls.__cache[key] = codec
+            if len(cls.__cache) > cls.__cache_size: cls.__cache.popitem(last=False)
+        else:
+            cls.__cache.move_to_end(key)
+        return codec
+
+    @contextlib.contextmanager
+    def session(self, defaults=None): # type: (Optional[JsonbufDefaults])->Iterator[Optional[JsonbufStringPool]]
+        """
+        encoders of this codec count substituted defaults into defaults within it on the calling thread, strings of
+        pooled schemas go into the fresh JsonbufStringPool it yields, which is None for other schemas
+        """
+        session = self.__session
+        previous = session.defaults, session.pool
+        session.defaults, session.pool = defaults, JsonbufStringPool(self.endian) if self.pooled else None
+        try:
+            yield session.pool
+        finally:
+            session.defaults, session.pool = previous
+
+    def open(self, data, offset=0): # type: (bytes, int)->any
+        """root value with classes, arrays and dicts as read-only proxies decoded on access"""
+        return self.opener(self.schema)(data, self.root_offset(data, offset))
+
+    def root_offset(self, data, offset=0): # type: (bytes, int)->int
+        """offset of root value in document at offset, which is behind the string pool of pooled documents"""
+        if not self.pooled: return offset
+        assert offset == 0, 'pooled document must start at beginning of buffer'
+        size, = self.unpacker(JSONTYPE_uint32)(data, offset)
+        return offset + 4 + size
+
+    def unpacker(self, type): # type: (str)->Callable[[bytes, int], tuple]
+        """unpack(data, offset)->(value,) for fixed-width scalars of type"""
+        return self.__unpack_from(self.__struct(type))
+
+    def encoder(self, schema): # type: (Union[Descriptor, str])->Callable[[any, io.BytesIO], None]
+        if isinstance(schema, str):
+            if schema not in self.__values: self.__values[schema] = self.__compile_encode_v(schema)
+            return self.__values[schema]
+        return self.__compile_encoder(schema)
+
+    def decoder(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], Tuple[any, int]]
+        if isinstance(schema, str): return self.__compile_decode_v(schema)
+        return self.__compile_decoder(schema)
+
+    def skipper(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], int]
+        return self.__compile_skipper(schema)
+
+    def opener(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], any]
+        return self.__compile_opener(schema)
+
+    def key_encoder(self, type): # type: (str)->Tuple[Callable[[any], any], Callable[[any, any, io.BytesIO], None]]
+        """(to_raw, encode(raw, previous, buffer)) for keys of sorted dicts, previous raw key is None at block start"""
+        return self.__compile_sorted_key(type)[:2]
+
+    def key_decoder(self, type): # type: (str)->Callable[[bytes, int, any], Tuple[any, any, int]]
+        """decode(data, offset, previous)->(key, raw, offset) for keys of sorted dicts, previous raw key is None at block start"""
+        return self.__compile_sorted_key(type)[2]
+
+    def count_encoder(self, schema): # type: (Union[ArrayDescriptor, DictionaryDescriptor])->Callable[[int], bytes]
+        return self.__compile_count(schema.varint)[1]
+
+    def count_decoder(self, schema): # type: (Union[ArrayDescriptor, DictionaryDescriptor])->Callable[[bytes, int], Tuple[int, int]]
+        """unpack(data, offset)->(size, offset) for count of the array or dict, size of null is UINT32_MAX"""
+        return self.__compile_count(schema.varint)[2]
+
+    def layout(self, schema): # type: (ClassDescriptor)->Tuple[Dict[str, int], list, list]
+        if schema not in self.__layouts:
+            index = dict((f.name, n) for n, f in enumerate(schema.fields))
+            self.__layouts[schema] = index, [self.opener(f) for f in schema.fields], [self.skipper(f) for f in schema.fields]
+        return self.__layouts[schema]
+
+    def record_dtype(self, schema, aligned=False): # type: (Descriptor, bool)->Optional[numpy.dtype]
+        """
+        numpy dtype of packed records of a class with only fixed-width scalar fields, None for other classes.
+        aligned records of layout="aligned" arrays carry pad bytes and no null flag, so class_nullable does not matter.
+        """
+        if numpy is None or not isinstance(schema, ClassDescriptor) or not schema.fields: return None
+        if self.class_nullable and not aligned: return None
+        fields = []
+        for f in schema.fields:
+            if f.descriptor or _scalar_type(f.type, f.varint) not in STRUCT_FORMATS: return None
+            fields.append((f.name, '?' if f.type == JSONTYPE_bool else self.endian + STRUCT_FORMATS[f.type]))
+        if not aligned: return numpy.dtype(fields)
+        offsets, size, _ = aligned_layout(schema)
+        names, formats = zip(*fields)
+        return numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': size})
+
+    def record_encoder(self, schema): # type: (ClassDescriptor)->Callable[[dict, io.BytesIO], None]
+        """encode(value, buffer) of one padded record of layout="aligned" arrays, buffer must be at record alignment"""
+        return self.__compile_run_encoder(schema, schema.fields, aligned_layout(schema))
+
+    def record_decoder(self, schema): # type: (ClassDescriptor)->Callable[[bytes, int], Tuple[dict, int]]
+        """decode(data, offset)->(value, offset) of one padded record of layout="aligned" arrays"""
+        names = [f.name for f in schema.fields]
+        run_decoder = self.__compile_run_decoder(schema.fields, aligned_layout(schema))
+        def decode(data, offset):
+            values, offset = run_decoder(data, offset)
+            return dict(zip(names, values)), offset
+        return decode
+
+    def column_encoder(self, schema): # type: (ClassDescriptor)->Callable[[Union[list, dict], io.BytesIO], None]
+        """
+        encode(elements, buffer) of the columns of a layout="columnar" array, count is not written. elements is
+        a list of dicts or a dict of columns by field name as decoded with array_type numpy or columns, whose
+        enum fields are numbers
+        """
+        fields = [(f.name, '{}.{}'.format(schema.name, f.name), f.type, self.__get_default(f.type),
+                   self.enums[f.enum].cases if f.enum else None) for f in schema.fields]
+        enable_default, session, endian = self.enable_default, self.__session, self.endian
+        def encode(elements, buffer):
+            if isinstance(elements, dict):
+                for name, _, type, _, _ in fields: buffer.write(_pack_column(type, elements[name], endian))
+                return
+            for name, path, type, default, cases in fields:
+                values = []
+                append = values.append
+                for element in elements:
+                    value = element.get(name)
+                    if value is None and enable_default:
+                        if session.defaults is not None: session.defaults.add(path, element)
+                        value = default
+                    append(value)
+                if cases is not None: values = [cases[v] for v in values]
+                buffer.write(_pack_column(type, values, endian))
+        return encode
+
+    def column_decoder(self, schema, columns=False): # type: (ClassDescriptor, bool)->Callable[[bytes, int, int], Tuple[any, int]]
+        """
+        decode(data, offset, size)->(elements, offset) of the columns of a layout="columnar" array with size elements.
+        elements is a list of dicts, or with columns a dict of columns by field name, which holds numbers and bools
+        as ndarrays with array_type numpy or columns and keeps enum fields as numbers
+        """
+        names = [f.name for f in schema.fields]
+        ndarray = columns and self.array_type in ('numpy', 'columns')
+        fields = [(f.type, None if columns else self.enums[f.enum].values if f.enum else None) for f in schema.fields]
+        endian = self.endian
+        def decode(data, offset, size):
+            values = []
+            for type, cases in fields:
+                column, offset = _unpack_column(type, size, data, offset, endian, ndarray)
+                values.append(column if cases is None else [cases[v] for v in column])
+            if columns: return dict(zip(names, values)), offset
+            return [dict(zip(names, row)) for row in zip(*values)], offset
+        return decode
+
+    def fixed_size(self, schema): # type: (Union[Descriptor, str])->Optional[int]
+        if isinstance(schema, str):
+            if schema == JSONTYPE_string and self.pooled: return 4
+            return self.__struct(schema).size if schema in STRUCT_FORMATS else None
+        if isinstance(schema, FieldDescriptor):
+            return self.fixed_size(schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint))
+        if isinstance(schema, ClassDescriptor):
+            if self.class_nullable or not schema.fields: return None
+            sizes = [self.fixed_size(f) for f in schema.fields]
+            return None if None in sizes else sum(sizes)
+        return None
+
+    @staticmethod
+    def __get_default(type): # type: (str)->any
+        if type == JSONTYPE_bool: return False
+        if type.startswith('int'): return -1
+        if type.startswith('uint'): return 0
+        if type == JSONTYPE_byte: return 0
+        if type in (JSONTYPE_ushort, JSONTYPE_ulong): return 0
+        if type in (JSONTYPE_short, JSONTYPE_long): return -1
+        if type == JSONTYPE_double or type.startswith('float'): return 0.0
+        return None
+
+    @staticmethod
+    def __compile_key(type): # type: (str)->Callable[[str], any]
+        if type.startswith('int') or type.startswith('uint') or type.startswith(VARINT_PREFIX) \
+                or type in (JSONTYPE_byte, JSONTYPE_short, JSONTYPE_ushort, JSONTYPE_long, JSONTYPE_ulong): return int
+        if type.startswith('float') or type == JSONTYPE_double: return float
+        assert type == JSONTYPE_string
+        return lambda value: value
+
+    @staticmethod
+    def __compile_filter(filters): # type: (List[FilterDescriptor])->Callable[[dict], bool]
+        if not filters: return None
+        conditions = [(f.name, f.value) for f in filters]
+        def accept(v):
+            for name, value in conditions:
+                if v.get(name) == value: return True
+            return False
+        return accept
+
+    def __struct(self, type): # type: (str)->struct.Struct
+        if type not in STRUCT_FORMATS:
+            raise NotImplementedError('Not support for coding value with {!r} type'.format(type))
+        return struct.Struct(self.endian + STRUCT_FORMATS[type])
+
+    def __unpack_from(self, s): # type: (struct.Struct)->Callable[[bytes, int], tuple]
+        # frame views export no buffer, values are unpacked from slices of them instead
+        if not self.framed: return s.unpack_from
+        unpack, size = s.unpack, s.size
+        def unpack_from(data, offset): return unpack(data[offset:offset + size])
+        return unpack_from
+
+    def __compile_count(self, varint): # type: (bool)->Tuple[bytes, Callable[[int], bytes], Callable[[bytes, int], Tuple[int, int]]]
+        """(null, pack(size), unpack(data, offset)->(size, offset)) for counts of arrays and dicts, size of null is UINT32_MAX"""
+        if varint:
+            # count + 1 so that null takes a single zero byte
+            def pack(size): return _pack_varint(size + 1)
+            def unpack(data, offset):
+                size, offset = _unpack_varint(data, offset)
+                return (size - 1 if size else UINT32_MAX), offset
+            return b'\x00', pack, unpack
+        unpack_count = self.unpacker(JSONTYPE_uint32)
+        def unpack(data, offset): return unpack_count(data, offset)[0], offset + 4
+        return self.__struct(JSONTYPE_int32).pack(-1), self.__struct(JSONTYPE_uint32).pack, unpack
+
+    def __compile_pool(self):
+        decode_root, root_offset = self.decode, self.root_offset
+        def decode(data, offset): return decode_root(data, root_offset(data, offset))
+        self.decode = decode
+
+    def __compile_session(self):
+        encode_root, session = self.encode, self.session
+        if not self.pooled:
+            def encode(value, buffer, defaults=None):
+                with session(defaults): encode_root(value, buffer)
+            self.encode = encode
+            return
+        def encode(value, buffer, defaults=None):
+            # offsets are assigned while encoding, so root value is staged behind the pool
+            body = io.BytesIO()
+            with session(defaults) as pool: encode_root(value, body)
+            pool.write(buffer)
+            buffer.write(body.getvalue())
+        self.encode = encode
+
+    def __compile_encode_v(self, type): # type: (str)->Callable[[any, io.BytesIO], None]
+        if type.startswith(VARINT_PREFIX):
+            lower, upper = VARINT_RANGES[type[len(VARINT_PREFIX):]]
+            signed = lower < 0
+            def encode(value, buffer):
+                if not lower <= value <= upper: raise struct.error('{} out of range for {}'.format(value, type))
+                buffer.write(_pack_varint((value << 1) ^ (value >> 63) if signed else value))
+            return encode
+        if type == JSONTYPE_string and self.pooled:
+            pack_offset = self.__struct(JSONTYPE_uint32).pack
+            null = pack_offset(UINT32_MAX)
+            session = self.__session
+            # falsy values pool as empty string like the plain path writes them
+            def encode(value, buffer): buffer.write(null if value is None else pack_offset(session.pool.add(str(value) if value else '')))
+            return encode
+        if type == JSONTYPE_string:
+            pack_size = self.__struct(JSONTYPE_uint16).pack
+            pack_null = self.__struct(JSONTYPE_int16).pack
+            def encode(value, buffer):
+                if not value:
+                    buffer.write(pack_null(-1 if value is None else 0))
+                else:
+                    bin = str(value).encode('utf-8')
+                    buffer.write(pack_size(len(bin)))
+                    buffer.write(bin)
+            return encode
+        pack = self.__struct(type).pack
+        if type == JSONTYPE_bool:
+            def encode(value, buffer): buffer.write(pack(1 if value else 0))
+        else:
+            def encode(value, buffer): buffer.write(pack(value))
+        return encode
+
+    def __compile_decode_v(self, type): # type: (str)->Callable[[bytes, int], Tuple[any, int]]
+        if type.startswith(VARINT_PREFIX):
+            if VARINT_RANGES[type[len(VARINT_PREFIX):]][0] == 0: return _unpack_varint
+            def decode(data, offset):
+                value, offset = _unpack_varint(data, offset)
+                return (value >> 1) ^ -(value & 1), offset
+            return decode
+        if type == JSONTYPE_string and self.pooled:
+            unpack_offset = self.unpacker(JSONTYPE_uint32)
+            unpack_size = self.unpacker(JSONTYPE_uint16)
+            intern = sys.intern
+            def decode(data, offset):
+                # entries decode to interned str, so repeated strings share one object
+                shift, = unpack_offset(data, offset)
+                if shift == UINT32_MAX: return None, offset + 4
+                size, = unpack_size(data, shift)
+                return intern(str(data[shift + 2:shift + 2 + size], 'utf-8')), offset + 4
+            return decode
+        if type == JSONTYPE_string:
+            unpack_size = self.unpacker(JSONTYPE_uint16)
+            def decode(data, offset):
+                size, = unpack_size(data, offset)
+                offset += 2
+                if size == UINT16_MAX: return None, offset
+                if size == 0: return '', offset
+                return str(data[offset:offset + size], 'utf-8'), offset + size
+            return decode
+        s = self.__struct(type)
+        unpack, size = self.__unpack_from(s), s.size
+        if type == JSONTYPE_bool:
+            def decode(data, offset):
+                v, = unpack(data, offset)
+                return v != 0, offset + size
+        else:
+            def decode(data, offset):
+                v, = unpack(data, offset)
+                return v, offset + size
+        return decode
+
+    def __compile_sorted_key(self, type): # type: (str)->tuple
+        # keys of sorted dicts go through raw form: utf-8 bytes for strings, parsed numbers otherwise
+        if type in self.__keys: return self.__keys[type]
+        if type == JSONTYPE_string:
+            pack_size = self.__struct(JSONTYPE_uint16).pack
+            unpack_size = self.unpacker(JSONTYPE_uint16)
+            def to_raw(key): return str(key).encode('utf-8')
+            def encode(raw, previous, buffer):
+                if previous is None:
+                    shared = 0
+                else:
+                    shared = min(len(p.commonprefix([raw, previous])), UINT16_MAX)
+                    buffer.write(pack_size(shared))
+                buffer.write(pack_size(len(raw) - shared))
+                buffer.write(raw[shared:])
+            def decode(data, offset, previous):
+                if previous is None:
+                    shared = 0
+                else:
+                    shared, = unpack_size(data, offset)
+                    offset += 2
+                size, = unpack_size(data, offset)
+                offset += 2
+                raw = bytes(data[offset:offset + size])
+                if shared: raw = previous[:shared] + raw
+                return str(raw, 'utf-8'), raw, offset + size
+        else:
+            to_raw = self.__compile_key(type)
+            value_encoder = self.__compile_encode_v(type)
+            value_decoder = self.__compile_decode_v(type)
+            def encode(raw, previous, buffer): value_encoder(raw, buffer)
+            def decode(data, offset, previous):
+                key, offset = value_decoder(data, offset)
+                return key, key, offset
+        self.__keys[type] = to_raw, encode, decode
+        return self.__keys[type]
+
+    @staticmethod
+    def __group_fields(fields): # type: (List[FieldDescriptor])->List[List[FieldDescriptor]]
+        runs = [] # type: List[List[FieldDescriptor]]
+        fixed = False
+        for field in fields:
+            if field.type in STRUCT_FORMATS and not (field.varint and field.type in VARINT_RANGES):
+                if fixed:
+                    runs[-1].append(field)
+                else:
+                    runs.append([field])
+                fixed = True
+            else:
+                runs.append([field])
+                fixed = False
+        return runs
+
+    @staticmethod
+    def __is_bulk(schema): # type: (Descriptor)->bool
+        # containers of fixed-width scalars are coded with one struct/array call
+        if isinstance(schema, ArrayDescriptor):
+            return _scalar_type(schema.type, schema.varint) in STRUCT_FORMATS
+        if isinstance(schema, DictionaryDescriptor):
+            return _scalar_type(schema.type, schema.varint) in STRUCT_FORMATS \
+                   and _scalar_type(schema.key, schema.varint) in STRUCT_FORMATS and not schema.sorted
+        return False
+
+    def __run_struct(self, fields, layout=None): # type: (List[FieldDescriptor], Optional[tuple])->struct.Struct
+        # '?' packs any truthy value to 1 and unpacks to bool, same as single bool fields
+        formats = ['?' if f.type == JSONTYPE_bool else STRUCT_FORMATS[f.type] for f in fields]
+        if layout is None: return struct.Struct(self.endian + ''.join(formats))
+        # zero pad bytes of aligned records, which neither take nor give values
+        offsets, size, _ = layout
+        format, position = '', 0
+        for offset, f in zip(offsets, formats):
+            format += 'x' * (offset - position) + f
+            position = offset + struct.calcsize('<' + f)
+        return struct.Struct(self.endian + format + 'x' * (size - position))
+
+    def __compile_run_encoder(self, schema, fields, layout=None):
+        # type: (ClassDescriptor, List[FieldDescriptor], Optional[tuple])->Callable[[dict, io.BytesIO], None]
+        pack = self.__run_struct(fields, layout).pack
+        names = [f.name for f in fields]
+        getter = operator.itemgetter(*names)
+        defaults = [(n, '{}.{}'.format(schema.name, f.name), self.__get_default(f.type)) for n, f in enumerate(fields)]
+        enums = [(n, self.enums[f.enum].cases) for n, f in enumerate(fields) if f.enum]
+        enable_default, session = self.enable_default, self.__session
+        def encode(value, buffer):
+            try:
+                values = getter(value)
+            except KeyError:
+                get = value.get
+                values = [get(name) for name in names]
+            if enums or None in values: values = list(values)
+            if enable_default and None in values:
+                for n, path, default in defaults:
+                    if values[n] is None:
+                        if session.defaults is not None: session.defaults.add(path, value)
+                        values[n] = default
+            for n, cases in enums: values[n] = cases[values[n]]
+            buffer.write(pack(*values))
+        return encode
+
+    def __compile_run_decoder(self, fields, layout=None):
+        # type: (List[FieldDescriptor], Optional[tuple])->Callable[[bytes, int], Tuple[tuple, int]]
+        s = self.__run_struct(fields, layout)
+        unpack, size = self.__unpack_from(s), s.size
+        enums = [(n, self.enums[f.enum].values) for n, f in enumerate(fields) if f.enum]
+        if not enums:
+            def decode(data, offset): return unpack(data, offset), offset + size
+        else:
+            def decode(data, offset):
+                values = list(unpack(data, offset))
+                for n, cases in enums: values[n] = cases[values[n]]
+                return values, offset + size
+        return decode
+
+    def __compile_bulk_encoder(self, schema): # type: (Union[ArrayDescriptor, DictionaryDescriptor])->Callable[[any, io.BytesIO], None]
+        null, pack_count, _ = self.__compile_count(schema.varint)
+        endian = self.endian
+        if isinstance(schema, DictionaryDescriptor):
+            pair = STRUCT_FORMATS[schema.key] + ('?' if schema.type == JSONTYPE_bool else STRUCT_FORMATS[schema.type])
+            parse_key = self.__compile_key(schema.key)
+            def encode(value, buffer):
+                if value is None:
+                    buffer.write(null)
+                    return
+                assert isinstance(value, dict)
+                size = len(value)
+                buffer.write(pack_count(size))
+                if size == 0: return
+                items = []
+                for k, v in value.items():
+                    items.append(parse_key(k))
+                    items.append(v)
+                buffer.write(struct.pack('{}{}'.format(endian, pair * size), *items))
+            return encode
+        format = '?' if schema.type == JSONTYPE_bool else STRUCT_FORMATS[schema.type]
+        typecode = ARRAY_TYPECODES.get(format)
+        byteswap = self.byteswap
+        def encode(value, buffer):
+            if value is None:
+                buffer.write(null)
+                return
+            buffer.write(pack_count(len(value)))
+            if isinstance(value, array.array) and value.typecode == typecode:
+                if byteswap:
+                    value = array.array(typecode, value)
+                    value.byteswap()
+                buffer.write(value.tobytes())
+            elif numpy is not None and isinstance(value, numpy.ndarray):
+                buffer.write(value.astype(endian + format).tobytes())
+            else:
+                assert isinstance(value, list)
+                buffer.write(struct.pack('{}{}{}'.format(endian, len(value), format), *value))
+        return encode
+
+    def __compile_bulk_decoder(self, schema): # type: (Union[ArrayDescriptor, DictionaryDescriptor])->Callable[[bytes, int], Tuple[any, int]]
+        unpack_count = self.__compile_count(schema.varint)[2]
+        endian = self.endian
+        if isinstance(schema, DictionaryDescriptor):
+            s = struct.Struct(endian + STRUCT_FORMATS[schema.key] + ('?' if schema.type == JSONTYPE_bool else STRUCT_FORMATS[schema.type]))
+            iter_unpack, pair_size = s.iter_unpack, s.size
+            def decode(data, offset):
+                size, offset = unpack_count(data, offset)
+                if size == UINT32_MAX: return None, offset
+                end = offset + size * pair_size
+                return dict(iter_unpack(data[offset:end])), end
+            return decode
+        if schema.type == JSONTYPE_bool:
+            def decode(data, offset):
+                size, offset = unpack_count(data, offset)
+                if size == UINT32_MAX: return None, offset
+                return list(struct.unpack('{}?'.format(size), data[offset:offset + size])), offset + size
+            return decode
+        format = STRUCT_FORMATS[schema.type]
+        typecode = ARRAY_TYPECODES[format]
+        itemsize = struct.calcsize(endian + format)
+        byteswap, array_type = self.byteswap, self.array_type
+        dtype = numpy.dtype(endian + format) if array_type in ('numpy', 'columns') else None
+        def decode(data, offset):
+            size, offset = unpack_count(data, offset)
+            if size == UINT32_MAX: return None, offset
+            end = offset + size * itemsize
+            if dtype is not None:
+                # astype copies into native byte order, leaving no export on the source buffer
+                return numpy.frombuffer(data[offset:end], dtype=dtype).astype(dtype.newbyteorder('=')), end
+            elements = array.array(typecode)
+            elements.frombytes(data[offset:end])
+            if byteswap: elements.byteswap()
+            return (elements if array_type == 'array' else elements.tolist()), end
+        return decode
+
+    def __is_records(self, schema): # type: (Descriptor)->bool
+        return isinstance(schema, ArrayDescriptor) and schema.layout != LAYOUT_COLUMNAR and self.record_dtype(schema.descriptor, schema.layout == LAYOUT_ALIGNED) is not None
+
+    def __compile_records_encoder(self, schema, encode_list):
+        # type: (ArrayDescriptor, Callable[[any, io.BytesIO], None])->Callable[[any, io.BytesIO], None]
+        """
+        encoder also taking structured ndarrays or dicts of column ndarrays as decoded with array_type numpy or
+        columns, filters need dicts
+        """
+        pack_count = self.__compile_count(schema.varint)[1]
+        aligned = schema.layout == LAYOUT_ALIGNED
+        dtype, indexed, filters = self.record_dtype(schema.descriptor, aligned), schema.indexed, schema.filters
+        align = aligned_layout(schema.descriptor)[2] if aligned else 1
+        def encode(value, buffer):
+            if not isinstance(value, (numpy.ndarray, dict)):
+                encode_list(value, buffer)
+                return
+            if filters: raise TypeError('filtered array of {} takes a list of dicts, not decoded records'.format(schema.descriptor.name))
+            if isinstance(value, dict):
+                columns, value = value, numpy.zeros(len(value[dtype.names[0]]), dtype=dtype)
+                for name in dtype.names: value[name] = columns[name]
+            buffer.write(pack_count(len(value)))
+            if indexed:
+                offsets = numpy.arange(len(value) + 1, dtype=self.endian + 'u4') * dtype.itemsize
+                buffer.write(offsets.tobytes())
+            if aligned:
+                buffer.write(bytes(-buffer.tell() % align))
+                # copied field by field so that pad bytes stay zero
+                records = numpy.zeros(len(value), dtype=dtype)
+                for name in dtype.names: records[name] = value[name]
+                buffer.write(records.tobytes())
+                return
+            buffer.write(value.astype(dtype).tobytes())
+        return encode
+
+    def __compile_records_decoder(self, schema): # type: (ArrayDescriptor)->Callable[[bytes, int], Tuple[any, int]]
+        unpack_count = self.__compile_count(schema.varint)[2]
+        aligned = schema.layout == LAYOUT_ALIGNED
+        dtype = self.record_dtype(schema.descriptor, aligned)
+        native = dtype.newbyteorder('=')
+        indexed, columns = schema.indexed, self.array_type == 'columns'
+        align = aligned_layout(schema.descriptor)[2] if aligned else 1
+        def decode(data, offset):
+            size, offset = unpack_count(data, offset)
+            if size == UINT32_MAX: return None, offset
+            if indexed: offset += 4 * (size + 1)
+            offset += -offset % align
+            end = offset + size * dtype.itemsize
+            # astype copies into native byte order, leaving no export on the source buffer
+            records = numpy.frombuffer(data[offset:end], dtype=dtype).astype(native)
+            if columns: return dict((name, numpy.ascontiguousarray(records[name])) for name in dtype.names), end
+            return records, end
+        return decode
+
+    def __compile_encoder(self, schema): # type: (Descriptor)->Callable[[any, io.BytesIO], None]
+        uid = id(schema)
+        if uid in self.__encoders: return self.__encoders[uid]
+        if self.__is_bulk(schema):
+            encode = self.__compile_bulk_encoder(schema)
+        elif isinstance(schema, ArrayDescriptor) or isinstance(schema, DictionaryDescriptor):
+            null, pack_count, _ = self.__compile_count(schema.varint)
+            endian = self.endian
+            element_encoder = self.__compile_encoder(schema.descriptor) if schema.descriptor \
+                else self.__compile_encode_v(_scalar_type(schema.type, schema.varint))
+            accept = self.__compile_filter(schema.filters) if schema.descriptor else None
+            if isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_ALIGNED:
+                record_encoder = self.record_encoder(schema.descriptor)
+                align = aligned_layout(schema.descriptor)[2]
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    assert isinstance(value, list)
+                    if accept is not None: value = [element for element in value if accept(element)]
+                    buffer.write(pack_count(len(value)))
+                    # records start at a multiple of their alignment from document start
+                    buffer.write(bytes(-buffer.tell() % align))
+                    for element in value: record_encoder(element, buffer)
+            elif isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_COLUMNAR:
+                column_encoder = self.column_encoder(schema.descriptor)
+                first = schema.descriptor.fields[0].name
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    if isinstance(value, dict):
+                        size = len(value[first])
+                        if accept is not None:
+                            keep = [n for n in range(size) if accept(dict((name, column[n]) for name, column in value.items()))]
+                            value = dict((name, [column[n] for n in keep]) for name, column in value.items())
+                            size = len(keep)
+                        buffer.write(pack_count(size))
+                    else:
+                        assert isinstance(value, list)
+                        if accept is not None: value = [element for element in value if accept(element)]
+                        buffer.write(pack_count(len(value)))
+                    column_encoder(value, buffer)
+            elif isinstance(schema, ArrayDescriptor) and schema.indexed:
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    assert isinstance(value, list)
+                    scratch = io.BytesIO()
+                    offsets = []
+                    for element in value:
+                        if accept is not None and not accept(element): continue
+                        offsets.append(scratch.tell())
+                        element_encoder(element, scratch)
+                    offsets.append(scratch.tell())
+                    buffer.write(pack_count(len(offsets) - 1))
+                    buffer.write(struct.pack('{}{}I'.format(endian, len(offsets)), *offsets))
+                    buffer.write(scratch.getvalue())
+            elif isinstance(schema, ArrayDescriptor):
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    assert isinstance(value, list)
+                    if accept is None:
+                        buffer.write(pack_count(len(value)))
+                        for element in value: element_encoder(element, buffer)
+                        return
+                    # count accepted elements first so that buffer never seeks, pipes and sockets work too
+                    buffer.write(pack_count(sum(1 for element in value if accept(element))))
+                    for element in value:
+                        if accept(element): element_encoder(element, buffer)
+            elif schema.sorted:
+                to_raw, key_encoder, _ = self.__compile_sorted_key(_scalar_type(schema.key, schema.varint))
+                first = operator.itemgetter(0)
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    assert isinstance(value, dict)
+                    items = [(to_raw(k), v) for k, v in value.items() if accept is None or accept(v)]
+                    items.sort(key=first)
+                    scratch = io.BytesIO()
+                    offsets = []
+                    previous = None
+                    for n, (raw, v) in enumerate(items):
+                        if n % SORTED_BLOCK_SIZE == 0:
+                            offsets.append(scratch.tell())
+                            previous = None
+                        key_encoder(raw, previous, scratch)
+                        previous = raw
+                        element_encoder(v, scratch)
+                    offsets.append(scratch.tell())
+                    buffer.write(pack_count(len(items)))
+                    buffer.write(struct.pack('{}{}I'.format(endian, len(offsets)), *offsets))
+                    buffer.write(scratch.getvalue())
+            else:
+                key_encoder = self.__compile_encode_v(_scalar_type(schema.key, schema.varint))
+                parse_key = self.__compile_key(schema.key)
+                def encode(value, buffer):
+                    if value is None:
+                        buffer.write(null)
+                        return
+                    assert isinstance(value, dict)
+                    if accept is None:
+                        buffer.write(pack_count(len(value)))
+                        for k, v in value.items():
+                            key_encoder(parse_key(k), buffer)
+                            element_encoder(v, buffer)
+                        return
+                    buffer.write(pack_count(sum(1 for v in value.values() if accept(v))))
+                    for k, v in value.items():
+                        if not accept(v): continue
+                        key_encoder(parse_key(k), buffer)
+                        element_encoder(v, buffer)
+        elif isinstance(schema, ClassDescriptor):
+            fields = []
+            for run in self.__group_fields(schema.fields):
+                if len(run) > 1:
+                    fields.append((None, None, self.__compile_run_encoder(schema, run), None))
+                else:
+                    f = run[0]
+                    fields.append((f.name, '{}.{}'.format(schema.name, f.name), self.__compile_encoder(f), self.__get_default(f.type)))
+            nullable, enable_default, session = self.class_nullable, self.enable_default, self.__session
+            def encode(value, buffer):
+                if nullable:
+                    if not value:
+                        buffer.write(b'\x00')
+                        return
+                    buffer.write(b'\x01')
+                assert fields and isinstance(value, dict), (schema, value)
+                for name, path, field_encoder, default in fields:
+                    if name is None:
+                        field_encoder(value, buffer)
+                        continue
+                    field_value = value.get(name)
+                    if field_value is None and enable_default:
+                        if session.defaults is not None: session.defaults.add(path, value)
+                        field_value = default
+                    field_encoder(field_value, buffer)
+        elif isinstance(schema, FieldDescriptor):
+            if schema.type in ('class', 'array', 'dict'):
+                encode = self.__compile_encoder(schema.descriptor)
+            elif schema.enum:
+                cases = self.enums[schema.enum].cases
+                value_encoder = self.__compile_encode_v(_scalar_type(schema.type, schema.varint))
+                def encode(value, buffer): value_encoder(cases[value], buffer)
+            else:
+                encode = self.__compile_encode_v(_scalar_type(schema.type, schema.varint))
+        else:
+            raise NotImplementedError('<{}/>'.format(schema.tag))
+        if self.__is_records(schema): encode = self.__compile_records_encoder(schema, encode)
+        self.__encoders[uid] = encode
+        return encode
+
+    def __compile_decoder(self, schema): # type: (Descriptor)->Callable[[bytes, int], Tuple[any, int]]
+        uid = id(schema)
+        if uid in self.__decoders: return self.__decoders[uid]
+        if self.__is_bulk(schema):
+            decode = self.__compile_bulk_decoder(schema)
+        elif self.array_type in ('numpy', 'columns') and self.__is_records(schema):
+            decode = self.__compile_records_decoder(schema)
+        elif isinstance(schema, ArrayDescriptor) or isinstance(schema, DictionaryDescriptor):
+            unpack_count = self.__compile_count(schema.varint)[2]
+            element_decoder = self.__compile_decoder(schema.descriptor) if schema.descriptor \
+                else self.__compile_decode_v(_scalar_type(schema.type, schema.varint))
+            if isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_ALIGNED:
+                record_decoder = self.record_decoder(schema.descriptor)
+                align = aligned_layout(schema.descriptor)[2]
+                def decode(data, offset):
+                    size, offset = unpack_count(data, offset)
+                    if size == UINT32_MAX: return None, offset
+                    offset += -offset % align
+                    elements = []
+                    append = elements.append
+                    for _ in range(size):
+                        element, offset = record_decoder(data, offset)
+                        append(element)
+                    return elements, offset
+            elif isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_COLUMNAR:
+                column_decoder = self.column_decoder(schema.descriptor, self.array_type in ('numpy', 'columns'))
+                def decode(data, offset):
+                    size, offset = unpack_count(data, offset)
+                    if size == UINT32_MAX: return None, offset
+                    return column_decoder(data, offset, size)
+            elif isinstance(schema, ArrayDescriptor):
+                indexed = schema.indexed
+                def decode(data, offset):
+                    size, offset = unpack_count(data, offset)
+                    if size == UINT32_MAX: return None, offset
+                    if indexed: offset += 4 * (size + 1)
+                    elements = []
+                    append = elements.append
+                    for _ in range(size):
+                        element, offset = element_decoder(data, offset)
+                        append(element)
+                    return elements, offset
+            elif schema.sorted:
+                key_decoder = self.__compile_sorted_key(_scalar_type(schema.key, schema.varint))[2]
+                def decode(data, offset):
+                    size, offset = unpack_count(data, offset)
+                    if size == UINT32_MAX: return None, offset
+                    offset += 4 * ((size + SORTED_BLOCK_SIZE - 1) // SORTED_BLOCK_SIZE + 1)
+                    elements = {}
+                    raw = None
+                    for n in range(size):
+                        key, raw, offset = key_decoder(data, offset, raw if n % SORTED_BLOCK_SIZE else None)
+                        elements[key], offset = element_decoder(data, offset)
+                    return elements, offset
+            else:
+                key_decoder = self.__compile_decode_v(_scalar_type(schema.key, schema.varint))
+                def decode(data, offset):
+                    size, offset = unpack_count(data, offset)
+                    if size == UINT32_MAX: return None, offset
+                    elements = {}
+                    for _ in range(size):
+                        key, offset = key_decoder(data, offset)
+                        elements[key], offset = element_decoder(data, offset)
+                    return elements, offset
+        elif isinstance(schema, ClassDescriptor):
+            fields = []
+            for run in self.__group_fields(schema.fields):
+                if len(run) > 1:
+                    fields.append((tuple(f.name for f in run), self.__compile_run_decoder(run), True))
+                else:
+                    fields.append((run[0].name, self.__compile_decoder(run[0]), False))
+            nullable = self.class_nullable
+            def decode(data, offset):
+                if nullable:
+                    if data[offset] == 0: return None, offset + 1
+                    offset += 1
+                assert fields
+                obj = {}
+                for name, field_decoder, fused in fields:
+                    if fused:
+                        values, offset = field_decoder(data, offset)
+                        obj.update(zip(name, values))
+                    else:
+                        obj[name], offset = field_decoder(data, offset)
+                return obj, offset
+        elif isinstance(schema, FieldDescriptor):
+            if schema.type in ('class', 'array', 'dict'):
+                decode = self.__compile_decoder(schema.descriptor)
+            elif schema.enum:
+                values = self.enums[schema.enum].values
+                value_decoder = self.__compile_decode_v(_scalar_type(schema.type, schema.varint))
+                def decode(data, offset):
+                    v, offset = value_decoder(data, offset)
+                    return values[v], offset
+            else:
+                decode = self.__compile_decode_v(_scalar_type(schema.type, schema.varint))
+        else:
+            raise NotImplementedError('<{}/>'.format(schema.tag))
+        self.__decoders[uid] = decode
+        return decode
+
+    def __compile_skipper(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], int]
+        if schema in self.__skippers: return self.__skippers[schema]
+        size = self.fixed_size(schema)
+        if size is not None:
+            def skip(data, offset): return offset + size
+        elif isinstance(schema, str) and schema.startswith(VARINT_PREFIX):
+            def skip(data, offset):
+                while data[offset] >= 0x80: offset += 1
+                return offset + 1
+        elif isinstance(schema, str):
+            assert schema == JSONTYPE_string, schema
+            unpack_size = self.unpacker(JSONTYPE_uint16)
+            def skip(data, offset):
+                size, = unpack_size(data, offset)
+                return offset + 2 if size == UINT16_MAX else offset + 2 + size
+        elif isinstance(schema, FieldDescriptor):
+            skip = self.__compile_skipper(schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint))
+        elif isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_ALIGNED:
+            unpack_count = self.__compile_count(schema.varint)[2]
+            _, record_size, align = aligned_layout(schema.descriptor)
+            def skip(data, offset):
+                size, offset = unpack_count(data, offset)
+                if size == UINT32_MAX: return offset
+                return offset + -offset % align + size * record_size
+        elif isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_COLUMNAR:
+            unpack_count = self.__compile_count(schema.varint)[2]
+            types, endian = [f.type for f in schema.descriptor.fields], self.endian
+            def skip(data, offset):
+                size, offset = unpack_count(data, offset)
+                if size == UINT32_MAX: return offset
+                for type in types: offset = _skip_column(type, size, data, offset, endian)
+                return offset
+        elif isinstance(schema, ArrayDescriptor) or isinstance(schema, DictionaryDescriptor):
+            unpack_count = self.__compile_count(schema.varint)[2]
+            unpack_offset = self.unpacker(JSONTYPE_uint32)
+            element = schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint)
+            element_skip = self.__compile_skipper(element)
+            stride = self.fixed_size(element)
+            if isinstance(schema, DictionaryDescriptor):
+                key_skip = self.__compile_skipper(_scalar_type(schema.key, schema.varint))
+                key_size = self.fixed_size(_scalar_type(schema.key, schema.varint))
+                stride = key_size + stride if key_size is not None and stride is not None else None
+            else:
+                key_skip = None
+            # entries per offset table slot, last slot holds the size of all entries
+            if isinstance(schema, ArrayDescriptor):
+                block = 1 if schema.indexed else 0
+            else:
+                block = SORTED_BLOCK_SIZE if schema.sorted else 0
+            def skip(data, offset):
+                size, offset = unpack_count(data, offset)
+                if size == UINT32_MAX: return offset
+                if block:
+                    slots = (size + block - 1) // block
+                    end, = unpack_offset(data, offset + 4 * slots)
+                    return offset + 4 * (slots + 1) + end
+                if stride is not None: return offset + size * stride
+                for _ in range(size):
+                    if key_skip is not None: offset = key_skip(data, offset)
+                    offset = element_skip(data, offset)
+                return offset
+        elif isinstance(schema, ClassDescriptor):
+            skippers = [self.__compile_skipper(f) for f in schema.fields]
+            nullable = self.class_nullable
+            def skip(data, offset):
+                if nullable:
+                    if data[offset] == 0: return offset + 1
+                    offset += 1
+                for field_skip in skippers: offset = field_skip(data, offset)
+                return offset
+        else:
+            raise NotImplementedError('<{}/>'.format(schema.tag))
+        self.__skippers[schema] = skip
+        return skip
+
+    def __compile_opener(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], any]
+        if schema in self.__openers: return self.__openers[schema]
+        if isinstance(schema, FieldDescriptor) and schema.descriptor:
+            open_value = self.__compile_opener(schema.descriptor)
+        elif isinstance(schema, str) or isinstance(schema, FieldDescriptor):
+            decode = self.decoder(schema)
+            def open_value(data, offset): return decode(data, offset)[0]
+        elif isinstance(schema, ArrayDescriptor) or isinstance(schema, DictionaryDescriptor):
+            unpack_count = self.__compile_count(schema.varint)[2]
+            proxy = JsonbufLazyArray if isinstance(schema, ArrayDescriptor) else JsonbufLazyDict
+            def open_value(data, offset):
+                size, start = unpack_count(data, offset)
+                if size == UINT32_MAX: return None
+                return proxy(self, schema, data, offset, start, size)
+        elif isinstance(schema, ClassDescriptor):
+            nullable = self.class_nullable
+            def open_value(data, offset):
+                if nullable and data[offset] == 0: return None
+                return JsonbufLazyClass(self, schema, data, offset)
+        else:
+            raise NotImplementedError('<{}/>'.format(schema.tag))
+        self.__openers[schema] = open_value
+        return open_value
+
+class JsonbufReport(object):
+    """
+    Breakdown of a document collected by JsonbufSerializer, keyed by class name and by {class}.{field} path.
+    Bytes and seconds include everything nested, count is the number of values encoded or decoded, elements
+    are entries of arrays and dicts below a field or root, defaults are missing values substituted on encode.
+    Strings of pooled documents are counted as offsets in place and as a whole under <pool>.
+    """
+    COLUMNS = ('bytes', 'count', 'elements', 'defaults', 'seconds')
+    BYTES, COUNT, ELEMENTS, DEFAULTS, SECONDS = range(5)
+
+    def __init__(self):
+        self.entries = {} # type: Dict[str, list]
+        self.size = 0 # bytes of whole document
+
+    def entry(self, path): # type: (str)->list
+        entry = self.entries.get(path)
+        if entry is None: entry = self.entries[path] = [0, 0, 0, 0, 0.0]
+        return entry
+
+    def sorted(self): # type: ()->List[Tuple[str, list]]
+        """entries by bytes and then seconds, largest first"""
+        return sorted(self.entries.items(), key=lambda x: (-x[1][self.BYTES], -x[1][self.SECONDS], x[0]))
+
+    def dumps(self): # type: ()->str
+        data = collections.OrderedDict()
+        data['size'] = self.size
+        data['entries'] = collections.OrderedDict((path, dict(zip(self.COLUMNS, entry))) for path, entry in self.sorted())
+        return json.dumps(data, indent=4)
+
+    def table(self): # type: ()->str
+        width = max([len(path) for path in self.entries] + [4])
+        lines = ['{:{}s} {:>12s} {:>6s} {:>10s} {:>10s} {:>10s} {:>10s}'.format('path', width, 'bytes', '%', 'count', 'elements', 'defaults', 'ms')]
+        for path, (size, count, elements, defaults, seconds) in self.sorted():
+            lines.append('{:{}s} {:>12,} {:>6.1f} {:>10,} {:>10,} {:>10,} {:>10.1f}'.format(
+                path, width, size, 100.0 * size / self.size if self.size else 0, count, elements, defaults, seconds * 1000))
+        return '\n'.join(lines)
+
 class JsonbufSerializer(object):
-    def __init__(self, schema, class_nullable=True, enable_default=True, verbose=True):
+    def __init__(self, schema, class_nullable=True, enable_default=True, verbose=True, compiled=False, array_type='list'):
         self.schema = schema # type: Descriptor
         self.class_nullable = class_nullable
         self.enable_default = enable_default
         self.verbose = verbose
-        self.bridges = JsonbufBridges()
+        self.bridges = JsonbufBridges.shared()
         self.enums = self.bridges.enums # type: Dict[str, JsonbufEnumBridge]
         self.context = None
         self.endian = '<'
+        self.compiled = compiled
+        self.array_type = array_type
+        # codec of block-compressed output, one of FRAME_CODECS, None for plain output. Input is read as framed
+        # whenever set, with the codec its header names, plain documents may start with any bytes so framing
+        # is never guessed from them
+        self.frame = None # type: Optional[str]
+        self.block_size = FRAME_BLOCK_SIZE
+        # breakdown collected while encoding or decoding, which always runs interpreted then
+        self.report = None # type: Optional[JsonbufReport]
+        # missing fields filled by defaults, counted only in verbose mode
+        self.defaults = JsonbufDefaults() if verbose else None # type: Optional[JsonbufDefaults]
+        self.__path = '<root>'
+        self.__pool = None # type: JsonbufStringPool
+        self.__strings = None # type: Dict[int, str]
+        self.__aligned = None # type: Optional[bool]
+
+    @property
+    def pooled(self): # type: ()->bool
+        return isinstance(self.schema, ClassDescriptor) and self.schema.pool
+
+    @property
+    def aligned(self): # type: ()->bool
+        """whether documents hold aligned arrays, which are padded by position from document start"""
+        if self.__aligned is None: self.__aligned = _has_aligned(self.schema)
+        return self.__aligned
+
+    @property
+    def codec(self): # type: ()->JsonbufCodec
+        return self.__codec(framed=False)
+
+    def __codec(self, framed): # type: (bool)->JsonbufCodec
+        return JsonbufCodec.compile(self.schema, class_nullable=self.class_nullable, enable_default=self.enable_default,
+                                    verbose=self.verbose, endian=self.endian, enums=self.enums, array_type=self.array_type, framed=framed)
+
+    def __view(self, data): # type: (Union[bytes, bytearray, memoryview, mmap.mmap])->Tuple[JsonbufCodec, Union[memoryview, JsonbufFrameView]]
+        """codec and view decoding data, blocks of framed data are decompressed as they are read"""
+        if self.frame: return self.__codec(framed=True), JsonbufFrameView(data)
+        return self.codec, memoryview(data)
 
     def serialize(self, fp): # type: (io.BytesIO)->None
+        if self.frame:
+            with JsonbufFrameWriter(fp, codec=self.frame, block_size=self.block_size) as frame:
+                self.__serialize(frame)
+            return
+        self.__serialize(fp)
+
+    def __serialize(self, fp): # type: (io.BytesIO)->None
+        if self.compiled and self.report is None:
+            codec = self.codec
+            if self.aligned:
+                # padding takes positions from document start, which fp may not be at or may not tell
+                body = io.BytesIO()
+                codec.encode(self.context, body, self.defaults)
+                fp.write(body.getvalue())
+                return
+            codec.encode(self.context, fp, self.defaults)
+            return
+        if self.pooled:
+            self.__pool = JsonbufStringPool(self.endian)
+            body = io.BytesIO()
+            self.__encode(self.schema, value=self.context, buffer=body)
+            if self.report is not None:
+                count, size = self.__pool.mark()
+                self.__report_pool(4 + size, count, body.tell())
+            self.__pool.write(fp)
+            fp.write(body.getvalue())
+            self.__pool = None
+            return
+        if self.report is not None or self.aligned:
+            # sizes and padding are measured by buffer positions, which pipes do not have
+            body = io.BytesIO()
+            self.__encode(self.schema, value=self.context, buffer=body)
+            if self.report is not None: self.report.size = body.tell()
+            fp.write(body.getvalue())
+            return
         self.__encode(self.schema, value=self.context, buffer=fp)
 
+    def __report_pool(self, size, count, body): # type: (int, int, int)->None
+        entry = self.report.entry('<pool>')
+        entry[JsonbufReport.BYTES] += size
+        entry[JsonbufReport.COUNT] += count
+        self.report.size = size + body
+
+    def __measure(self, path, buffer, method, *args): # type: (str, io.BytesIO, Callable, any)->any
+        """runs method(*args) accounting bytes it moves buffer by and time it takes to path"""
+        entry = self.report.entry(path)
+        parent, self.__path = self.__path, path
+        start, position = time.perf_counter(), buffer.tell()
+        try:
+            result = method(*args)
+        finally:
+            self.__path = parent
+        entry[JsonbufReport.BYTES] += buffer.tell() - position
+        entry[JsonbufReport.COUNT] += 1
+        entry[JsonbufReport.SECONDS] += time.perf_counter() - start
+        return result
+
     def deserilize(self, fp): # type: (io.BytesIO)->any
+        # framed documents are read through their block index, which takes a seekable stream
+        if self.frame: fp = JsonbufFrameReader(fp)
+        if self.compiled and self.report is None:
+            self.context, _ = self.codec.decode(fp.read(), 0)
+            return self.context
+        if self.aligned: fp = io.BytesIO(fp.read())
+        start = fp.tell() if self.report is not None else 0
+        if self.pooled:
+            self.__strings = {}
+            entries = fp.read(self.__decode_v(JSONTYPE_uint32, buffer=fp))
+            position = 0
+            while position < len(entries):
+                size, = struct.unpack_from(self.endian + 'H', entries, position)
+                self.__strings[4 + position] = sys.intern(entries[position + 2:position + 2 + size].decode('utf-8'))
+                position += 2 + size
+            if self.report is not None: self.__report_pool(4 + len(entries), len(self.__strings), 0)
         self.context = self.__decode(self.schema, buffer=fp)
+        if self.report is not None: self.report.size = fp.tell() - start
+        self.__strings = None
         return self.context
 
+    def deserialize_buffer(self, data): # type: (Union[bytes, bytearray, memoryview, mmap.mmap])->any
+        # always decoded by compiled codec, strings are decoded straight from slices of the buffer
+        codec, view = self.__view(data)
+        try:
+            self.context, _ = codec.decode(view, 0)
+        finally:
+            view.release()
+        return self.context
+
+    def deserialize_lazy(self, data): # type: (Union[bytes, bytearray, memoryview, mmap.mmap])->any
+        # classes, arrays and dicts come back as read-only proxies that keep the buffer referenced,
+        # blocks of framed data are decompressed as proxies read them
+        codec, view = self.__view(data)
+        self.context = codec.open(view)
+        return self.context
+
+    def deserialize_mmap(self, filename, lazy=False): # type: (str, bool)->any
+        with open(filename, 'rb') as fp:
+            if p.getsize(filename) == 0: return self.deserialize_buffer(b'')
+            if lazy: return self.deserialize_lazy(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self.deserialize_buffer(data)
+
     @staticmethod
     def __get_default(type): # type: (str)->any
         if type == JSONTYPE_bool: return False
@@ -329,6 +2178,13 @@ class JsonbufSerializer(object):
             buffer.write(struct.pack(self.endian + 'f', value))
         elif type in (JSONTYPE_float64, JSONTYPE_double):
             buffer.write(struct.pack(self.endian + 'd', value))
+        elif type.startswith(VARINT_PREFIX):
+            lower, upper = VARINT_RANGES[type[len(VARINT_PREFIX):]]
+            if not lower <= value <= upper: raise struct.error('{} out of range for {}'.format(value, type))
+            buffer.write(_pack_varint((value << 1) ^ (value >> 63) if lower < 0 else value))
+        elif type == JSONTYPE_string and self.__pool is not None:
+            # falsy values pool as empty string like the plain path writes them
+            self.__encode_v(UINT32_MAX if value is None else self.__pool.add(str(value) if value else ''), type=JSONTYPE_uint32, buffer=buffer)
         elif type == JSONTYPE_string:
             if not value:
                 self.__encode_v(-1 if value is None else 0, type=JSONTYPE_int16, buffer=buffer)
@@ -364,6 +2220,17 @@ class JsonbufSerializer(object):
             v, = struct.unpack(self.endian + 'f', buffer.read(4))
         elif type in (JSONTYPE_float64, JSONTYPE_double):
             v, = struct.unpack(self.endian + 'd', buffer.read(8))
+        elif type.startswith(VARINT_PREFIX):
+            v, shift = 0, 0
+            while True:
+                byte = buffer.read(1)[0]
+                v |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80: break
+            if VARINT_RANGES[type[len(VARINT_PREFIX):]][0] < 0: v = (v >> 1) ^ -(v & 1)
+        elif type == JSONTYPE_string and self.__strings is not None:
+            offset = self.__decode_v(type=JSONTYPE_uint32, buffer=buffer)
+            v = None if offset == UINT32_MAX else self.__strings[offset]
         elif type == JSONTYPE_string:
             size = self.__decode_v(type=JSONTYPE_uint16, buffer=buffer)
             if size == UINT16_MAX: v = None
@@ -373,6 +2240,40 @@ class JsonbufSerializer(object):
             raise NotImplementedError('Not support for decoding value with {!r} type'.format(type))
         return v
 
+    def __encode_count(self, count, varint, buffer): # type: (Optional[int], bool, io.BytesIO)->None
+        if count is not None and self.report is not None: self.report.entry(self.__path)[JsonbufReport.ELEMENTS] += count
+        if varint:
+            buffer.write(_pack_varint(0 if count is None else count + 1))
+        elif count is None:
+            self.__encode_v(-1, type=JSONTYPE_int32, buffer=buffer)
+        else:
+            self.__encode_v(count, type=JSONTYPE_uint32, buffer=buffer)
+
+    def __decode_count(self, varint, buffer): # type: (bool, io.BytesIO)->int
+        if not varint:
+            size = self.__decode_v(JSONTYPE_uint32, buffer=buffer)
+        else:
+            size = self.__decode_v(VARINT_PREFIX + JSONTYPE_uint32, buffer=buffer)
+            size = size - 1 if size else UINT32_MAX
+        if size != UINT32_MAX and self.report is not None: self.report.entry(self.__path)[JsonbufReport.ELEMENTS] += size
+        return size
+
+    def __encode_key(self, key, previous, type, buffer): # type: (any, bytes, str, io.BytesIO)->None
+        # string keys of sorted dicts share prefix with previous key, which is None at start of each block
+        if type != JSONTYPE_string:
+            self.__encode_v(key, type=type, buffer=buffer)
+            return
+        shared = 0 if previous is None else min(len(p.commonprefix([key, previous])), UINT16_MAX)
+        if previous is not None: self.__encode_v(shared, type=JSONTYPE_uint16, buffer=buffer)
+        self.__encode_v(len(key) - shared, type=JSONTYPE_uint16, buffer=buffer)
+        buffer.write(key[shared:])
+
+    def __decode_key(self, previous, type, buffer): # type: (bytes, str, io.BytesIO)->any
+        if type != JSONTYPE_string: return self.__decode_v(type, buffer=buffer)
+        shared = 0 if previous is None else self.__decode_v(JSONTYPE_uint16, buffer=buffer)
+        size = self.__decode_v(JSONTYPE_uint16, buffer=buffer)
+        return previous[:shared] + buffer.read(size) if shared else buffer.read(size)
+
     @staticmethod
     def __filter(v, filters): # type: (dict, List[FilterDescriptor])->bool
         if not filters: return True
@@ -383,69 +2284,105 @@ class JsonbufSerializer(object):
     def __encode(self, schema, value, buffer): # type: (Descriptor, any, io.BytesIO)->None
         if isinstance(schema, ArrayDescriptor):
             if value is None:
-                self.__encode_v(-1, type=JSONTYPE_int32, buffer=buffer)
+                self.__encode_count(None, schema.varint, buffer=buffer)
                 return
             assert isinstance(value, list)
-            shift = buffer.tell()
-            total = len(value)
-            self.__encode_v(total, type=JSONTYPE_uint32, buffer=buffer)
+            if schema.layout == LAYOUT_ALIGNED:
+                layout = aligned_layout(schema.descriptor)
+                elements = [element for element in value if self.__filter(element, schema.filters)]
+                self.__encode_count(len(elements), schema.varint, buffer=buffer)
+                # records start at a multiple of their alignment from document start
+                buffer.write(bytes(-buffer.tell() % layout[2]))
+                for element in elements:
+                    if self.report is not None:
+                        self.__measure(schema.descriptor.name, buffer, self.__encode_class, schema.descriptor, element, buffer, layout)
+                    else:
+                        self.__encode_class(schema.descriptor, element, buffer, layout)
+                return
+            if schema.layout == LAYOUT_COLUMNAR:
+                elements = [element for element in value if self.__filter(element, schema.filters)]
+                self.__encode_count(len(elements), schema.varint, buffer=buffer)
+                self.__encode_columns(schema.descriptor, elements, buffer)
+                return
+            if schema.indexed:
+                scratch = io.BytesIO()
+                offsets = []
+                for element in value: # type: dict
+                    if not self.__filter(element, schema.filters): continue
+                    offsets.append(scratch.tell())
+                    self.__encode(schema.descriptor, value=element, buffer=scratch)
+                offsets.append(scratch.tell())
+                self.__encode_count(len(offsets) - 1, schema.varint, buffer=buffer)
+                for offset in offsets:
+                    self.__encode_v(offset, type=JSONTYPE_uint32, buffer=buffer)
+                buffer.write(scratch.getvalue())
+                return
             if schema.descriptor:
                 assert isinstance(schema.descriptor, ClassDescriptor) \
                        or isinstance(schema.descriptor, ArrayDescriptor) \
                        or isinstance(schema.descriptor, DictionaryDescriptor)
-                count = 0
+                # filtered elements are counted ahead, buffer is written forward only
+                count = sum(1 for element in value if self.__filter(element, schema.filters))
+                self.__encode_count(count, schema.varint, buffer=buffer)
                 for element in value: # type: dict
                     if not self.__filter(element, schema.filters): continue
                     self.__encode(schema.descriptor, value=element, buffer=buffer)
-                    count += 1
-                if count < total:
-                    top = buffer.tell()
-                    buffer.seek(shift)
-                    self.__encode_v(count, type=JSONTYPE_uint32, buffer=buffer)
-                    buffer.seek(top)
             else:
+                self.__encode_count(len(value), schema.varint, buffer=buffer)
                 for element in value:
-                    self.__encode_v(element, type=schema.type, buffer=buffer)
+                    self.__encode_v(element, type=_scalar_type(schema.type, schema.varint), buffer=buffer)
         elif isinstance(schema, DictionaryDescriptor):
             if value is None:
-                self.__encode_v(-1, type=JSONTYPE_int32, buffer=buffer)
+                self.__encode_count(None, schema.varint, buffer=buffer)
                 return
             assert isinstance(value, dict)
-            shift = buffer.tell()
-            total = len(value)
-            self.__encode_v(total, type=JSONTYPE_uint32, buffer=buffer)
+            if schema.sorted:
+                items = []
+                for k, v in value.items():
+                    if schema.descriptor and not self.__filter(v, schema.filters): continue
+                    k = self.__parse_key(k, type=schema.key)
+                    # utf-8 bytes sort in the same order as code points
+                    items.append((str(k).encode('utf-8') if schema.key == JSONTYPE_string else k, v))
+                items.sort(key=lambda x: x[0])
+                scratch = io.BytesIO()
+                offsets = []
+                previous = None
+                for n, (k, v) in enumerate(items):
+                    if n % SORTED_BLOCK_SIZE == 0:
+                        offsets.append(scratch.tell())
+                        previous = None
+                    self.__encode_key(k, previous, type=_scalar_type(schema.key, schema.varint), buffer=scratch)
+                    previous = k
+                    if schema.descriptor:
+                        self.__encode(schema.descriptor, value=v, buffer=scratch)
+                    else:
+                        self.__encode_v(v, type=_scalar_type(schema.type, schema.varint), buffer=scratch)
+                offsets.append(scratch.tell())
+                self.__encode_count(len(items), schema.varint, buffer=buffer)
+                for offset in offsets:
+                    self.__encode_v(offset, type=JSONTYPE_uint32, buffer=buffer)
+                buffer.write(scratch.getvalue())
+                return
             if schema.descriptor:
                 assert isinstance(schema.descriptor, ClassDescriptor) \
                        or isinstance(schema.descriptor, ArrayDescriptor) \
                        or isinstance(schema.descriptor, DictionaryDescriptor)
-                count = 0
+                count = sum(1 for v in value.values() if self.__filter(v, schema.filters))
+                self.__encode_count(count, schema.varint, buffer=buffer)
                 for k, v in value.items(): # type: str, dict
                     if not self.__filter(v, schema.filters): continue
-                    self.__encode_v(self.__parse_key(k, type=schema.key), type=schema.key, buffer=buffer)
+                    self.__encode_v(self.__parse_key(k, type=schema.key), type=_scalar_type(schema.key, schema.varint), buffer=buffer)
                     self.__encode(schema.descriptor, value=v, buffer=buffer)
-                    count += 1
-                if count < total:
-                    top = buffer.tell()
-                    buffer.seek(shift)
-                    self.__encode_v(count, type=JSONTYPE_uint32, buffer=buffer)
-                    buffer.seek(top)
             else:
+                self.__encode_count(len(value), schema.varint, buffer=buffer)
                 for k, v in value.items():
-                    self.__encode_v(self.__parse_key(k, type=schema.key), type=schema.key, buffer=buffer)
-                    self.__encode_v(v, type=schema.type, buffer=buffer)
+                    self.__encode_v(self.__parse_key(k, type=schema.key), type=_scalar_type(schema.key, schema.varint), buffer=buffer)
+                    self.__encode_v(v, type=_scalar_type(schema.type, schema.varint), buffer=buffer)
         elif isinstance(schema, ClassDescriptor):
-            if self.class_nullable:
-                if not value:
-                    self.__encode_v(0, type=JSONTYPE_bool, buffer=buffer)
-                    return
-                self.__encode_v(1, type=JSONTYPE_bool, buffer=buffer)
-            assert schema.fields and isinstance(value, dict), (schema, value)
-            for field in schema.fields:
-                field_value = value.get(field.name)
-                if field_value is None and self.enable_default:
-                    if self.verbose: print('{}:{}'.format(field.name, field.type), value)
-                    field_value = self.__get_default(type=field.type)
-                self.__encode(field, value=field_value, buffer=buffer)
+            if self.report is not None:
+                self.__measure(schema.name, buffer, self.__encode_class, schema, value, buffer)
+            else:
+                self.__encode_class(schema, value, buffer)
         elif isinstance(schema, FieldDescriptor):
             if schema.type == 'class':
                 assert isinstance(schema.descriptor, ClassDescriptor)
@@ -459,15 +2396,116 @@ class JsonbufSerializer(object):
             else:
                 if schema.enum:
                     v = self.enums[schema.enum].cases[value]
-                    self.__encode_v(v, type=schema.type, buffer=buffer)
+                    self.__encode_v(v, type=_scalar_type(schema.type, schema.varint), buffer=buffer)
                 else:
-                    self.__encode_v(value, type=schema.type, buffer=buffer)
+                    self.__encode_v(value, type=_scalar_type(schema.type, schema.varint), buffer=buffer)
+
+    def __encode_class(self, schema, value, buffer, layout=None):
+        # type: (ClassDescriptor, dict, io.BytesIO, Optional[Tuple[List[int], int, int]])->None
+        """layout of aligned_layout() writes value as a padded record, which is never null"""
+        if layout is not None:
+            start = buffer.tell()
+        elif self.class_nullable:
+            if not value:
+                self.__encode_v(0, type=JSONTYPE_bool, buffer=buffer)
+                return
+            self.__encode_v(1, type=JSONTYPE_bool, buffer=buffer)
+        assert schema.fields and isinstance(value, dict), (schema, value)
+        for n, field in enumerate(schema.fields):
+            if layout is not None: buffer.write(bytes(start + layout[0][n] - buffer.tell()))
+            field_value = value.get(field.name)
+            if self.report is None:
+                if field_value is None and self.enable_default:
+                    if self.defaults is not None: self.defaults.add('{}.{}'.format(schema.name, field.name), value)
+                    field_value = self.__get_default(type=field.type)
+                self.__encode(field, value=field_value, buffer=buffer)
+                continue
+            path = '{}.{}'.format(schema.name, field.name)
+            if field_value is None and self.enable_default:
+                if self.defaults is not None: self.defaults.add(path, value)
+                field_value = self.__get_default(type=field.type)
+                self.report.entry(path)[JsonbufReport.DEFAULTS] += 1
+            self.__measure(path, buffer, self.__encode, field, field_value, buffer)
+        if layout is not None: buffer.write(bytes(start + layout[1] - buffer.tell()))
+
+    def __encode_columns(self, schema, elements, buffer): # type: (ClassDescriptor, List[dict], io.BytesIO)->None
+        """elements of a columnar array as one column per field, which are never null"""
+        for field in schema.fields:
+            path = '{}.{}'.format(schema.name, field.name)
+            values = []
+            for element in elements:
+                assert isinstance(element, dict), (schema, element)
+                value = element.get(field.name)
+                if value is None and self.enable_default:
+                    if self.defaults is not None: self.defaults.add(path, element)
+                    if self.report is not None: self.report.entry(path)[JsonbufReport.DEFAULTS] += 1
+                    value = self.__get_default(type=field.type)
+                values.append(value)
+            if field.enum:
+                cases = self.enums[field.enum].cases
+                values = [cases[v] for v in values]
+            column = _pack_column(field.type, values, self.endian)
+            if self.report is not None:
+                self.__measure(path, buffer, buffer.write, column)
+            else:
+                buffer.write(column)
+
+    def __decode_columns(self, schema, size, buffer): # type: (ClassDescriptor, int, io.BytesIO)->List[dict]
+        columns = []
+        for field in schema.fields:
+            if self.report is not None:
+                values = self.__measure('{}.{}'.format(schema.name, field.name), buffer, self.__decode_column, field.type, size, buffer)
+            else:
+                values = self.__decode_column(field.type, size, buffer)
+            if field.enum:
+                cases = self.enums[field.enum].values
+                values = [cases[v] for v in values]
+            columns.append(values)
+        names = [f.name for f in schema.fields]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def __decode_column(self, type, size, buffer): # type: (str, int, io.BytesIO)->list
+        if type == JSONTYPE_string:
+            # sizes tell how many bytes of strings follow them
+            data = buffer.read(2 * size)
+            data += buffer.read(_skip_column(type, size, data, 0, self.endian) - len(data))
+        else:
+            data = buffer.read(_skip_column(type, size, None, 0))
+        return _unpack_column(type, size, data, 0, self.endian)[0]
+
+    def __decode_class(self, schema, buffer, layout=None):
+        # type: (ClassDescriptor, io.BytesIO, Optional[Tuple[List[int], int, int]])->Optional[dict]
+        if layout is not None:
+            start = buffer.tell()
+        elif self.class_nullable:
+            if self.__decode_v(JSONTYPE_bool, buffer=buffer) == 0: return None
+        obj = {}
+        assert schema.fields
+        for n, field in enumerate(schema.fields):
+            if layout is not None: buffer.read(start + layout[0][n] - buffer.tell())
+            if self.report is None:
+                obj[field.name] = self.__decode(field, buffer=buffer)
+            else:
+                obj[field.name] = self.__measure('{}.{}'.format(schema.name, field.name), buffer, self.__decode, field, buffer)
+        if layout is not None: buffer.read(start + layout[1] - buffer.tell())
+        return obj
 
     def __decode(self, schema, buffer):
         if isinstance(schema, ArrayDescriptor):
-            size = self.__decode_v(JSONTYPE_uint32, buffer=buffer)
+            size = self.__decode_count(schema.varint, buffer=buffer)
             if size == UINT32_MAX: return None
+            if schema.indexed: buffer.read(4 * (size + 1))
             elements = []
+            if schema.layout == LAYOUT_ALIGNED:
+                layout = aligned_layout(schema.descriptor)
+                buffer.read(-buffer.tell() % layout[2])
+                for _ in range(size):
+                    if self.report is not None:
+                        elements.append(self.__measure(schema.descriptor.name, buffer, self.__decode_class, schema.descriptor, buffer, layout))
+                    else:
+                        elements.append(self.__decode_class(schema.descriptor, buffer, layout))
+                return elements
+            if schema.layout == LAYOUT_COLUMNAR: return self.__decode_columns(schema.descriptor, size, buffer)
             if schema.descriptor:
                 assert isinstance(schema.descriptor, ClassDescriptor) \
                        or isinstance(schema.descriptor, ArrayDescriptor) \
@@ -476,32 +2514,38 @@ class JsonbufSerializer(object):
                     elements.append(self.__decode(schema.descriptor, buffer=buffer))
             else:
                 for _ in range(size):
-                    elements.append(self.__decode_v(schema.type, buffer=buffer))
+                    elements.append(self.__decode_v(_scalar_type(schema.type, schema.varint), buffer=buffer))
             return elements
         elif isinstance(schema, DictionaryDescriptor):
-            size = self.__decode_v(JSONTYPE_uint32, buffer=buffer)
+            size = self.__decode_count(schema.varint, buffer=buffer)
             if size == UINT32_MAX: return None
             data = {}
+            if schema.sorted:
+                buffer.read(4 * ((size + SORTED_BLOCK_SIZE - 1) // SORTED_BLOCK_SIZE + 1))
+                key = None
+                for n in range(size):
+                    key = self.__decode_key(key if n % SORTED_BLOCK_SIZE else None, type=_scalar_type(schema.key, schema.varint), buffer=buffer)
+                    if schema.descriptor:
+                        value = self.__decode(schema.descriptor, buffer=buffer)
+                    else:
+                        value = self.__decode_v(_scalar_type(schema.type, schema.varint), buffer=buffer)
+                    data[key.decode('utf-8') if schema.key == JSONTYPE_string else key] = value
+                return data
             if schema.descriptor:
                 assert isinstance(schema.descriptor, ClassDescriptor) \
                        or isinstance(schema.descriptor, ArrayDescriptor) \
                        or isinstance(schema.descriptor, DictionaryDescriptor)
                 for _ in range(size):
-                    key = self.__decode_v(schema.key, buffer=buffer)
+                    key = self.__decode_v(_scalar_type(schema.key, schema.varint), buffer=buffer)
                     data[key] = self.__decode(schema.descriptor, buffer=buffer)
             else:
                 for _ in range(size):
-                    key = self.__decode_v(schema.key, buffer=buffer)
-                    data[key] = self.__decode_v(schema.type, buffer=buffer)
+                    key = self.__decode_v(_scalar_type(schema.key, schema.varint), buffer=buffer)
+                    data[key] = self.__decode_v(_scalar_type(schema.type, schema.varint), buffer=buffer)
             return data
         elif isinstance(schema, ClassDescriptor):
-            if self.class_nullable:
-                if self.__decode_v(JSONTYPE_bool, buffer=buffer) == 0: return None
-            obj = {}
-            assert schema.fields
-            for field in schema.fields:
-                obj[field.name] = self.__decode(field, buffer=buffer)
-            return obj
+            if self.report is not None: return self.__measure(schema.name, buffer, self.__decode_class, schema, buffer)
+            return self.__decode_class(schema, buffer)
         elif isinstance(schema, FieldDescriptor):
             if schema.type == 'array':
                 assert isinstance(schema.descriptor, ArrayDescriptor)
@@ -513,9 +2557,630 @@ class JsonbufSerializer(object):
                 assert isinstance(schema.descriptor, DictionaryDescriptor)
                 return self.__decode(schema.descriptor, buffer=buffer)
             else:
-                v = self.__decode_v(schema.type, buffer=buffer)
+                v = self.__decode_v(_scalar_type(schema.type, schema.varint), buffer=buffer)
                 return self.enums[schema.enum].values[v] if schema.enum else v
 
+class JsonbufTokenizer(object):
+    """
+    Pull tokenizer over JSON text read in chunks, so that a document never has to fit in memory.
+    next() returns (kind, value), kind is the character of {}[]:, punctuations, 's' for strings,
+    'v' for numbers, true, false and null, or '' at the end of text.
+    """
+    __pattern = re.compile(r'[ \t\n\r]*(?:([{}\[\]:,])|(")|(-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?)|(true|false|null))')
+    __literals = {'true': True, 'false': False, 'null': None}
+
+    def __init__(self, fp, chunk_size=1 << 16): # type: (io.TextIOBase, int)->None
+        self.__fp = fp
+        self.__chunk_size = chunk_size
+        self.__text = ''
+        self.__position = 0
+        self.__shift = 0
+        self.__eof = False
+
+    @property
+    def position(self): return self.__shift + self.__position
+
+    def __fill(self): # type: ()->bool
+        if self.__eof: return False
+        chunk = self.__fp.read(self.__chunk_size)
+        if not chunk:
+            self.__eof = True
+            return False
+        self.__shift += self.__position
+        self.__text = self.__text[self.__position:] + chunk
+        self.__position = 0
+        return True
+
+    def next(self): # type: ()->Tuple[str, any]
+        while True:
+            text = self.__text
+            match = self.__pattern.match(text, self.__position)
+            # a token near the end of text may continue in next chunk, e.g. '1.' or '1e-' before digits
+            if (match is None or match.end() + 2 >= len(text)) and self.__fill(): continue
+            if match is None:
+                if text[self.__position:].strip(): raise ValueError('Expecting value at {}'.format(self.position))
+                self.__position = len(text)
+                return '', None
+            punctuation, quote, number, fraction, exponent, literal = match.groups()
+            if quote:
+                try:
+                    value, end = json.decoder.scanstring(text, match.end())
+                except ValueError:
+                    if self.__fill(): continue
+                    raise
+                self.__position = end
+                return 's', value
+            self.__position = match.end()
+            if punctuation: return punctuation, None
+            if literal: return 'v', self.__literals[literal]
+            return 'v', float(number) if fraction or exponent else int(number)
+
+    def __expect(self, kinds): # type: (str)->Tuple[str, any]
+        token = self.next()
+        if token[0] not in kinds or not token[0]:
+            raise ValueError('Expecting {!r} at {}'.format(kinds, self.position))
+        return token
+
+    def iter_array(self): # type: ()->Iterator[Tuple[str, any]]
+        """element tokens of an array whose [ is consumed, each element must be consumed before resuming"""
+        token = self.next()
+        if token[0] == ']': return
+        while True:
+            yield token
+            if self.__expect(',]')[0] == ']': return
+            token = self.next()
+
+    def iter_object(self): # type: ()->Iterator[Tuple[str, Tuple[str, any]]]
+        """(key, value token) of an object whose { is consumed, each value must be consumed before resuming"""
+        token = self.__expect('s}')
+        if token[0] == '}': return
+        while True:
+            self.__expect(':')
+            yield token[1], self.next()
+            if self.__expect(',}')[0] == '}': return
+            token = self.__expect('s')
+
+    def read_value(self, token): # type: (Tuple[str, any])->any
+        kind, value = token
+        if kind in ('s', 'v'): return value
+        if kind == '[': return [self.read_value(t) for t in self.iter_array()]
+        if kind == '{': return dict((k, self.read_value(t)) for k, t in self.iter_object())
+        raise ValueError('Expecting value at {}'.format(self.position))
+
+    def skip_value(self, token): # type: (Tuple[str, any])->None
+        if token[0] not in ('[', '{'): return
+        depth = 1
+        while depth:
+            kind = self.next()[0]
+            if kind in ('[', '{'): depth += 1
+            elif kind in (']', '}'): depth -= 1
+            elif not kind: raise ValueError('Unterminated value at {}'.format(self.position))
+
+class JsonbufStreamEncoder(object):
+    """
+    Encodes JSON text from a stream without loading the document, output is identical to JsonbufSerializer for
+    schemas without a string pool. Pooled strings enter the pool in arrival order rather than schema order, so
+    pool layout and offsets may differ while output keeps its size and decodes to the same values.
+    Values are written as tokens arrive and counts of arrays and dicts are back-patched, output that can not
+    seek, like pipes and sockets, is staged in a spooled temporary file and copied over at the end. Fields
+    arriving ahead of schema order, filtered elements and sorted dict entries are staged as encoded bytes
+    until they can be placed, indexed arrays and containers with varint counts, which can not be back-patched
+    in place, are staged in spooled temporary files. Aligned arrays are padded by output position, so fields
+    holding them are staged as values and encoded once placed, and output starts in a spooled file as well.
+    Columnar arrays are read whole as values, their first column needs every element.
+    """
+    def __init__(self, schema, class_nullable=True, enable_default=True, verbose=True, enums=None):
+        self.schema = schema # type: Descriptor
+        self.class_nullable = class_nullable
+        self.enable_default = enable_default
+        self.verbose = verbose
+        self.codec = JsonbufCodec.compile(schema, class_nullable=class_nullable, enable_default=enable_default,
+                                          verbose=verbose, enums=enums)
+        self.defaults = JsonbufDefaults() if verbose else None # type: Optional[JsonbufDefaults]
+        self.__indices = {} # type: Dict[ClassDescriptor, Dict[str, int]]
+        self.__aligned = {} # type: Dict[Descriptor, bool]
+        self.__records = {} # type: Dict[ClassDescriptor, Callable[[dict, io.BytesIO], None]]
+        self.__pool = None # type: Optional[JsonbufStringPool]
+
+    def encode(self, fp, buffer): # type: (io.TextIOBase, io.BytesIO)->None
+        # values staged as values are encoded by codec, which counts defaults there and pools strings
+        with self.codec.session(self.defaults) as self.__pool:
+            try:
+                self.__encode_document(fp, buffer)
+            finally:
+                self.__pool = None
+
+    def __encode_document(self, fp, buffer): # type: (io.TextIOBase, io.BytesIO)->None
+        pool = self.__pool
+        if pool is not None or not buffer.seekable() or self.__has_aligned(self.schema):
+            # string pool goes ahead of root value but is complete only after encoding it
+            with tempfile.SpooledTemporaryFile(max_size=1 << 24) as scratch:
+                self.__encode_root(fp, scratch)
+                if pool is not None: pool.write(buffer)
+                scratch.seek(0)
+                shutil.copyfileobj(scratch, buffer)
+            return
+        self.__encode_root(fp, buffer)
+
+    def __encode_root(self, fp, buffer): # type: (io.TextIOBase, io.BytesIO)->None
+        tokens = JsonbufTokenizer(fp)
+        self.__encode(self.schema, tokens, tokens.next(), buffer)
+        if tokens.next()[0]: raise ValueError('Extra data at {}'.format(tokens.position))
+
+    @staticmethod
+    def __get_default(type): # type: (str)->any
+        if type == JSONTYPE_bool: return False
+        if type.startswith('int'): return -1
+        if type.startswith('uint'): return 0
+        if type == JSONTYPE_byte: return 0
+        if type in (JSONTYPE_ushort, JSONTYPE_ulong): return 0
+        if type in (JSONTYPE_short, JSONTYPE_long): return -1
+        if type == JSONTYPE_double or type.startswith('float'): return 0.0
+        return None
+
+    @staticmethod
+    def __accept(capture, filters): # type: (dict, List[FilterDescriptor])->bool
+        for f in filters:
+            if capture.get(f.name) == f.value: return True
+        return False
+
+    def __encode(self, schema, tokens, token, buffer, capture=None):
+        # type: (Union[Descriptor, str], JsonbufTokenizer, Tuple[str, any], io.BytesIO, dict)->None
+        if isinstance(schema, FieldDescriptor) and schema.descriptor:
+            self.__encode(schema.descriptor, tokens, token, buffer, capture)
+        elif isinstance(schema, str) or isinstance(schema, FieldDescriptor) or token == ('v', None):
+            self.codec.encoder(schema)(tokens.read_value(token), buffer)
+        elif isinstance(schema, ClassDescriptor):
+            self.__encode_class(schema, tokens, token, buffer, capture)
+        elif isinstance(schema, ArrayDescriptor):
+            self.__encode_array(schema, tokens, token, buffer)
+        elif isinstance(schema, DictionaryDescriptor):
+            self.__encode_dict(schema, tokens, token, buffer)
+        else:
+            raise NotImplementedError('<{}/>'.format(schema.tag))
+
+    def __encode_field(self, schema, field, tokens, token, buffer, value=None):
+        # type: (ClassDescriptor, FieldDescriptor, JsonbufTokenizer, Tuple[str, any], io.BytesIO, any)->None
+        # token is None for missing fields or values already read into value
+        if token is not None and token != ('v', None):
+            self.__encode(field, tokens, token, buffer)
+            return
+        if value is None and self.enable_default:
+            # records are never whole in memory here, so no samples
+            if self.defaults is not None: self.defaults.add('{}.{}'.format(schema.name, field.name))
+            value = self.__get_default(type=field.type)
+        self.codec.encoder(field)(value, buffer)
+
+    def __has_aligned(self, schema): # type: (Descriptor)->bool
+        if schema not in self.__aligned: self.__aligned[schema] = _has_aligned(schema)
+        return self.__aligned[schema]
+
+    @staticmethod
+    def __place(staged, n, buffer): # type: (dict, int, io.BytesIO)->None
+        value = staged.pop(n)
+        if callable(value):
+            value(buffer)
+        else:
+            buffer.write(value)
+
+    def __encode_class(self, schema, tokens, token, buffer, capture):
+        # type: (ClassDescriptor, JsonbufTokenizer, Tuple[str, any], io.BytesIO, dict)->None
+        if token[0] != '{': raise ValueError('Expecting object at {}'.format(tokens.position))
+        entries = tokens.iter_object()
+        entry = next(entries, None)
+        if self.class_nullable:
+            if entry is None:
+                buffer.write(b'\x00')
+                return
+            buffer.write(b'\x01')
+        fields = schema.fields
+        assert fields
+        if schema not in self.__indices: self.__indices[schema] = dict((f.name, n) for n, f in enumerate(fields))
+        index = self.__indices[schema]
+        staged = {} # type: Dict[int, Union[bytes, Callable[[io.BytesIO], None]]]
+        position = 0
+        while entry is not None:
+            name, token = entry
+            value = None
+            if capture is not None and name in capture:
+                value = capture[name] = tokens.read_value(token)
+                token = None
+            n = index.get(name)
+            if n is None or n < position or n in staged:
+                if token is not None: tokens.skip_value(token)
+            elif n == position:
+                self.__encode_field(schema, fields[n], tokens, token, buffer, value)
+                position += 1
+                while position in staged:
+                    self.__place(staged, position, buffer)
+                    position += 1
+            elif self.__has_aligned(fields[n]):
+                if token is not None: value = tokens.read_value(token)
+                staged[n] = lambda buffer, field=fields[n], value=value: self.__encode_field(schema, field, tokens, None, buffer, value)
+            else:
+                scratch = io.BytesIO()
+                self.__encode_field(schema, fields[n], tokens, token, scratch, value)
+                staged[n] = scratch.getvalue()
+            entry = next(entries, None)
+        for n in range(position, len(fields)):
+            if n in staged:
+                self.__place(staged, n, buffer)
+            else:
+                self.__encode_field(schema, fields[n], tokens, None, buffer)
+
+    def __encode_element(self, schema, tokens, token, buffer):
+        # type: (Union[ArrayDescriptor, DictionaryDescriptor], JsonbufTokenizer, Tuple[str, any], io.BytesIO)->bool
+        # filters only apply to class elements as in JsonbufSerializer, rejected elements leave buffer untouched
+        if not schema.descriptor:
+            self.__encode(_scalar_type(schema.type, schema.varint), tokens, token, buffer)
+            return True
+        if not schema.filters:
+            self.__encode(schema.descriptor, tokens, token, buffer)
+            return True
+        capture = dict((f.name, None) for f in schema.filters)
+        scratch = io.BytesIO()
+        pool = self.__pool
+        mark = pool.mark() if pool is not None else None
+        self.__encode(schema.descriptor, tokens, token, scratch, capture)
+        if not self.__accept(capture, schema.filters):
+            if pool is not None: pool.rollback(mark)
+            return False
+        buffer.write(scratch.getvalue())
+        return True
+
+    def __encode_array(self, schema, tokens, token, buffer):
+        # type: (ArrayDescriptor, JsonbufTokenizer, Tuple[str, any], io.BytesIO)->None
+        if token[0] != '[': raise ValueError('Expecting array at {}'.format(tokens.position))
+        pack_count = self.codec.count_encoder(schema)
+        count = 0
+        if schema.layout == LAYOUT_ALIGNED:
+            self.__encode_records(schema, tokens, buffer)
+            return
+        if schema.layout == LAYOUT_COLUMNAR:
+            # no column is complete before the last element, so elements are read as values
+            elements = [tokens.read_value(token) for token in tokens.iter_array()]
+            if schema.filters: elements = [element for element in elements if self.__accept(element, schema.filters)]
+            buffer.write(pack_count(len(elements)))
+            self.codec.column_encoder(schema.descriptor)(elements, buffer)
+            return
+        if schema.indexed or schema.varint:
+            with tempfile.SpooledTemporaryFile(max_size=1 << 24) as scratch:
+                offsets = []
+                for token in tokens.iter_array():
+                    offset = scratch.tell()
+                    if not self.__encode_element(schema, tokens, token, scratch): continue
+                    if schema.indexed: offsets.append(offset)
+                    count += 1
+                buffer.write(pack_count(count))
+                if schema.indexed:
+                    offsets.append(scratch.tell())
+                    buffer.write(struct.pack('{}{}I'.format(self.codec.endian, len(offsets)), *offsets))
+                scratch.seek(0)
+                shutil.copyfileobj(scratch, buffer)
+            return
+        shift = buffer.tell()
+        buffer.write(pack_count(0))
+        for token in tokens.iter_array():
+            if self.__encode_element(schema, tokens, token, buffer): count += 1
+        if count:
+            top = buffer.tell()
+            buffer.seek(shift)
+            buffer.write(pack_count(count))
+            buffer.seek(top)
+
+    def __encode_records(self, schema, tokens, buffer): # type: (ArrayDescriptor, JsonbufTokenizer, io.BytesIO)->None
+        """records of an aligned array, which only start once count and padding ahead of them are written"""
+        cls = schema.descriptor
+        if cls not in self.__records: self.__records[cls] = self.codec.record_encoder(cls)
+        record_encoder = self.__records[cls]
+        count = 0
+        with tempfile.SpooledTemporaryFile(max_size=1 << 24) as scratch:
+            for token in tokens.iter_array():
+                element = tokens.read_value(token)
+                if schema.filters and not self.__accept(element, schema.filters): continue
+                record_encoder(element, scratch)
+                count += 1
+            buffer.write(self.codec.count_encoder(schema)(count))
+            buffer.write(bytes(-buffer.tell() % aligned_layout(cls)[2]))
+            scratch.seek(0)
+            shutil.copyfileobj(scratch, buffer)
+
+    def __encode_dict(self, schema, tokens, token, buffer):
+        # type: (DictionaryDescriptor, JsonbufTokenizer, Tuple[str, any], io.BytesIO)->None
+        if token[0] != '{': raise ValueError('Expecting object at {}'.format(tokens.position))
+        pack_count = self.codec.count_encoder(schema)
+        if schema.sorted:
+            to_raw, key_encoder = self.codec.key_encoder(_scalar_type(schema.key, schema.varint))
+            items = []
+            for key, token in tokens.iter_object():
+                scratch = io.BytesIO()
+                if self.__encode_element(schema, tokens, token, scratch): items.append((to_raw(key), scratch.getvalue()))
+            items.sort(key=operator.itemgetter(0))
+            entries = io.BytesIO()
+            offsets = []
+            previous = None
+            for n, (raw, value) in enumerate(items):
+                if n % SORTED_BLOCK_SIZE == 0:
+                    offsets.append(entries.tell())
+                    previous = None
+                key_encoder(raw, previous, entries)
+                previous = raw
+                entries.write(value)
+            offsets.append(entries.tell())
+            buffer.write(pack_count(len(items)))
+            buffer.write(struct.pack('{}{}I'.format(self.codec.endian, len(offsets)), *offsets))
+            buffer.write(entries.getvalue())
+            return
+        if schema.varint:
+            with tempfile.SpooledTemporaryFile(max_size=1 << 24) as scratch:
+                count = self.__encode_entries(schema, tokens, scratch)
+                buffer.write(pack_count(count))
+                scratch.seek(0)
+                shutil.copyfileobj(scratch, buffer)
+            return
+        shift = buffer.tell()
+        buffer.write(pack_count(0))
+        count = self.__encode_entries(schema, tokens, buffer)
+        if count:
+            top = buffer.tell()
+            buffer.seek(shift)
+            buffer.write(pack_count(count))
+            buffer.seek(top)
+
+    def __encode_entries(self, schema, tokens, buffer): # type: (DictionaryDescriptor, JsonbufTokenizer, io.BytesIO)->int
+        """entries of an unsorted dict, returns number of them written"""
+        count = 0
+        key_encoder = self.codec.encoder(_scalar_type(schema.key, schema.varint))
+        to_raw = str if schema.key == JSONTYPE_string else self.codec.key_encoder(_scalar_type(schema.key, schema.varint))[0]
+        for key, token in tokens.iter_object():
+            if schema.descriptor and schema.filters:
+                scratch = io.BytesIO()
+                if not self.__encode_element(schema, tokens, token, scratch): continue
+                key_encoder(to_raw(key), buffer)
+                buffer.write(scratch.getvalue())
+            else:
+                key_encoder(to_raw(key), buffer)
+                self.__encode_element(schema, tokens, token, buffer)
+            count += 1
+        return count
+
+class JsonbufStreamDecoder(object):
+    """
+    Writes encoded data out as JSON text while walking the schema, so memory stays bounded by the widest dict
+    when sorting keys and constant otherwise. Formatting follows json.dump with the same indent, sort_keys,
+    ensure_ascii and separators, that is decode() output equals json.dumps() of the decoded value.
+    """
+    def __init__(self, schema, class_nullable=True, enums=None, indent=None, sort_keys=False, ensure_ascii=True, separators=None, frame=False):
+        self.schema = schema # type: Descriptor
+        self.indent = ' ' * indent if isinstance(indent, int) else indent # type: Optional[str]
+        self.sort_keys = sort_keys
+        # whether data is framed by JsonbufFrameWriter, which is read through a JsonbufFrameView
+        self.frame = frame
+        self.codec = JsonbufCodec.compile(schema, class_nullable=class_nullable, verbose=False, enums=enums, framed=bool(frame))
+        if separators is None: separators = (', ', ': ') if indent is None else (',', ': ')
+        self.__item_separator, self.__key_separator = separators
+        self.__dumps = json.JSONEncoder(ensure_ascii=ensure_ascii).encode
+        self.__decoders = {} # type: Dict[Union[Descriptor, str], Callable[[bytes, int], Tuple[any, int]]]
+        self.__names = {} # type: Dict[ClassDescriptor, List[int]]
+        self.__layouts = {} # type: Dict[ClassDescriptor, Tuple[List[int], int, int]]
+        self.__chunks = [] # type: List[str]
+        self.__size = 0
+        self.__fp = None # type: io.TextIOBase
+
+    def decode(self, data, fp): # type: (Union[bytes, memoryview, mmap.mmap], io.TextIOBase)->None
+        """JSON text of the root value"""
+        if self.frame: data = JsonbufFrameView(data)
+        self.__fp = fp
+        self.__emit(self.schema, data, self.codec.root_offset(data), 0)
+        self.__flush()
+
+    def decode_lines(self, data, fp): # type: (Union[bytes, memoryview, mmap.mmap], io.TextIOBase)->int
+        """
+        NDJSON with one line per element of the top-level array, that is the root or the first array or dict
+        reached through class fields. Dict entries are written as single key objects, returns number of lines.
+        """
+        if self.frame: data = JsonbufFrameView(data)
+        schema, offset = self.__records(self.schema, data, self.codec.root_offset(data))
+        if schema is None: return 0
+        indent, self.indent = self.indent, None
+        self.__fp = fp
+        lines = [0]
+        aligned = isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_ALIGNED
+        columnar = isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_COLUMNAR
+        def visit(element, offset, key):
+            if key is not None: self.__write('{{{}{}'.format(self.__dumps(self.__key(key)), self.__key_separator))
+            if columnar:
+                self.__emit_row(element, offset, 0)
+            else:
+                offset = self.__emit(element, data, offset, 0, aligned)
+            self.__write('}\n' if key is not None else '\n')
+            lines[0] += 1
+            if lines[0] == 1: self.__flush()
+            return offset
+        try:
+            self.__each(schema, data, offset, visit)
+            self.__flush()
+        finally:
+            self.indent = indent
+        return lines[0]
+
+    def __write(self, text): # type: (str)->None
+        self.__chunks.append(text)
+        self.__size += len(text)
+        if self.__size >= 1 << 16: self.__flush()
+
+    def __flush(self):
+        if self.__chunks: self.__fp.write(''.join(self.__chunks))
+        self.__chunks, self.__size = [], 0
+
+    def __decoder(self, schema): # type: (Union[Descriptor, str])->Callable[[bytes, int], Tuple[any, int]]
+        if schema not in self.__decoders: self.__decoders[schema] = self.codec.decoder(schema)
+        return self.__decoders[schema]
+
+    def __layout(self, schema): # type: (ClassDescriptor)->Tuple[List[int], int, int]
+        if schema not in self.__layouts: self.__layouts[schema] = aligned_layout(schema)
+        return self.__layouts[schema]
+
+    @staticmethod
+    def __key(key): # type: (any)->str
+        # same conversion as json.dumps applies to dict keys
+        if isinstance(key, str): return key
+        if key is True: return 'true'
+        if key is False: return 'false'
+        if isinstance(key, float): return float.__repr__(key)
+        return str(key)
+
+    def __records(self, schema, data, offset): # type: (Descriptor, bytes, int)->Tuple[Optional[Descriptor], int]
+        if isinstance(schema, FieldDescriptor):
+            if not schema.descriptor: return None, offset
+            return self.__records(schema.descriptor, data, offset)
+        if isinstance(schema, ClassDescriptor):
+            if self.codec.class_nullable:
+                if data[offset] == 0: return None, offset
+                offset += 1
+            for field in schema.fields:
+                if field.descriptor:
+                    records, position = self.__records(field, data, offset)
+                    if records is not None: return records, position
+                offset = self.codec.skipper(field)(data, offset)
+            return None, offset
+        return schema, offset
+
+    def __each(self, schema, data, offset, visit):
+        # type: (Union[ArrayDescriptor, DictionaryDescriptor], bytes, int, Callable[[any, int, any], int])->Optional[int]
+        """
+        visit(element schema, offset, key) returns offset past the element, None for null containers. elements of
+        columnar arrays are decoded up front, so visit gets each as a dict in place of offset and its result is unused
+        """
+        count, offset = self.codec.count_decoder(schema)(data, offset)
+        if count == UINT32_MAX: return None
+        element = schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint)
+        if isinstance(schema, ArrayDescriptor) and schema.layout == LAYOUT_COLUMNAR:
+            rows, offset = self.codec.column_decoder(element)(data, offset, count)
+            for row in rows: visit(element, row, None)
+        elif isinstance(schema, ArrayDescriptor):
+            if schema.indexed: offset += 4 * (count + 1)
+            if schema.layout == LAYOUT_ALIGNED: offset += -offset % self.__layout(schema.descriptor)[2]
+            for _ in range(count):
+                offset = visit(element, offset, None)
+        elif schema.sorted:
+            decode_key = self.codec.key_decoder(_scalar_type(schema.key, schema.varint))
+            offset += 4 * ((count + SORTED_BLOCK_SIZE - 1) // SORTED_BLOCK_SIZE + 1)
+            raw = None
+            for n in range(count):
+                key, raw, offset = decode_key(data, offset, raw if n % SORTED_BLOCK_SIZE else None)
+                offset = visit(element, offset, key)
+        else:
+            decode_key = self.__decoder(_scalar_type(schema.key, schema.varint))
+            for _ in range(count):
+                key, offset = decode_key(data, offset)
+                offset = visit(element, offset, key)
+        return offset
+
+    def __open(self, bracket, level): # type: (str, int)->str
+        """separator between items of a container being opened"""
+        self.__write(bracket)
+        if self.indent is None: return self.__item_separator
+        separator = self.__item_separator + '\n' + self.indent * (level + 1)
+        self.__write(separator[len(self.__item_separator):])
+        return separator
+
+    def __close(self, bracket, level): # type: (str, int)->None
+        if self.indent is not None: self.__write('\n' + self.indent * level)
+        self.__write(bracket)
+
+    def __emit_row(self, schema, row, level): # type: (ClassDescriptor, dict, int)->None
+        """element of a columnar array, which is decoded already"""
+        fields = schema.fields
+        if self.sort_keys:
+            if schema not in self.__names: self.__names[schema] = sorted(range(len(fields)), key=lambda n: fields[n].name)
+            fields = [fields[n] for n in self.__names[schema]]
+        separator = self.__open('{', level)
+        for n, field in enumerate(fields):
+            if n: self.__write(separator)
+            self.__write(self.__dumps(field.name) + self.__key_separator + self.__dumps(row[field.name]))
+        self.__close('}', level)
+
+    def __emit(self, schema, data, offset, level, aligned=False): # type: (Union[Descriptor, str], bytes, int, int, bool)->int
+        """aligned emits a class as padded record of an aligned array"""
+        if isinstance(schema, FieldDescriptor) and schema.descriptor:
+            return self.__emit(schema.descriptor, data, offset, level)
+        if isinstance(schema, str) or isinstance(schema, FieldDescriptor):
+            value, offset = self.__decoder(schema)(data, offset)
+            self.__write(self.__dumps(value))
+            return offset
+        if isinstance(schema, ClassDescriptor):
+            offsets = None # type: Optional[List[int]]
+            if aligned:
+                record, size, _ = self.__layout(schema)
+                offsets = [offset + shift for shift in record] + [offset + size]
+            elif self.codec.class_nullable:
+                if data[offset] == 0:
+                    self.__write('null')
+                    return offset + 1
+                offset += 1
+            fields = schema.fields
+            if not fields:
+                self.__write('{}')
+                return offset
+            separator = self.__open('{', level)
+            if self.sort_keys:
+                if schema not in self.__names: self.__names[schema] = sorted(range(len(fields)), key=lambda n: fields[n].name)
+                if offsets is None:
+                    _, _, skippers = self.codec.layout(schema)
+                    offsets = [offset]
+                    for skip in skippers: offsets.append(skip(data, offsets[-1]))
+                for n, index in enumerate(self.__names[schema]):
+                    if n: self.__write(separator)
+                    self.__write(self.__dumps(fields[index].name) + self.__key_separator)
+                    self.__emit(fields[index], data, offsets[index], level + 1)
+                offset = offsets[-1]
+            else:
+                for n, field in enumerate(fields):
+                    if n: self.__write(separator)
+                    self.__write(self.__dumps(field.name) + self.__key_separator)
+                    offset = self.__emit(field, data, offset if offsets is None else offsets[n], level + 1)
+                if offsets is not None: offset = offsets[-1]
+            self.__close('}', level)
+            return offset
+        if isinstance(schema, ArrayDescriptor) or isinstance(schema, DictionaryDescriptor):
+            count, position = self.codec.count_decoder(schema)(data, offset)
+            if count == UINT32_MAX:
+                self.__write('null')
+                return position
+            if count == 0:
+                self.__write('[]' if isinstance(schema, ArrayDescriptor) else '{}')
+                return self.__each(schema, data, offset, None)
+            dictionary = isinstance(schema, DictionaryDescriptor)
+            separator = self.__open('{' if dictionary else '[', level)
+            if dictionary and self.sort_keys:
+                entries = []
+                element = schema.descriptor if schema.descriptor else _scalar_type(schema.type, schema.varint)
+                skip = self.codec.skipper(element)
+                def visit(element, position, key):
+                    entries.append((key, position))
+                    return skip(data, position)
+                offset = self.__each(schema, data, offset, visit)
+                entries.sort(key=operator.itemgetter(0))
+                for n, (key, position) in enumerate(entries):
+                    if n: self.__write(separator)
+                    self.__write(self.__dumps(self.__key(key)) + self.__key_separator)
+                    self.__emit(element, data, position, level + 1)
+            else:
+                first = [True]
+                aligned = not dictionary and schema.layout == LAYOUT_ALIGNED
+                columnar = not dictionary and schema.layout == LAYOUT_COLUMNAR
+                def visit(element, position, key):
+                    if not first[0]: self.__write(separator)
+                    first[0] = False
+                    if dictionary: self.__write(self.__dumps(self.__key(key)) + self.__key_separator)
+                    if columnar: return self.__emit_row(element, position, level + 1)
+                    return self.__emit(element, data, position, level + 1, aligned)
+                offset = self.__each(schema, data, offset, visit)
+            self.__close('}' if dictionary else ']', level)
+            return offset
+        raise NotImplementedError('<{}/>'.format(schema.tag))
+
 class CodeWriter(object):
     def __init__(self, filename, verbose=False):
         self.filename = filename # type: str
@@ -537,6 +3202,7 @@ class CodeWriter(object):
 class Commands(object):
     serialize = 'serialize'
     deserialize = 'deserialize'
+    batch = 'batch'
 
     @classmethod
     def get_choices(cls):
@@ -545,51 +3211,214 @@ class Commands(object):
             if k == v: choices.append(v)
         return choices
 
+def resolve_schema(filename): # type: (str)->str
+    """schemas/{name}.xml next to this script for data file {name}.json or {name}.bytes, trailing _ of name ignored"""
+    name = re.sub(r'\.[^.]+$', '', p.basename(filename))
+    script_path = p.dirname(p.realpath(p.abspath(__file__)))
+    return p.join(script_path, 'schemas/{}.xml'.format(re.sub(r'_+$', '', name)))
+
+def batch_inputs(patterns): # type: (List[str])->List[Tuple[str, str]]
+    """
+    json and bytes files matched by paths, directories searched recursively, or glob patterns, each paired with
+    its path relative to the directory or the part of the pattern before any wildcard
+    """
+    filenames, inputs = set(), []
+    for pattern in patterns:
+        if p.isdir(pattern):
+            root = pattern
+            matches = glob.glob(p.join(pattern, '**', '*.json'), recursive=True) + glob.glob(p.join(pattern, '**', '*.bytes'), recursive=True)
+        else:
+            root = p.dirname(re.split(r'[*?[]', pattern)[0])
+            matches = glob.glob(pattern, recursive=True)
+        for filename in sorted(matches):
+            if not re.search(r'\.(json|bytes)$', filename) or filename in filenames: continue
+            filenames.add(filename)
+            inputs.append((filename, p.relpath(filename, root or '.')))
+    return inputs
+
+def batch_targets(inputs, output): # type: (List[Tuple[str, str]], str)->Tuple[List[Tuple[str, str]], List[str]]
+    """
+    pairs every input with its output file, json and bytes swapped, mirrored under output by relative path.
+    Inputs whose targets are inputs too are skipped and returned apart, e.g. bytes written by an earlier run
+    into the input directory, targets shared by more inputs fail before anything is converted.
+    """
+    sources = {p.realpath(filename) for filename, _ in inputs}
+    pairs, skipped, owners = [], [], {} # type: List[Tuple[str, str]], List[str], Dict[str, str]
+    for filename, relative in inputs:
+        target = p.join(output, re.sub(r'\.[^.]+$', '.bytes' if filename.endswith('.json') else '.json', relative))
+        if p.realpath(target) in sources:
+            skipped.append(filename)
+            continue
+        owner = owners.setdefault(p.realpath(target), filename)
+        assert owner == filename, 'inputs {} and {} both convert into {}'.format(owner, filename, target)
+        pairs.append((filename, target))
+    return pairs, skipped
+
+# compiled once per schema in each worker process
+__batch_serializers = {} # type: Dict[tuple, JsonbufSerializer]
+
+def batch_convert(filename, target, schema_path=None, class_nullable=False, frame=None, block_size=FRAME_BLOCK_SIZE):
+    # type: (str, str, str, bool, str, int)->Tuple[int, int]
+    """encodes {name}.json or decodes {name}.bytes into target file, returns sizes of input and output"""
+    schema_path = schema_path or resolve_schema(filename)
+    key = (p.realpath(schema_path), class_nullable)
+    serializer = __batch_serializers.get(key)
+    if serializer is None:
+        schema = JsonbufSchema()
+        schema.load(schema_path)
+        serializer = __batch_serializers[key] = JsonbufSerializer(schema.descriptor, class_nullable=class_nullable, verbose=False, compiled=True)
+    serializer.frame, serializer.block_size = frame, block_size
+    os.makedirs(p.dirname(target) or '.', exist_ok=True)
+    try:
+        if filename.endswith('.json'):
+            with open(filename, 'r') as fp: serializer.context = json.load(fp)
+            with open(target, 'wb') as fp: serializer.serialize(fp)
+        else:
+            data = serializer.deserialize_mmap(filename)
+            with open(target, 'w') as fp: fp.write(json.dumps(data, indent=4, ensure_ascii=False, sort_keys=True))
+    finally:
+        serializer.context = None
+    return p.getsize(filename), p.getsize(target)
+
+def print_report(report, filename, log): # type: (Optional[JsonbufReport], Optional[str], io.TextIOWrapper)->None
+    if report is None: return
+    print(report.table(), file=log)
+    if filename:
+        with open(filename, 'w') as fp:
+            fp.write(report.dumps())
+            print('>>> {}'.format(p.abspath(fp.name)), file=log)
+
 def main():
     import argparse, sys
     arguments = argparse.ArgumentParser()
     arguments.add_argument('--command', '-c', choices=Commands.get_choices(), default=Commands.deserialize)
     arguments.add_argument('--class-nullable', action='store_true', help='allow class object encoded to null value')
+    arguments.add_argument('--compiled', action='store_true', help='encode/decode with schema compiled into closures')
+    arguments.add_argument('--mmap', action='store_true', help='decode from memory mapped input file without reading it into memory')
+    arguments.add_argument('--stream', action='store_true', help='encode/decode incrementally without loading whole document into memory')
+    arguments.add_argument('--ndjson', action='store_true', help='decode into one json line per element of top-level array')
+    arguments.add_argument('--frame', choices=FRAME_CODECS, help='encode into blocks compressed by codec with a trailing block index, decode input framed so')
+    arguments.add_argument('--block-size', type=int, default=FRAME_BLOCK_SIZE, help='payload bytes per compressed block of --frame')
     arguments.add_argument('--schema', '-s', help='data structure definition')
-    arguments.add_argument('--output', '-o', default='.', help='path for saving generated files')
+    arguments.add_argument('--output', '-o', default='.', help='path for saving generated files, - for writing to stdout')
     arguments.add_argument('--verbose', '-v', action='store_true', help='enable verbose printing')
     arguments.add_argument('--file', '-f', help='intput file')
+    arguments.add_argument('--samples', type=int, default=3, help='example records shown per field filled by defaults with --verbose')
+    arguments.add_argument('--report', action='store_true', help='print bytes, counts, defaults and time per class and field, saved as json too')
+    arguments.add_argument('--jobs', '-j', type=int, help='worker processes of batch command, number of cpus by default')
+    arguments.add_argument('inputs', nargs='*', help='files, directories or glob patterns of batch command')
     options = arguments.parse_args(sys.argv[1:])
 
-    script_path = p.dirname(p.realpath(p.abspath(__file__)))
-
+    # logs move to stderr when stdout carries the output, e.g. piped into compression or upload
+    piped = options.output == '-'
+    log = sys.stderr if piped else sys.stdout
     output = p.abspath(options.output)
-    if not p.exists(output): os.makedirs(output)
+    if not piped and not p.exists(output): os.makedirs(output)
+
+    if options.command == Commands.batch:
+        assert not piped, 'batch command writes files into output directory'
+        filenames, skipped = batch_targets(batch_inputs(options.inputs + ([options.file] if options.file else [])), output)
+        for filename in skipped: print('[W] {} skipped, its output is an input too'.format(filename), file=sys.stderr)
+        start = time.perf_counter()
+        sizes, failures = [0, 0], 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=options.jobs) as executor:
+            futures = {}
+            for filename, target in filenames:
+                future = executor.submit(batch_convert, filename, target, schema_path=options.schema, class_nullable=options.class_nullable,
+                                         frame=options.frame, block_size=options.block_size)
+                futures[future] = filename
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    input_size, output_size = future.result()
+                except Exception as error:
+                    failures += 1
+                    print('[E] {} {}: {}'.format(futures[future], error.__class__.__name__, error), file=sys.stderr)
+                    continue
+                sizes[0] += input_size
+                sizes[1] += output_size
+                if options.verbose: print('>>> {} {:,}'.format(futures[future], output_size))
+        print('[B] {} files {:,} -> {:,} bytes {:.2f}s{}'.format(len(filenames) - failures, sizes[0], sizes[1], time.perf_counter() - start,
+                                                               ' {} failed'.format(failures) if failures else ''))
+        if failures: sys.exit(1)
+        return
 
     filename = p.basename(options.file) # type: str
     name = re.sub(r'\.[^.]+$', '', filename)
 
     schema_path = options.schema # type: str
     if not schema_path:
-        schema_path = p.join(script_path, 'schemas/{}.xml'.format(re.sub(r'_+$', '', name)))
+        schema_path = resolve_schema(options.file)
         assert p.exists(schema_path), 'NOT_FOUND {}'.format(schema_path)
-    print('[F] {}'.format(options.file))
-    print('[S] {}'.format(schema_path))
+    print('[F] {}'.format(options.file), file=log)
+    print('[S] {}'.format(schema_path), file=log)
     command = options.command # type: str
     schema = JsonbufSchema()
     descriptor = schema.load(filename=schema_path)
-    serializer = JsonbufSerializer(schema=descriptor, class_nullable=options.class_nullable, verbose=options.verbose)
-    print(schema.dumps())
+    serializer = JsonbufSerializer(schema=descriptor, class_nullable=options.class_nullable, verbose=options.verbose, compiled=options.compiled)
+    serializer.frame, serializer.block_size = options.frame, options.block_size
+    if options.verbose:
+        print(schema.dumps(), file=log)
+        serializer.defaults = JsonbufDefaults(samples=options.samples)
+    if options.report:
+        assert not (options.stream or options.ndjson or options.mmap), '--report works on whole documents only'
+        serializer.report = JsonbufReport()
     if command == Commands.serialize:
         assert options.file and re.search(r'\.json$', options.file)
-        serializer.context = json.load(fp=open(options.file, 'r'))
-        with open('{}/{}.bytes'.format(output, name), 'wb') as fp:
-            serializer.serialize(fp)
-            print('>>> {} {:,}'.format(p.abspath(fp.name), fp.tell()))
+        if not options.stream: serializer.context = json.load(fp=open(options.file, 'r'))
+        fp = sys.stdout.buffer if piped else open('{}/{}.bytes'.format(output, name), 'wb')
+        try:
+            if options.stream:
+                encoder = JsonbufStreamEncoder(schema=descriptor, class_nullable=options.class_nullable, verbose=options.verbose)
+                encoder.defaults = serializer.defaults
+                with open(options.file, 'r') as input:
+                    if options.frame:
+                        with JsonbufFrameWriter(fp, codec=options.frame, block_size=options.block_size) as frame: encoder.encode(input, frame)
+                    else:
+                        encoder.encode(input, fp)
+            else:
+                serializer.serialize(fp)
+                print_report(serializer.report, None if piped else '{}/{}.report.json'.format(output, name), log)
+            if serializer.defaults is not None and serializer.defaults.counts: print(serializer.defaults.summary(), file=log)
+            if piped:
+                fp.flush()
+            else:
+                print('>>> {} {:,}'.format(p.abspath(fp.name), fp.tell()))
+        finally:
+            if not piped: fp.close()
     elif command == Commands.deserialize:
         assert options.file and re.search(r'\.bytes$', options.file)
-        data = serializer.deserilize(fp=open(options.file, 'rb'))
-        content = json.dumps(data, indent=4, ensure_ascii=False, sort_keys=True)
-        with open('{}/{}.json'.format(output, name), 'w') as fp:
-            fp.write(content)
-            print('>>> {}'.format(p.abspath(fp.name)))
-            print(content)
-    print()
+        if options.stream or options.ndjson:
+            decoder = JsonbufStreamDecoder(schema=descriptor, class_nullable=options.class_nullable, enums=serializer.enums,
+                                           indent=4, sort_keys=True, ensure_ascii=False, frame=bool(options.frame))
+            output_fp = sys.stdout if piped else open('{}/{}.{}'.format(output, name, 'ndjson' if options.ndjson else 'json'), 'w')
+            target = '<stdout>' if piped else p.abspath(output_fp.name)
+            with open(options.file, 'rb') as fp:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if p.getsize(options.file) else b''
+                try:
+                    if options.ndjson:
+                        lines = decoder.decode_lines(data, output_fp)
+                        print('>>> {} {:,} lines'.format(target, lines), file=log)
+                    else:
+                        decoder.decode(data, output_fp)
+                        print('>>> {}'.format(target), file=log)
+                finally:
+                    if isinstance(data, mmap.mmap): data.close()
+                    if not piped: output_fp.close()
+        else:
+            if options.mmap:
+                data = serializer.deserialize_mmap(options.file)
+            else:
+                data = serializer.deserilize(fp=open(options.file, 'rb'))
+            print_report(serializer.report, None if piped else '{}/{}.report.json'.format(output, name), log)
+            content = json.dumps(data, indent=4, ensure_ascii=False, sort_keys=True)
+            if piped:
+                print(content)
+            else:
+                with open('{}/{}.json'.format(output, name), 'w') as fp:
+                    fp.write(content)
+                    print('>>> {}'.format(p.abspath(fp.name)))
+                    print(content)
+    print(file=log)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Round trips of every layout through the interpreted, compiled, buffer, lazy and stream paths of jsonbuf.py,
+which must agree with each other byte for byte and with readers generated by genpy.
+
+python -m unittest test_jsonbuf
+"""
+
+from __future__ import print_function
+import importlib.util, io, json, os, shutil, struct, subprocess, sys, tempfile, unittest, zlib
+from unittest import mock
+import os.path as p
+from jsonbuf import *
+from benchmark import JsonbufSampler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LAYOUTS = '''<class name="Layouts">
+    <field name="title" type="string"/>
+    <field name="kind" type="int" enum="EAssetCategory"/>
+    <field name="scalars" type="class">
+        <class name="Scalars">
+            <field name="i8" type="int8"/>
+            <field name="u8" type="uint8"/>
+            <field name="i16" type="short"/>
+            <field name="u16" type="ushort"/>
+            <field name="i32" type="int"/>
+            <field name="u32" type="uint"/>
+            <field name="i64" type="long"/>
+            <field name="u64" type="ulong"/>
+            <field name="f32" type="float"/>
+            <field name="f64" type="double"/>
+            <field name="flag" type="bool"/>
+            <field name="text" type="string"/>
+        </class>
+    </field>
+    <field name="items" type="array">
+        <array type="class" indexed="true">
+            <class name="Item">
+                <field name="id" type="int"/>
+                <field name="name" type="string"/>
+                <field name="tags" type="array"><array type="string"/></field>
+            </class>
+        </array>
+    </field>
+    <field name="paths" type="dict">
+        <dict type="class" sorted="true">
+            <class name="Info">
+                <field name="size" type="uint"/>
+                <field name="kind" type="string"/>
+            </class>
+        </dict>
+    </field>
+    <field name="ids" type="dict"><dict type="int" key="int" sorted="true"/></field>
+    <field name="names" type="dict"><dict type="string" key="string"/></field>
+    <field name="nums" type="array"><array type="int" encoding="varint"/></field>
+    <field name="sizes" type="dict"><dict type="uint" key="string" encoding="varint"/></field>
+    <field name="rows" type="array">
+        <array type="class" layout="aligned">
+            <class name="Row">
+                <field name="id" type="int"/>
+                <field name="scale" type="float"/>
+                <field name="flag" type="bool"/>
+                <field name="weight" type="double"/>
+                <field name="kind" type="int" enum="EAssetCategory"/>
+            </class>
+        </array>
+    </field>
+    <field name="cols" type="array">
+        <array type="class" layout="columnar">
+            <class name="Col">
+                <field name="id" type="int"/>
+                <field name="name" type="string"/>
+                <field name="flag" type="bool"/>
+                <field name="weight" type="double"/>
+                <field name="kind" type="int" enum="EAssetCategory"/>
+            </class>
+        </array>
+    </field>
+    <field name="groups" type="dict">
+        <dict key="string" type="array">
+            <array type="class" layout="columnar">
+                <class name="Pair">
+                    <field name="key" type="string"/>
+                    <field name="on" type="bool"/>
+                </class>
+            </array>
+        </dict>
+    </field>
+    <field name="assets" type="array">
+        <array type="class">
+            <class name="Asset">
+                <field name="name" type="string"/>
+                <field name="BuildToMobile" type="bool"/>
+            </class>
+            <filter name="BuildToMobile" type="bool">true</filter>
+        </array>
+    </field>
+</class>
+'''
+
+VARINT = '''<class name="Varint" encoding="varint">
+    <field name="title" type="string"/>
+    <field name="items" type="array">
+        <array type="class" indexed="true">
+            <class name="Entry">
+                <field name="id" type="int"/>
+                <field name="delta" type="long"/>
+                <field name="size" type="uint"/>
+                <field name="flag" type="bool"/>
+            </class>
+        </array>
+    </field>
+    <field name="ids" type="dict"><dict type="int" key="int" sorted="true"/></field>
+    <field name="paths" type="dict"><dict type="short" key="string" sorted="true"/></field>
+</class>
+'''
+
+POOLED = '''<class name="Pooled" pool="true">
+    <field name="title" type="string"/>
+    <field name="items" type="array">
+        <array type="class" indexed="true">
+            <class name="Record">
+                <field name="id" type="int"/>
+                <field name="name" type="string"/>
+                <field name="tags" type="array"><array type="string"/></field>
+            </class>
+        </array>
+    </field>
+    <field name="paths" type="dict">
+        <dict type="class" sorted="true">
+            <class name="Location">
+                <field name="bundle" type="string"/>
+                <field name="size" type="uint"/>
+            </class>
+        </dict>
+    </field>
+    <field name="names" type="dict"><dict type="string" key="string"/></field>
+</class>
+'''
+
+SCHEMAS = {'Layouts': LAYOUTS, 'Varint': VARINT, 'Pooled': POOLED}
+
+def materialize(value): # type: (any)->any
+    """plain values of lazy proxies"""
+    if isinstance(value, (JsonbufLazyClass, JsonbufLazyDict, dict)): return dict((k, materialize(value[k])) for k in value)
+    if isinstance(value, (JsonbufLazyArray, list)): return [materialize(v) for v in value]
+    return value
+
+class RoundTripTest(unittest.TestCase):
+    SEEDS = range(6)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp(prefix='jsonbuf_')
+        cls.schemas = {} # type: Dict[str, JsonbufSchema]
+        for name, content in SCHEMAS.items():
+            filename = p.join(cls.folder, '{}.xml'.format(name))
+            with open(filename, 'w') as fp: fp.write(content)
+            schema = JsonbufSchema()
+            schema.load(filename)
+            cls.schemas[name] = schema
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def samples(self, schema, missing=True): # type: (JsonbufSchema, bool)->Iterator[any]
+        """random documents, every other one leaving fields out for defaults unless missing is off"""
+        for seed in self.SEEDS:
+            sampler = JsonbufSampler(JsonbufBridges.shared(), size=6, seed=seed, missing=0.1 * (seed % 2) if missing else 0.0)
+            yield sampler.sample(schema.descriptor)
+
+    @staticmethod
+    def encode(schema, value, class_nullable, compiled=False, frame=None): # type: (JsonbufSchema, any, bool, bool, str)->bytes
+        serializer = JsonbufSerializer(schema.descriptor, class_nullable=class_nullable, verbose=False, compiled=compiled)
+        serializer.context, serializer.frame, serializer.block_size = value, frame, 64
+        buffer = io.BytesIO()
+        serializer.serialize(buffer)
+        return buffer.getvalue()
+
+    def test_encoders(self):
+        for name, schema in self.schemas.items():
+            for class_nullable in (True, False):
+                for value in self.samples(schema):
+                    data = self.encode(schema, value, class_nullable)
+                    self.assertEqual(self.encode(schema, value, class_nullable, compiled=True), data, name)
+                    encoder = JsonbufStreamEncoder(schema.descriptor, class_nullable=class_nullable, verbose=False)
+                    buffer = io.BytesIO()
+                    encoder.encode(io.StringIO(json.dumps(value)), buffer)
+                    if schema.descriptor.pool:
+                        # pooled strings enter the pool in arrival order, so only size and values must match
+                        self.assertEqual(len(buffer.getvalue()), len(data), name)
+                        self.assertEqual(self.decode(schema, buffer.getvalue(), class_nullable), self.decode(schema, data, class_nullable))
+                    else:
+                        self.assertEqual(buffer.getvalue(), data, name)
+
+    @staticmethod
+    def decode(schema, data, class_nullable, compiled=False): # type: (JsonbufSchema, bytes, bool, bool)->any
+        serializer = JsonbufSerializer(schema.descriptor, class_nullable=class_nullable, verbose=False, compiled=compiled)
+        return serializer.deserilize(io.BytesIO(data))
+
+    def test_decoders(self):
+        for name, schema in self.schemas.items():
+            for class_nullable in (True, False):
+                for value in self.samples(schema):
+                    data = self.encode(schema, value, class_nullable)
+                    expected = self.decode(schema, data, class_nullable)
+                    serializer = JsonbufSerializer(schema.descriptor, class_nullable=class_nullable, verbose=False, compiled=True)
+                    self.assertEqual(serializer.deserilize(io.BytesIO(data)), expected, name)
+                    self.assertEqual(serializer.deserialize_buffer(data), expected, name)
+                    self.assertEqual(materialize(serializer.deserialize_lazy(data)), expected, name)
+                    decoder = JsonbufStreamDecoder(schema.descriptor, class_nullable=class_nullable, indent=4, sort_keys=True)
+                    text = io.StringIO()
+                    decoder.decode(data, text)
+                    self.assertEqual(text.getvalue(), json.dumps(expected, indent=4, sort_keys=True), name)
+                    self.assertEqual(self.encode(schema, expected, class_nullable), data, name)
+
+    def test_array_types(self):
+        # documents decoded into arrays, ndarrays or columns encode back to the same bytes
+        array_types = ('array',) + (('numpy', 'columns') if numpy is not None else ())
+        for name, schema in self.schemas.items():
+            for value in self.samples(schema):
+                data = self.encode(schema, value, False)
+                for array_type in array_types:
+                    serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False, compiled=True, array_type=array_type)
+                    serializer.context = serializer.deserialize_buffer(data)
+                    buffer = io.BytesIO()
+                    serializer.serialize(buffer)
+                    self.assertEqual(buffer.getvalue(), data, (name, array_type))
+
+    def test_frames(self):
+        for name, schema in self.schemas.items():
+            for value in self.samples(schema):
+                data = self.encode(schema, value, False)
+                framed = self.encode(schema, value, False, compiled=True, frame='zlib')
+                self.assertEqual(JsonbufFrameReader.unframe(framed), data, name)
+                expected = self.decode(schema, data, False)
+                serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False)
+                serializer.frame = 'zlib'
+                self.assertEqual(serializer.deserilize(io.BytesIO(framed)), expected, name)
+                self.assertEqual(serializer.deserialize_buffer(framed), expected, name)
+                self.assertEqual(materialize(serializer.deserialize_lazy(framed)), expected, name)
+                text = io.StringIO()
+                JsonbufStreamDecoder(schema.descriptor, class_nullable=False, sort_keys=True, frame=True).decode(framed, text)
+                self.assertEqual(text.getvalue(), json.dumps(expected, sort_keys=True), name)
+
+    def test_mmap(self):
+        for name, schema in self.schemas.items():
+            for seed, value in enumerate(self.samples(schema)):
+                expected = self.decode(schema, self.encode(schema, value, False), False)
+                for frame in (None, 'zlib'):
+                    # lazy proxies keep their mapping open, so every document gets a file of its own
+                    filename = p.join(self.folder, '{}.{}.{}.bytes'.format(name, seed, frame))
+                    with open(filename, 'wb') as fp: fp.write(self.encode(schema, value, False, compiled=True, frame=frame))
+                    for compiled in (False, True):
+                        serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False, compiled=compiled)
+                        serializer.frame = frame
+                        self.assertEqual(serializer.deserialize_mmap(filename), expected, (name, frame))
+                        self.assertEqual(materialize(serializer.deserialize_mmap(filename, lazy=True)), expected, (name, frame))
+
+    def test_report(self):
+        """encode and decode break a document down alike, --report saves the breakdown beside the output"""
+        columns = lambda report: dict((path, entry[:JsonbufReport.DEFAULTS]) for path, entry in report.entries.items())
+        for name, schema in self.schemas.items():
+            for value in self.samples(schema):
+                serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False, compiled=True)
+                serializer.context, serializer.report = value, JsonbufReport()
+                buffer = io.BytesIO()
+                serializer.serialize(buffer)
+                data, report = buffer.getvalue(), serializer.report
+                self.assertEqual(report.size, len(data), name)
+                self.assertEqual(report.entry(name)[JsonbufReport.COUNT], 1, name)
+                self.assertEqual(report.entry(name)[JsonbufReport.BYTES] + report.entries.get('<pool>', [0])[0], len(data), name)
+                serializer.report = JsonbufReport()
+                serializer.deserilize(io.BytesIO(data))
+                self.assertEqual(columns(serializer.report), columns(report), name)
+        script, output = p.join(p.dirname(p.abspath(__file__)), 'jsonbuf.py'), p.join(self.folder, 'report')
+        filename = p.join(self.folder, 'Layouts.json')
+        with open(filename, 'w') as fp: json.dump(next(self.samples(self.schemas['Layouts'])), fp)
+        subprocess.check_call([sys.executable, script, '-c', 'serialize', '-f', filename, '-s', p.join(self.folder, 'Layouts.xml'), '-o', output,
+                               '--report'], stdout=subprocess.DEVNULL)
+        with open(p.join(output, 'Layouts.report.json')) as fp: report = json.load(fp)
+        self.assertEqual(report['size'], p.getsize(p.join(output, 'Layouts.bytes')))
+        self.assertEqual(report['entries']['Layouts']['bytes'], report['size'])
+
+    def test_batch(self):
+        """batch command mirrors input folders under output, json encoded and bytes decoded like single files"""
+        schema, folder = self.schemas['Layouts'], p.join(self.folder, 'batch')
+        schema_path = p.join(self.folder, 'Layouts.xml')
+        expected = {} # type: Dict[str, any]
+        for seed, value in enumerate(self.samples(schema)):
+            filename = p.join(folder, 'in', str(seed), 'doc.json')
+            os.makedirs(p.dirname(filename))
+            with open(filename, 'w') as fp: json.dump(value, fp)
+            expected[p.join(str(seed), 'doc.bytes')] = self.encode(schema, value, False)
+        data = expected[p.join('0', 'doc.bytes')]
+        with open(p.join(folder, 'in', 'doc.bytes'), 'wb') as fp: fp.write(data)
+        subprocess.check_call([sys.executable, p.join(p.dirname(p.abspath(__file__)), 'jsonbuf.py'), '-c', 'batch', '-s', schema_path,
+                               '-o', p.join(folder, 'out'), '-j', '2', p.join(folder, 'in')], stdout=subprocess.DEVNULL)
+        for relative, content in expected.items():
+            with open(p.join(folder, 'out', relative), 'rb') as fp: self.assertEqual(fp.read(), content, relative)
+        with open(p.join(folder, 'out', 'doc.json')) as fp: self.assertEqual(fp.read(), json.dumps(self.decode(schema, data, False), indent=4, sort_keys=True))
+        target = p.join(folder, 'single', 'doc.bytes')
+        filename = p.join(folder, 'in', '0', 'doc.json')
+        self.assertEqual(batch_convert(filename, target, schema_path=schema_path), (p.getsize(filename), len(data)))
+        # the same relative path under two inputs can't share one output
+        with self.assertRaises(AssertionError):
+            batch_targets(batch_inputs([p.join(folder, 'in', '0'), p.join(folder, 'in', '1')]), p.join(folder, 'out'))
+
+    def test_frame_lookup_blocks(self):
+        """a lazy lookup in a framed document decompresses only the blocks it reads"""
+        schema = self.schemas['Layouts']
+        value = next(self.samples(schema, missing=False))
+        value['paths'] = dict(('assets/{:04d}.prefab'.format(n), {'size': n, 'kind': 'prefab'}) for n in range(400))
+        framed = self.encode(schema, value, False, compiled=True, frame='zlib')
+        serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False)
+        serializer.frame = 'zlib'
+        with mock.patch('zlib.decompress', wraps=zlib.decompress) as decompress:
+            info = serializer.deserialize_lazy(framed)['paths']['assets/0123.prefab']
+            self.assertEqual(dict(info), {'size': 123, 'kind': 'prefab'})
+            blocks = JsonbufFrameReader(io.BytesIO(framed)).size // 64
+            self.assertLess(decompress.call_count, blocks // 4)
+
+    def test_frame_magic_in_plain_document(self):
+        # size 0x424A of a leading string followed by FR reads as the magic
+        schema = self.schemas['Layouts']
+        value = next(self.samples(schema, missing=False))
+        value['title'] = 'FR' + 'x' * (0x424A - 2)
+        for compiled in (False, True):
+            data = self.encode(schema, value, False, compiled=compiled)
+            self.assertEqual(data[:4], b'JBFR')
+            expected = self.decode(schema, data, False)
+            self.assertEqual(expected['title'], value['title'])
+            serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False, compiled=compiled)
+            self.assertEqual(serializer.deserilize(io.BytesIO(data)), expected)
+            self.assertEqual(serializer.deserialize_buffer(data), expected)
+
+    def test_pooled_falsy_strings(self):
+        schema = self.schemas['Pooled']
+        value = {'title': 0, 'items': [{'id': 1, 'name': False, 'tags': [None, '']}], 'paths': {}, 'names': {}}
+        for compiled in (False, True):
+            decoded = self.decode(schema, self.encode(schema, value, False, compiled=compiled), False)
+            self.assertEqual(decoded['title'], '')
+            self.assertEqual(decoded['items'][0]['name'], '')
+            self.assertEqual(decoded['items'][0]['tags'], [None, ''])
+
+    def test_defaults_per_serializer(self):
+        schema = self.schemas['Pooled']
+        serializers = []
+        for count in (1, 2):
+            serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=True, compiled=True)
+            serializer.context = {'items': [{}] * count}
+            serializers.append(serializer)
+        for serializer in serializers * 2: serializer.serialize(io.BytesIO())
+        self.assertEqual(serializers[0].defaults.counts['Record.id'], 2)
+        self.assertEqual(serializers[1].defaults.counts['Record.id'], 4)
+
+    def test_generated_readers(self):
+        script, runtime = p.dirname(p.abspath(__file__)), self.runtime()
+        variants = [[], ['--slots', '--records']] + ([['--numpy']] if numpy is not None else [])
+        for options in variants:
+            output = p.join(self.folder, 'genpy{}'.format(len(options) and options[0]))
+            for name, schema in self.schemas.items():
+                subprocess.check_call([sys.executable, p.join(script, 'genpy.py'), '-s', p.join(self.folder, '{}.xml'.format(name)), '-o', output]
+                                      + options, stdout=subprocess.DEVNULL)
+                module = self.load(p.join(output, '{}.py'.format(name)), runtime)
+                # generated classes hold missing containers as empty ones, which encode differently from null
+                for value in self.samples(schema, missing=False):
+                    data = self.encode(schema, value, False)
+                    for decoder in (runtime.JsonbufStream(io.BytesIO(data)), runtime.JsonbufBuffer(data)):
+                        document = getattr(module, name)()
+                        document.deserialize(decoder)
+                        self.assertEqual(decoder.tell(), len(data), (name, options))
+                        buffer = io.BytesIO()
+                        document.serialize(runtime.JsonbufStream(buffer))
+                        self.assertEqual(buffer.getvalue(), data, (name, options))
+                    if '--records' in options:
+                        record = getattr(module, '{}Record'.format(name)).deserialize(runtime.JsonbufBuffer(data))
+                        encoder = runtime.JsonbufBuffer()
+                        record.serialize(encoder)
+                        self.assertEqual(bytes(encoder.getvalue()), data, (name, options))
+                    if '--numpy' in options and name == 'Layouts': self.check_arrays(schema, value, module, runtime)
+
+    def test_generated_element_reads(self):
+        """read_items_at() seeks through the offset table, elements ahead of n are overwritten and never decoded"""
+        runtime, schema = self.runtime(), self.schemas['Layouts']
+        module = self.generate('Layouts', runtime)
+        field = next(f for f in schema.descriptor.fields if f.name == 'items')
+        codec = JsonbufCodec.compile(schema.descriptor, class_nullable=False, verbose=False)
+        for value in self.samples(schema, missing=False):
+            document = module.Layouts()
+            document.deserialize(runtime.JsonbufBuffer(self.encode(schema, value, False)))
+            buffer = io.BytesIO()
+            codec.encoder(field)(value['items'], buffer)
+            data, count = buffer.getvalue(), len(document.items)
+            base = 4 + 4 * (count + 1)
+            for n, item in enumerate(document.items):
+                offset, = struct.unpack_from('<I', data, 4 + 4 * n)
+                corrupted = data[:base] + b'\xff' * offset + data[base + offset:]
+                for decoder in (runtime.JsonbufStream(io.BytesIO(corrupted)), runtime.JsonbufBuffer(corrupted)):
+                    element = module.Layouts.read_items_at(decoder, n)
+                    self.assertEqual((element.id, element.name, element.tags), (item.id, item.name, item.tags))
+            with self.assertRaises(IndexError): module.Layouts.read_items_at(runtime.JsonbufBuffer(data), count)
+
+    def test_generated_lookups(self):
+        """lookup_paths() returns at the first key past the one asked for, decoding no value after it"""
+        runtime, schema = self.runtime(), self.schemas['Layouts']
+        module = self.generate('Layouts', runtime)
+        field = next(f for f in schema.descriptor.fields if f.name == 'paths')
+        codec = JsonbufCodec.compile(schema.descriptor, class_nullable=False, verbose=False)
+        decoded = []
+        class Info(module.Info):
+            def deserialize(self, decoder):
+                decoded.append(self)
+                super(Info, self).deserialize(decoder)
+        module.Info = Info
+        for value in self.samples(schema, missing=False):
+            document = module.Layouts()
+            document.deserialize(runtime.JsonbufBuffer(self.encode(schema, value, False)))
+            buffer = io.BytesIO()
+            codec.encoder(field)(value['paths'], buffer)
+            keys = sorted(document.paths)
+            for n, key in enumerate(keys):
+                info = module.Layouts.lookup_paths(runtime.JsonbufBuffer(buffer.getvalue()), key)
+                self.assertEqual((info.size, info.kind), (document.paths[key].size, document.paths[key].kind))
+                # right after key and ahead of the next one in the same block
+                if key + b'\x00' in keys: continue
+                del decoded[:]
+                self.assertIsNone(module.Layouts.lookup_paths(runtime.JsonbufBuffer(buffer.getvalue()), key + b'\x00'))
+                self.assertEqual(len(decoded), n % 16 + 1)
+
+    def test_lazy_lookups(self):
+        # keys of another type are absent, as they are from the plain dict
+        schema = self.schemas['Layouts']
+        serializer = JsonbufSerializer(schema.descriptor, class_nullable=False, verbose=False, compiled=True)
+        for value in self.samples(schema, missing=False):
+            data = self.encode(schema, value, False)
+            expected = self.decode(schema, data, False)
+            for name, absent in (('ids', '5'), ('paths', 5)):
+                lazy = serializer.deserialize_lazy(data)[name]
+                self.assertNotIn(absent, lazy)
+                self.assertIsNone(lazy.get(absent))
+                self.assertIsNone(lazy.lookup(absent))
+                with self.assertRaises(KeyError): lazy[absent]
+                for key in expected[name]: self.assertEqual(materialize(lazy[key]), expected[name][key])
+
+    def check_arrays(self, schema, value, module, runtime): # type: (JsonbufSchema, dict, any, any)->None
+        """deserialize_array() of the aligned rows against the compiled codec"""
+        field = next(f for f in schema.descriptor.fields if f.name == 'rows')
+        codec = JsonbufCodec.compile(schema.descriptor, class_nullable=False, verbose=False)
+        buffer = io.BytesIO()
+        codec.encoder(field)(value['rows'], buffer)
+        rows, _ = codec.decoder(field)(buffer.getvalue(), 0)
+        records = module.Row.deserialize_array(runtime.JsonbufBuffer(buffer.getvalue()))
+        self.assertEqual(records['id'].tolist(), [r['id'] for r in rows])
+        columns = module.Row.deserialize_array(runtime.JsonbufBuffer(buffer.getvalue()), columns=True)
+        self.assertEqual(columns['weight'].tolist(), [r['weight'] for r in rows])
+
+    def generate(self, name, runtime): # type: (str, any)->any
+        """module genpy generates for the schema name"""
+        output = p.join(self.folder, 'genpy')
+        subprocess.check_call([sys.executable, p.join(p.dirname(p.abspath(__file__)), 'genpy.py'), '-s', p.join(self.folder, '{}.xml'.format(name)),
+                               '-o', output], stdout=subprocess.DEVNULL)
+        return self.load(p.join(output, '{}.py'.format(name)), runtime)
+
+    @staticmethod
+    def runtime(): # type: ()->any
+        """python runtime the generated modules import, loaded apart from the jsonbuf.py under test"""
+        spec = importlib.util.spec_from_file_location('jsonbuf', p.join(p.dirname(p.abspath(__file__)), 'include', 'python', 'jsonbuf.py'))
+        runtime = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(runtime)
+        return runtime
+
+    @staticmethod
+    def load(filename, runtime): # type: (str, any)->any
+        """generated module, which imports the python runtime as jsonbuf"""
+        previous = sys.modules.get('jsonbuf')
+        sys.modules['jsonbuf'] = runtime
+        try:
+            spec = importlib.util.spec_from_file_location(p.splitext(p.basename(filename))[0], filename)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+        finally:
+            sys.modules['jsonbuf'] = previous
+
+if __name__ == '__main__':
+    unittest.main()